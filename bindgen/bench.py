@@ -0,0 +1,431 @@
+#-------------------------------------------------------------------------------
+#   Benchmarks for the bindings generator.
+#
+#   python3 bench.py ast-filter [-t PREFIX ...]
+#       Runs every task (or the given ones) once with a full clang AST dump
+#       and once with -ast-dump-filter (gen_ir.ast_filter), reports the
+#       JSON payload size, clang wall time and Python decode time of both,
+#       and checks that both produce the same IR.
+#
+#   python3 bench.py frontend [-t PREFIX ...]
+#       Runs every task (or the given ones) through both IR front-ends, the
+#       clang JSON AST dump and libclang (gen_ir.frontend), reports their
+#       times and checks that both produce the same IR. libclang's times
+#       include building the precompiled dependency headers on first use.
+#
+#   python3 bench.py ir-format [-t PREFIX ...] [--repeat N]
+#       Writes the IR of every task (or the given ones) as indented JSON and
+#       as a binary .ir file (gen_irfile), reports their sizes and the time
+#       to fully load each, and to open the .ir file and look up a single
+#       declaration, and checks that the .ir file round-trips.
+#
+#   python3 bench.py fragments [-s STRUCTS] [-e ENUMS] [-f FUNCS] [--repeat N]
+#       C# emission of a synthetic module (see synthetic) without the
+#       per-declaration fragment cache (gen_fragments), with an empty and a
+#       full one, and with one struct changed, which only re-emits the struct
+#       and the declarations referencing it. Checks that the stitched module
+#       is identical to the one emitted without fragments.
+#
+#   python3 bench.py synthetic [-s STRUCTS] [-e ENUMS] [-f FUNCS] [-a LEN] [--scales N ...] [--clang]
+#       Synthesizes a C header of the given size (plus a matching fake clang
+#       AST dump, so neither clang nor the real headers are needed), runs it
+#       through gen_ir and gen_csharp at increasing scales and reports
+#       throughput and peak Python memory. Fails if the run time grows
+#       faster than --max-exponent with the declaration count, to catch
+#       quadratic behaviour before it hits large headers.
+#-------------------------------------------------------------------------------
+import argparse, io, json, math, os, sys, tempfile, time, tracemalloc
+import gen, gen_cache, gen_csharp, gen_fragments, gen_ir, gen_irfile
+
+def select_tasks(prefixes):
+    if not prefixes:
+        return gen.tasks
+    return [task for task in gen.tasks if task[1] in prefixes]
+
+def compare_irs(ir_a, ir_b):
+    # the declarations must match exactly and in order (they are emitted in
+    # that order)
+    decls_a = list(ir_a['decls'])
+    decls_b = list(ir_b['decls'])
+    if decls_a != decls_b:
+        for i, (a, b) in enumerate(zip(decls_a, decls_b)):
+            if a != b:
+                return f"decl #{i} differs: {a.get('name')} vs {b.get('name')}"
+        return f'{len(decls_a)} vs {len(decls_b)} decls'
+    return None
+
+def bench_ast_filter(args):
+    rows = []
+    mismatches = 0
+    for [c_header_path, main_prefix, dep_prefixes] in select_tasks(args.tasks):
+        module = gen_csharp.module_names[main_prefix]
+        c_source_path = gen_csharp.c_source_paths[main_prefix]
+
+        t0 = time.perf_counter()
+        ast = gen_ir.clang(c_source_path)
+        t1 = time.perf_counter()
+        ir_full = gen_ir.gen_from_ast(ast, c_header_path, module, main_prefix, dep_prefixes)
+        t2 = time.perf_counter()
+        full = (len(ast), t1 - t0, t2 - t1)
+        del ast
+
+        filters = gen_ir.ast_filters(c_header_path, main_prefix)
+        t0 = time.perf_counter()
+        asts = gen_ir.clang_filtered(c_source_path, filters)
+        t1 = time.perf_counter()
+        ir_filtered = gen_ir.gen_from_filtered_asts(asts, c_header_path, module, main_prefix, dep_prefixes)
+        t2 = time.perf_counter()
+        filtered = (sum(len(ast) for ast in asts), t1 - t0, t2 - t1)
+
+        mismatch = compare_irs(ir_full, ir_filtered)
+        if mismatch is not None:
+            mismatches += 1
+        rows.append((module, full, filtered, mismatch or 'ok'))
+
+    print(f"{'module':<12} {'full MB':>9} {'clang s':>8} {'decode s':>9} | {'filt MB':>9} {'clang s':>8} {'decode s':>9} | IR")
+    total_full = [0, 0, 0]
+    total_filtered = [0, 0, 0]
+    for module, full, filtered, result in rows:
+        print(f'{module:<12} {full[0] / 1e6:>9.2f} {full[1]:>8.3f} {full[2]:>9.3f} | {filtered[0] / 1e6:>9.2f} {filtered[1]:>8.3f} {filtered[2]:>9.3f} | {result}')
+        for i in range(3):
+            total_full[i] += full[i]
+            total_filtered[i] += filtered[i]
+    print(f"{'total':<12} {total_full[0] / 1e6:>9.2f} {total_full[1]:>8.3f} {total_full[2]:>9.3f} | {total_filtered[0] / 1e6:>9.2f} {total_filtered[1]:>8.3f} {total_filtered[2]:>9.3f} |")
+    return 1 if mismatches else 0
+
+def bench_frontend(args):
+    rows = []
+    mismatches = 0
+    for [c_header_path, main_prefix, dep_prefixes] in select_tasks(args.tasks):
+        module = gen_csharp.module_names[main_prefix]
+        c_source_path = gen_csharp.c_source_paths[main_prefix]
+        pch_source_path = gen_csharp.c_source_paths.get(dep_prefixes[0]) if dep_prefixes else None
+
+        t0 = time.perf_counter()
+        ast = gen_ir.clang(c_source_path)
+        ir_json = gen_ir.gen_from_ast(ast, c_header_path, module, main_prefix, dep_prefixes)
+        t1 = time.perf_counter()
+        del ast
+
+        t2 = time.perf_counter()
+        ir_libclang, _ = gen_ir.libclang_gen(c_source_path, pch_source_path, c_header_path, module, main_prefix, dep_prefixes, False)
+        t3 = time.perf_counter()
+
+        mismatch = compare_irs(ir_json, ir_libclang)
+        if mismatch is not None:
+            mismatches += 1
+        rows.append((module, len(ir_json['decls']), t1 - t0, t3 - t2, mismatch or 'ok'))
+
+    print(f"{'module':<12} {'decls':>6} {'json s':>8} {'libclang s':>11} | IR")
+    for module, decls, t_json, t_libclang, result in rows:
+        print(f'{module:<12} {decls:>6} {t_json:>8.3f} {t_libclang:>11.3f} | {result}')
+    print(f"{'total':<12} {sum(row[1] for row in rows):>6} {sum(row[2] for row in rows):>8.3f} {sum(row[3] for row in rows):>11.3f} |")
+    return 1 if mismatches else 0
+
+def best_time(func, repeat):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        t = time.perf_counter() - t0
+        best = t if best is None else min(best, t)
+    return best
+
+def bench_ir_format(args):
+    rows = []
+    mismatches = 0
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for [c_header_path, main_prefix, dep_prefixes] in select_tasks(args.tasks):
+            ir = gen_csharp.make_ir(c_header_path, main_prefix, dep_prefixes)
+            text = json.dumps(ir, indent=2)
+            path = os.path.join(tmp_dir, f"{ir['module']}.ir")
+            gen_irfile.write(path, ir)
+            t_json = best_time(lambda: json.loads(text), args.repeat)
+            def load_all():
+                with gen_irfile.load(path) as irfile:
+                    return irfile.to_dict()
+            t_ir = best_time(load_all, args.repeat)
+            # the last declaration, the worst case for the lazy lookup
+            name = next((decl['name'] for decl in reversed(ir['decls']) if 'name' in decl), None)
+            def load_one():
+                with gen_irfile.load(path) as irfile:
+                    return irfile.find(name)
+            t_one = best_time(load_one, args.repeat)
+            result = 'ok'
+            if load_all() != ir:
+                result = 'round-trip differs'
+                mismatches += 1
+            rows.append((ir['module'], len(ir['decls']), len(text), os.path.getsize(path), t_json, t_ir, t_one, result))
+
+    print(f"{'module':<12} {'decls':>6} {'json KB':>8} {'ir KB':>7} {'json ms':>8} {'ir ms':>7} {'1 decl ms':>10} | round-trip")
+    for module, decls, json_size, ir_size, t_json, t_ir, t_one, result in rows:
+        print(f'{module:<12} {decls:>6} {json_size / 1024:>8.1f} {ir_size / 1024:>7.1f} {t_json * 1e3:>8.2f} {t_ir * 1e3:>7.2f} {t_one * 1e3:>10.3f} | {result}')
+    print(f"{'total':<12} {sum(row[1] for row in rows):>6} {sum(row[2] for row in rows) / 1024:>8.1f} {sum(row[3] for row in rows) / 1024:>7.1f} "
+          f"{sum(row[4] for row in rows) * 1e3:>8.2f} {sum(row[5] for row in rows) * 1e3:>7.2f} {sum(row[6] for row in rows) * 1e3:>10.3f} |")
+    return 1 if mismatches else 0
+
+synth_prefix = 'synb_'
+synth_module = 'SynBench'
+
+# field types of the synthetic structs, besides references to other structs
+# and enums: primitives, strings, bool, function pointers and fixed arrays
+synth_field_types = [
+    'int', 'uint32_t', 'float', 'double', 'bool', 'const char *', 'void *', 'uint8_t',
+    'void (*)(void *)', 'int (*)(const char *, void *)', 'float[4][4]', 'int[8]',
+]
+
+class SynthHeader:
+    # builds a C header and the clang JSON AST dump of its declarations side
+    # by side, with source offsets pointing into the header text
+    def __init__(self):
+        self.source = io.StringIO()
+        self.source.write('/* synthetic bindgen benchmark header */\n#include <stdint.h>\n#include <stdbool.h>\n\n')
+        self.inner = []
+        self.next_id = 1
+
+    def node(self, kind, **fields):
+        node = { 'id': hex(self.next_id), 'kind': kind }
+        self.next_id += 1
+        node.update(fields)
+        return node
+
+    def loc(self):
+        return { 'offset': self.source.tell() }
+
+    def add_struct(self, name, fields):
+        # 'typedef struct { ... } name;', an anonymous RecordDecl followed by
+        # a TypedefDecl, like clang dumps it
+        loc = self.loc()
+        self.source.write('typedef struct {\n')
+        field_decls = []
+        for field_name, field_type in fields:
+            if '(*)' in field_type:
+                self.source.write(f"    {field_type.replace('(*)', f'(*{field_name})')};\n")
+            elif '[' in field_type:
+                base, dims = field_type.split('[', 1)
+                self.source.write(f'    {base} {field_name}[{dims};\n')
+            else:
+                self.source.write(f'    {field_type} {field_name};\n')
+            field_decls.append(self.node('FieldDecl', name=field_name, type={ 'qualType': field_type.replace('bool', '_Bool') }))
+        self.source.write(f'}} {name};\n\n')
+        self.inner.append(self.node('RecordDecl', loc=loc, tagUsed='struct', completeDefinition=True, inner=field_decls))
+        self.inner.append(self.node('TypedefDecl', loc=loc, name=name, type={ 'qualType': f'struct {name}' }))
+
+    def add_enum(self, name, items):
+        loc = self.loc()
+        self.source.write(f'typedef enum {name} {{\n')
+        item_decls = []
+        for i, item in enumerate(items):
+            self.source.write(f'    {item} = {i},\n')
+            literal = self.node('IntegerLiteral', type={ 'qualType': 'int' }, valueCategory='prvalue', value=str(i))
+            expr = self.node('ConstantExpr', type={ 'qualType': 'int' }, valueCategory='prvalue', value=str(i), inner=[literal])
+            item_decls.append(self.node('EnumConstantDecl', name=item, type={ 'qualType': 'int' }, inner=[expr]))
+        self.source.write(f'}} {name};\n\n')
+        self.inner.append(self.node('EnumDecl', loc=loc, name=name, inner=item_decls))
+
+    def add_func(self, name, result_type, params):
+        loc = self.loc()
+        self.source.write(f"{result_type} {name}({', '.join(f'{t} {n}' for n, t in params) or 'void'});\n")
+        param_decls = [self.node('ParmVarDecl', name=n, type={ 'qualType': t }) for n, t in params]
+        func_type = f"{result_type} ({', '.join(t for _, t in params) or 'void'})"
+        self.inner.append(self.node('FunctionDecl', loc=loc, name=name, type={ 'qualType': func_type }, inner=param_decls))
+
+    def ast(self):
+        # clang's JSON AST dump is pretty-printed with a 2-space indent
+        return json.dumps({ 'id': '0x0', 'kind': 'TranslationUnitDecl', 'inner': self.inner }, indent=2).encode()
+
+def synth_header(num_structs, num_enums, num_funcs, array_len):
+    synth = SynthHeader()
+    enums = []
+    for i in range(num_enums):
+        name = f'{synth_prefix}enum{i}'
+        synth.add_enum(name, [f'{synth_prefix.upper()}ENUM{i}_ITEM{j}' for j in range(8)])
+        enums.append(name)
+    structs = []
+    for i in range(num_structs):
+        fields = [(f'field{j}', t) for j, t in enumerate(synth_field_types)]
+        # a large fixed array (the '_itemN' expansion in gen_struct), plus
+        # references to already declared structs and enums
+        fields.append(('data', f'uint8_t[{array_len}]'))
+        if enums:
+            fields.append(('mode', enums[i % len(enums)]))
+        if structs:
+            fields.append(('inner', structs[-1]))
+            fields.append(('inner_array', f'{structs[i // 2]}[4]'))
+            fields.append(('inner_ptr', f'const {structs[i // 3]} *'))
+        name = f'{synth_prefix}struct{i}'
+        synth.add_struct(name, fields)
+        structs.append(name)
+    for i in range(num_funcs):
+        params = [('a', 'int'), ('b', 'float'), ('name', 'const char *')]
+        result_type = 'void'
+        if structs:
+            params.append(('desc', f'const {structs[i % len(structs)]} *'))
+            if i % 3 == 0:
+                result_type = structs[i % len(structs)]     # struct return by value
+        if enums:
+            params.append(('mode', enums[i % len(enums)]))
+        synth.add_func(f'{synth_prefix}func{i}', result_type, params)
+    return synth.source.getvalue(), synth.ast()
+
+def synth_clang_ast(header_path):
+    # real clang on the synthetic header, the main source just includes it
+    source_path = os.path.splitext(header_path)[0] + '.c'
+    with open(source_path, 'w') as f:
+        f.write(f'#include "{os.path.basename(header_path)}"\n')
+    return gen_ir.clang(source_path)
+
+def run_synthetic(ast, header_path):
+    t0 = time.perf_counter()
+    ir = gen_ir.gen_from_ast(ast, header_path, synth_module, synth_prefix, [])
+    t1 = time.perf_counter()
+    source = gen_csharp.gen_source(ir, synth_prefix, [])[0]
+    t2 = time.perf_counter()
+    return ir, source, t1 - t0, t2 - t1
+
+def bench_synthetic(args):
+    gen_csharp.module_names.setdefault(synth_prefix, synth_module)
+    # every run emits all declarations, see bench_fragments()
+    gen_fragments.enabled = False
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        header_path = os.path.join(tmp_dir, 'synb.h')
+        for scale in args.scales:
+            header, ast = synth_header(args.structs * scale, args.enums * scale, args.funcs * scale, args.array_len)
+            with open(header_path, 'w', newline='') as f:
+                f.write(header)
+            if args.clang:
+                ast = synth_clang_ast(header_path)
+            # best of N for the timings, a separate traced run for memory
+            # (tracemalloc slows down the generator considerably)
+            best = None
+            for _ in range(args.repeat):
+                ir, source, t_ir, t_csharp = run_synthetic(ast, header_path)
+                if best is None or t_ir + t_csharp < best[0] + best[1]:
+                    best = (t_ir, t_csharp)
+            tracemalloc.start()
+            run_synthetic(ast, header_path)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            rows.append((scale, len(ir['decls']), len(ast), len(source), best[0], best[1], peak))
+            del ast, ir, source
+
+    print(f"{'scale':>5} {'decls':>7} {'AST MB':>8} {'out MB':>8} {'ir s':>8} {'c# s':>8} {'decls/s':>9} {'out MB/s':>9} {'peak MB':>8}")
+    for scale, decls, ast_size, out_size, t_ir, t_csharp, peak in rows:
+        t = t_ir + t_csharp
+        print(f'{scale:>5} {decls:>7} {ast_size / 1e6:>8.2f} {out_size / 1e6:>8.2f} {t_ir:>8.3f} {t_csharp:>8.3f} {decls / t:>9.0f} {out_size / 1e6 / t_csharp:>9.2f} {peak / 1e6:>8.1f}')
+
+    # growth exponent of run time vs. number of declarations between the
+    # smallest and the largest scale, ~1.0 is linear, ~2.0 quadratic
+    if len(rows) < 2:
+        return 0
+    first, last = rows[0], rows[-1]
+    result = 0
+    for label, i in (('ir', 4), ('c#', 5)):
+        exponent = math.log(max(last[i], 1e-9) / max(first[i], 1e-9)) / math.log(last[1] / first[1])
+        status = 'ok'
+        if exponent > args.max_exponent:
+            status = f'FAIL (> {args.max_exponent})'
+            result = 1
+        print(f'{label} scaling exponent: {exponent:.2f} {status}')
+    return result
+
+def read_fragments(module):
+    # the fragment files of a module (the index and the data file) by name
+    directory = os.path.dirname(gen_fragments.fragment_path(module))
+    fragments = {}
+    for name in os.listdir(directory):
+        if name.startswith(f'{module}.'):
+            with open(os.path.join(directory, name), 'rb') as f:
+                fragments[name] = f.read()
+    return fragments
+
+def time_emission(ir, fragments, repeat):
+    # best time of gen_source(), the fragment files are reset to 'fragments'
+    # (see read_fragments(), None for no files) before each run
+    directory = os.path.dirname(gen_fragments.fragment_path(ir['module']))
+    best = None
+    for _ in range(repeat):
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        for name, data in (fragments or {}).items():
+            with open(os.path.join(directory, name), 'wb') as f:
+                f.write(data)
+        t0 = time.perf_counter()
+        source = gen_csharp.gen_source(ir, synth_prefix, [])
+        t = time.perf_counter() - t0
+        best = t if best is None else min(best, t)
+    return best, source
+
+def bench_fragments(args):
+    gen_csharp.module_names.setdefault(synth_prefix, synth_module)
+    header, ast = synth_header(args.structs, args.enums, args.funcs, args.array_len)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        header_path = os.path.join(tmp_dir, 'synb.h')
+        with open(header_path, 'w', newline='') as f:
+            f.write(header)
+        ir = gen_ir.gen_from_ast(ast, header_path, synth_module, synth_prefix, [])
+        # a field added to the last struct (the synthetic structs embed the
+        # preceding ones, so this one is referenced the least)
+        changed_ir = dict(ir, decls=list(ir['decls']))
+        i = max(i for i, decl in enumerate(ir['decls']) if decl['kind'] == 'struct')
+        changed_ir['decls'][i] = dict(ir['decls'][i], fields=ir['decls'][i]['fields'] + [{ 'name': 'extra', 'type': 'int' }])
+        gen_cache.configure(True, os.path.join(tmp_dir, 'cache'), None)
+        os.makedirs(os.path.dirname(gen_fragments.fragment_path(synth_module)))
+
+        gen_fragments.enabled = False
+        t_full, (expected, *_) = time_emission(ir, None, args.repeat)
+        _, (changed_expected, *_) = time_emission(changed_ir, None, 1)
+        gen_fragments.enabled = True
+        t_cold, (source, *_, cold_stats) = time_emission(ir, None, args.repeat)
+        fragments = read_fragments(synth_module)
+        t_warm, (warm_source, *_, warm_stats) = time_emission(ir, fragments, args.repeat)
+        t_changed, (changed_source, *_, changed_stats) = time_emission(changed_ir, fragments, args.repeat)
+        rows = [
+            ('no fragments', t_full, None, 'ok'),
+            ('cold', t_cold, cold_stats, 'ok' if source == expected else 'differs'),
+            ('warm', t_warm, warm_stats, 'ok' if warm_source == expected else 'differs'),
+            ('1 struct changed', t_changed, changed_stats, 'ok' if changed_source == changed_expected else 'differs'),
+        ]
+
+    print(f"{'run':<18} {'c# ms':>8} {'re-emitted':>11} | output")
+    for label, t, stats, result in rows:
+        emitted = f"{stats['emitted']}/{stats['emitted'] + stats['reused']}" if stats else '-'
+        print(f'{label:<18} {t * 1e3:>8.1f} {emitted:>11} | {result}')
+    return 0 if all(row[3] == 'ok' for row in rows) else 1
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Bindings generator benchmarks.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    cmd = commands.add_parser('ast-filter', help='full vs. filtered clang AST dumps')
+    cmd.add_argument('-t', '--tasks', nargs='*', metavar='PREFIX', help='only run the tasks with these prefixes')
+    cmd.set_defaults(func=bench_ast_filter)
+    cmd = commands.add_parser('frontend', help='clang JSON AST dump vs. libclang front-end')
+    cmd.add_argument('-t', '--tasks', nargs='*', metavar='PREFIX', help='only run the tasks with these prefixes')
+    cmd.set_defaults(func=bench_frontend)
+    cmd = commands.add_parser('ir-format', help='indented JSON vs. binary IR files')
+    cmd.add_argument('-t', '--tasks', nargs='*', metavar='PREFIX', help='only run the tasks with these prefixes')
+    cmd.add_argument('--repeat', type=int, default=5, help='timing runs, the best one is reported (default: 5)')
+    cmd.set_defaults(func=bench_ir_format)
+    cmd = commands.add_parser('fragments', help='C# emission with and without the per-declaration fragment cache')
+    cmd.add_argument('-s', '--structs', type=int, default=200, help='number of structs (default: 200)')
+    cmd.add_argument('-e', '--enums', type=int, default=100, help='number of enums (default: 100)')
+    cmd.add_argument('-f', '--funcs', type=int, default=500, help='number of functions (default: 500)')
+    cmd.add_argument('-a', '--array-len', type=int, default=256, help='length of the large fixed array in each struct (default: 256)')
+    cmd.add_argument('--repeat', type=int, default=5, help='timing runs, the best one is reported (default: 5)')
+    cmd.set_defaults(func=bench_fragments)
+    cmd = commands.add_parser('synthetic', help='throughput and scaling on synthetic headers')
+    cmd.add_argument('-s', '--structs', type=int, default=200, help='number of structs at scale 1 (default: 200)')
+    cmd.add_argument('-e', '--enums', type=int, default=100, help='number of enums at scale 1 (default: 100)')
+    cmd.add_argument('-f', '--funcs', type=int, default=500, help='number of functions at scale 1 (default: 500)')
+    cmd.add_argument('-a', '--array-len', type=int, default=256, help='length of the large fixed array in each struct (default: 256)')
+    cmd.add_argument('--scales', type=int, nargs='+', default=[1, 2, 4], metavar='N', help='header size multipliers (default: 1 2 4)')
+    cmd.add_argument('--repeat', type=int, default=3, help='timing runs per scale, the best one is reported (default: 3)')
+    cmd.add_argument('--max-exponent', type=float, default=1.3, help='fail if run time grows faster than decls^N (default: 1.3)')
+    cmd.add_argument('--clang', action='store_true', help='dump the AST with the real clang instead of synthesizing it')
+    cmd.set_defaults(func=bench_synthetic)
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    sys.exit(args.func(args))
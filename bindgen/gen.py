@@ -1,4 +1,6 @@
-import gen_csharp
+import argparse, json, os, time
+from concurrent.futures import ProcessPoolExecutor
+import gen_apidiff, gen_csharp, gen_cache, gen_ir, gen_outputs, gen_profile, gen_python, gen_registry, gen_watch
 
 tasks = [
     [ '../ext/sokol/sokol_log.h',            'slog_',     [] ],
@@ -25,39 +27,282 @@ tasks = [
     
 ]
 
-#C Raw
-gen_csharp.prepare()
-
-# Clear the auto-detected struct return functions from previous runs
-gen_csharp.web_wrapper_struct_return_functions = {}
+def ir_task(task):
+    # runs in a worker process: clang front-end and IR extraction, the files
+    # the module's translation unit depends on and the worker's profiling
+    # events are handed back along with the results
+    [c_header_path, main_prefix, dep_prefixes] = task
+    module = gen_csharp.module_names[main_prefix]
+    with gen_profile.span('ir_task', module=module):
+        ir = gen_csharp.make_ir(c_header_path, main_prefix, dep_prefixes)
+    gen_profile.record_rss()
+    return ir, gen_ir.module_deps.get(module, []), gen_profile.take_events()
 
-all_irs = []
-for task in tasks:
+def source_task(args):
+    # runs in a worker process: C# emission, with the registry entries of
+    # the module's dependencies
+    [task, ir, registry] = args
     [c_header_path, main_prefix, dep_prefixes] = task
-    ir = gen_csharp.gen(c_header_path, main_prefix, dep_prefixes)
-    all_irs.append(ir)
-
-# Generate C header file with internal wrapper implementations
-print('Generating C internal wrappers header...')
-print(f'  Auto-detected {len(gen_csharp.web_wrapper_struct_return_functions)} functions returning structs by value')
-
-# Generate sokol wrappers header (excludes spine-c)
-sokol_header_content = gen_csharp.gen_c_internal_wrappers_header(all_irs)
-sokol_header_output_path = '../ext/sokol_csharp_internal_wrappers.h'
-with open(sokol_header_output_path, 'w', newline='\n') as f_header:
-    f_header.write(sokol_header_content)
-print(f'  Generated Sokol wrappers: {sokol_header_output_path}')
-
-# Generate spine-c wrappers header (only spine-c functions)
-spine_header_content = gen_csharp.gen_c_spine_wrappers_header(all_irs)
-spine_header_output_path = '../ext/spine-c/spine_c_csharp_internal_wrappers.h'
-with open(spine_header_output_path, 'w', newline='\n') as f_header:
-    f_header.write(spine_header_content)
-print(f'  Generated Spine-C wrappers: {spine_header_output_path}')
-
-# Generate ozzutil wrappers header (only ozz functions)
-ozzutil_header_content = gen_csharp.gen_c_ozzutil_wrappers_header(all_irs)
-ozzutil_header_output_path = '../ext/ozzutil/ozzutil_csharp_internal_wrappers.h'
-with open(ozzutil_header_output_path, 'w', newline='\n') as f_header:
-    f_header.write(ozzutil_header_content)
-print(f'  Generated OzzUtil wrappers: {ozzutil_header_output_path}')
\ No newline at end of file
+    gen_registry.load(registry)
+    with gen_profile.span('source_task', module=gen_csharp.module_names[main_prefix]):
+        source = gen_csharp.gen_source(ir, main_prefix, dep_prefixes)
+    gen_profile.record_rss()
+    return source, gen_profile.take_events()
+
+def init_worker(cache_config, ast_filter, frontend, json_export, profile, module_modes):
+    # worker processes may be spawned rather than forked, pass on the settings
+    gen_cache.configure(**cache_config)
+    gen_ir.ast_filter = ast_filter
+    gen_ir.frontend = frontend
+    gen_ir.json_export = json_export
+    gen_profile.enabled = profile
+    gen_csharp.module_modes = module_modes
+
+def gen_all_tasks(jobs):
+    # all IRs first, which only have the modules' own declarations, then the
+    # C# sources, which resolve the dependencies' declarations from the
+    # registry the IRs were registered in
+    if jobs <= 1:
+        ir_results = [ir_task(task) for task in tasks]
+        for ir, _, _ in ir_results:
+            gen_registry.register(ir)
+        source_results = [source_task([task, ir, {}]) for task, (ir, _, _) in zip(tasks, ir_results)]
+    else:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(tasks)), initializer=init_worker, initargs=(gen_cache.config(), gen_ir.ast_filter, gen_ir.frontend, gen_ir.json_export, gen_profile.enabled, gen_csharp.module_modes)) as pool:
+            # map() yields results in task order, independent of completion order
+            ir_results = list(pool.map(ir_task, tasks))
+            for ir, _, _ in ir_results:
+                gen_registry.register(ir)
+            source_args = [[task, ir, gen_registry.select(task[2])] for task, (ir, _, _) in zip(tasks, ir_results)]
+            source_results = list(pool.map(source_task, source_args))
+    return [(ir, source, deps, ir_events + source_events) for (ir, deps, ir_events), (source, source_events) in zip(ir_results, source_results)]
+
+def affected_tasks(changed_paths, results):
+    # the indices of the tasks whose translation unit includes one of the
+    # changed files, and of the tasks depending on those (their IRs don't
+    # change, but their C# resolves the dependencies' declarations)
+    ir_indices = [i for i, (_, _, deps, _) in enumerate(results) if not changed_paths.isdisjoint(deps)]
+    prefixes = { tasks[i][1] for i in ir_indices }
+    source_indices = [i for i, task in enumerate(tasks) if i in ir_indices or not prefixes.isdisjoint(task[2])]
+    return ir_indices, source_indices
+
+def watch(results, args):
+    # regenerates the modules affected by changed files in-process until
+    # interrupted, the other modules' results are kept from the last run
+    results = list(results)
+    watcher = gen_watch.watcher(set().union(*(deps for _, _, deps, _ in results)), polling=args.watch_poll)
+    # files of a failed regeneration, retried with the next change
+    pending = set()
+    try:
+        while True:
+            print(f'Watching {len(watcher.paths)} files ({watcher.kind}), press Ctrl-C to stop')
+            changed = watcher.wait() | pending
+            start = time.perf_counter()
+            ir_indices, source_indices = affected_tasks(changed, results)
+            if not ir_indices:
+                continue
+            print(f"Changed: {', '.join(sorted(os.path.relpath(path) for path in changed))}")
+            previous_irs = { results[i][0]['module']: results[i][0] for i in ir_indices }
+            try:
+                new_results = list(results)
+                for i in ir_indices:
+                    ir, deps, events = ir_task(tasks[i])
+                    gen_registry.register(ir)
+                    new_results[i] = (ir, None, deps, events)
+                for i in source_indices:
+                    ir, _, deps, events = new_results[i]
+                    source, source_events = source_task([tasks[i], ir, {}])
+                    new_results[i] = (ir, source, deps, events + source_events)
+                write_outputs(new_results, previous_irs, args)
+            except (Exception, SystemExit) as e:
+                # keep watching, e.g. a header saved half-way through an edit
+                print(f'Regeneration failed: {e}')
+                pending = changed
+                continue
+            results = new_results
+            pending = set()
+            watcher.update(set().union(*(deps for _, _, deps, _ in results)))
+            modules = ', '.join(results[i][0]['module'] for i in source_indices)
+            print(f'Regenerated {modules} in {(time.perf_counter() - start) * 1000:.0f} ms')
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+
+def apply_modes(mode_args):
+    # '--mode library_import=sg_,sgl_' adds to the modes of gen_csharp.module_modes
+    for mode_arg in mode_args:
+        mode, _, prefixes = mode_arg.partition('=')
+        mode = mode.replace('-', '_')
+        if mode not in gen_csharp.emission_modes:
+            raise SystemExit(f"error: --mode {mode_arg}: unknown mode, one of: {', '.join(gen_csharp.emission_modes)}")
+        prefixes = prefixes.split(',') if prefixes else [task[1] for task in tasks]
+        for prefix in prefixes:
+            if prefix not in gen_csharp.module_names:
+                raise SystemExit(f'error: --mode {mode_arg}: unknown module prefix {prefix}')
+            gen_csharp.module_modes[prefix] = sorted(set(gen_csharp.module_modes.get(prefix, [])) | { mode })
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Generate C# bindings from the sokol (and friends) C headers.')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help='max number of parallel generator workers (default: number of CPUs, 1 = serial)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='always run clang and emit every declaration, bypassing the on-disk IR and C# fragment caches')
+    parser.add_argument('--cache-dir', default=None,
+                        help=f'IR cache directory (default: {gen_cache.cache_dir})')
+    parser.add_argument('--cache-size', type=float, default=None, metavar='MB',
+                        help=f'IR cache size limit in MB (default: {gen_cache.max_size // (1024 * 1024)})')
+    parser.add_argument('--ast-filter', action='store_true',
+                        help='only dump the declarations of interest from clang (-ast-dump-filter), see bench.py ast-filter')
+    parser.add_argument('--frontend', choices=gen_ir.frontends, default=gen_ir.frontend,
+                        help='json: clang JSON AST dumps, libclang: in-process libclang Python bindings, '
+                             'which parse shared dependency headers only once per worker, see bench.py frontend (default: json)')
+    parser.add_argument('--ir-json', action='store_true',
+                        help=f'also write the IRs as JSON next to the binary .ir files in {gen_ir.ir_dir}/, for debugging (see gen_irfile.py)')
+    parser.add_argument('--changed-report', default=None, metavar='PATH',
+                        help='write a JSON report of the changed outputs and the build targets they affect')
+    parser.add_argument('--mode', action='append', default=[], metavar='MODE[=PREFIX,...]',
+                        help='enable a C# emission mode for the given module prefixes (default: all modules), '
+                             'see gen_csharp.module_modes, can be repeated')
+    parser.add_argument('--profile', default=None, metavar='PATH',
+                        help='record per-stage timings and peak RSS, write them as a Chrome trace JSON and print a summary')
+    parser.add_argument('--python', action='store_true',
+                        help=f"also generate the Python ctypes modules of {', '.join(gen_python.module_names)} in {gen_python.output_dir}/ (see gen_python.py)")
+    parser.add_argument('--watch', action='store_true',
+                        help='keep running after generating, and regenerate the modules whose headers or C sources change (see gen_watch.py)')
+    parser.add_argument('--watch-poll', action='store_true',
+                        help='with --watch, poll the files for changes instead of using inotify')
+    return parser.parse_args()
+
+def write_outputs(results, previous_irs, args):
+    # writes the outputs of all modules from the results of gen_all_tasks(),
+    # serially in task order so the output is identical to a serial run
+
+    # Clear the auto-detected struct return functions from previous runs
+    gen_csharp.web_wrapper_struct_return_functions = {}
+    gen_csharp.web_direct_struct_return_functions = {}
+    gen_csharp.shared_decls = {}
+
+    trace_events = []
+    outputs = gen_outputs.OutputTracker()
+    all_irs = []
+    fragment_stats = { 'reused': 0, 'emitted': 0 }
+    for task, (task_ir, task_source, _, task_events) in zip(tasks, results):
+        trace_events += task_events
+        if task_source[4] is not None:
+            for key in fragment_stats:
+                fragment_stats[key] += task_source[4][key]
+        [c_header_path, main_prefix, dep_prefixes] = task
+        ir = gen_csharp.gen(c_header_path, main_prefix, dep_prefixes, ir=task_ir, source=task_source, outputs=outputs)
+        all_irs.append(ir)
+    all_modules = [ir['module'] for ir in all_irs]
+
+    # Declarations shared by the modules (only needed by some emission modes)
+    shared_source = gen_csharp.gen_shared_source()
+    shared_output_path = '../src/sokol/generated/Shared.cs'
+    if shared_source is not None:
+        outputs.write(shared_output_path, shared_source, gen_csharp.csharp_target, all_modules)
+    else:
+        outputs.remove(shared_output_path, gen_csharp.csharp_target)
+
+    # Generate C header file with internal wrapper implementations
+    print('Generating C internal wrappers header...')
+    print(f'  Auto-detected {len(gen_csharp.web_wrapper_struct_return_functions)} functions returning structs by value')
+    print(f'  Dropped {len(gen_csharp.web_direct_struct_return_functions)} wrappers for structs returned in a register on wasm32')
+
+    # Generate sokol wrappers header (excludes spine-c)
+    sokol_header_content = gen_csharp.gen_c_internal_wrappers_header(all_irs)
+    sokol_header_output_path = '../ext/sokol_csharp_internal_wrappers.h'
+    outputs.write(sokol_header_output_path, sokol_header_content, 'native:sokol', all_modules)
+    print(f'  Generated Sokol wrappers: {sokol_header_output_path}')
+
+    # Generate spine-c wrappers header (only spine-c functions)
+    spine_header_content = gen_csharp.gen_c_spine_wrappers_header(all_irs)
+    spine_header_output_path = '../ext/spine-c/spine_c_csharp_internal_wrappers.h'
+    outputs.write(spine_header_output_path, spine_header_content, 'native:spine-c', all_modules)
+    print(f'  Generated Spine-C wrappers: {spine_header_output_path}')
+
+    # Generate ozzutil wrappers header (only ozz functions)
+    ozzutil_header_content = gen_csharp.gen_c_ozzutil_wrappers_header(all_irs)
+    ozzutil_header_output_path = '../ext/ozzutil/ozzutil_csharp_internal_wrappers.h'
+    outputs.write(ozzutil_header_output_path, ozzutil_header_content, 'native:ozzutil', all_modules)
+    print(f'  Generated OzzUtil wrappers: {ozzutil_header_output_path}')
+
+    # Generate the command buffer recorder (C#) and dispatcher (C header)
+    commands = gen_csharp.command_buffer_commands(all_irs)
+    command_buffer_output_path = '../src/sokol/generated/CommandBuffer.cs'
+    if commands:
+        outputs.write(command_buffer_output_path, gen_csharp.gen_command_buffer_csharp(commands), gen_csharp.csharp_target, all_modules)
+    else:
+        outputs.remove(command_buffer_output_path, gen_csharp.csharp_target)
+    command_buffer_header_output_path = '../ext/sokol_csharp_command_buffer.h'
+    outputs.write(command_buffer_header_output_path, gen_csharp.gen_c_command_buffer_header(commands), 'native:sokol', all_modules)
+    print(f'  Generated command buffer for {len(commands)} functions: {command_buffer_header_output_path}')
+
+    # Generate the trace hooks capture recorder/replayer (C header) and its C# API
+    trace = gen_csharp.trace_hook_list(all_irs)
+    trace_output_path = '../src/sokol/generated/TraceCapture.cs'
+    trace_header_output_path = '../ext/sokol_csharp_trace.h'
+    if trace is not None:
+        outputs.write(trace_output_path, gen_csharp.gen_trace_capture_csharp(trace), gen_csharp.csharp_target, all_modules)
+        outputs.write(trace_header_output_path, gen_csharp.gen_c_trace_header(trace), 'native:sokol', all_modules)
+        replayed = sum(1 for hook in trace['hooks'] if hook['replay'] is not None)
+        print(f"  Generated trace capture for {len(trace['hooks'])} hooks ({replayed} replayed): {trace_header_output_path}")
+    else:
+        outputs.remove(trace_output_path, gen_csharp.csharp_target)
+        outputs.remove(trace_header_output_path, 'native:sokol')
+
+    # Generate the Python ctypes modules of the asset tools
+    if args.python:
+        gen_python.gen(tasks, all_irs, outputs)
+        print(f'  Generated Python modules: {gen_python.output_dir}')
+
+    # Declaration-level changes against the previous run
+    if fragment_stats['reused']:
+        print(f"Re-emitted declarations: {fragment_stats['emitted']} of {fragment_stats['reused'] + fragment_stats['emitted']}, the others from the fragment cache")
+    api_changes = { ir['module']: gen_apidiff.diff(previous_irs[ir['module']], ir) for ir in all_irs if ir['module'] in previous_irs }
+    if api_changes:
+        print(gen_apidiff.summary(api_changes))
+
+    # Report what actually changed, so CI only rebuilds the affected targets
+    report = outputs.report()
+    report['api_changes'] = { module: changes for module, changes in api_changes.items() if any(changes.values()) }
+    outputs.save()
+    print(f"Changed outputs: {len(report['changed_outputs'])} of {len(outputs.outputs)}")
+    for path in report['changed_outputs']:
+        print(f'  {path}')
+    print(f"Affected targets: {', '.join(report['affected_targets']) or 'none'}")
+    if args.changed_report:
+        with open(args.changed_report, 'w') as f:
+            f.write(json.dumps(report, indent=2))
+
+    if args.profile:
+        gen_profile.record_rss()
+        trace_events += gen_profile.take_events()
+        gen_profile.write_trace(args.profile, trace_events)
+        print(f'Profile written to {args.profile}:')
+        print(gen_profile.summary(trace_events))
+
+if __name__ == '__main__':
+    args = parse_args()
+    gen_cache.configure(not args.no_cache, args.cache_dir, args.cache_size)
+    gen_ir.ast_filter = args.ast_filter
+    gen_ir.frontend = args.frontend
+    gen_ir.json_export = args.ir_json
+    gen_profile.enabled = args.profile is not None
+    apply_modes(args.mode)
+
+    #C Raw
+    gen_csharp.prepare()
+
+    # The previous run's IRs, read before this run replaces them
+    previous_irs = gen_apidiff.load_irs(gen_ir.ir_dir, [gen_csharp.module_names[task[1]] for task in tasks])
+
+    # Generate all modules in parallel, then write the outputs
+    gen_registry.reset()
+    results = gen_all_tasks(args.jobs)
+
+    write_outputs(results, previous_irs, args)
+
+    if args.watch:
+        watch(results, args)
@@ -0,0 +1,158 @@
+#-------------------------------------------------------------------------------
+#   wasm32 C ABI layout and return-value classification for the IR structs.
+#
+#   Mirrors clang's WebAssemblyABIInfo (default, non-multivalue ABI): empty
+#   structs are ignored and single-element structs (one scalar, possibly
+#   nested in single-element structs or 1-element arrays, without padding)
+#   are returned directly as that scalar. All other aggregates are returned
+#   through a hidden 'sret' pointer, which is what the _internal wrappers
+#   work around.
+#
+#   Clang's JSON AST dump doesn't contain record layouts, so sizes and
+#   alignments are computed from the IR field types with wasm32's ILP32
+#   type sizes.
+#-------------------------------------------------------------------------------
+import collections
+import gen_util as util
+
+POINTER_SIZE = 4
+
+# (size, alignment) of the scalar types on wasm32, including the typedefs
+# used as field types by the bound headers
+prim_layouts = {
+    'bool':                 (1, 1),
+    'char':                 (1, 1),
+    'signed char':          (1, 1),
+    'unsigned char':        (1, 1),
+    'int8_t':               (1, 1),
+    'uint8_t':              (1, 1),
+    'short':                (2, 2),
+    'unsigned short':       (2, 2),
+    'int16_t':              (2, 2),
+    'uint16_t':             (2, 2),
+    'int':                  (4, 4),
+    'unsigned int':         (4, 4),
+    'int32_t':              (4, 4),
+    'uint32_t':             (4, 4),
+    'long':                 (4, 4),
+    'unsigned long':        (4, 4),
+    'long long':            (8, 8),
+    'unsigned long long':   (8, 8),
+    'int64_t':              (8, 8),
+    'uint64_t':             (8, 8),
+    'float':                (4, 4),
+    'double':               (8, 8),
+    'size_t':               (4, 4),
+    'uintptr_t':            (4, 4),
+    'intptr_t':             (4, 4),
+    'cgltf_size':           (4, 4),
+    'cgltf_ssize':          (8, 8),
+    'cgltf_int':            (4, 4),
+    'cgltf_uint':           (4, 4),
+    'cgltf_bool':           (4, 4),
+    'cgltf_float':          (4, 4),
+}
+
+# offset, size and type of a struct field
+Field = collections.namedtuple('Field', ['name', 'offset', 'size', 'type'])
+Layout = collections.namedtuple('Layout', ['size', 'align', 'fields'])
+
+def align_up(offset, align):
+    return (offset + align - 1) // align * align
+
+def is_pointer(c_type):
+    return util.is_func_ptr(c_type) or c_type.endswith('*')
+
+def type_layout(c_type, structs, enums, layouts=None):
+    # (size, alignment) of a C type, None if it is unknown
+    c_type = c_type.strip()
+    if util.is_1d_array_type(c_type) or util.is_2d_array_type(c_type):
+        elem = type_layout(util.extract_array_type(c_type), structs, enums, layouts)
+        if elem is None:
+            return None
+        count = 1
+        for num in util.extract_array_sizes(c_type):
+            if not num.isdigit():
+                return None
+            count *= int(num)
+        return elem[0] * count, elem[1]
+    if is_pointer(c_type):
+        return POINTER_SIZE, POINTER_SIZE
+    if c_type.startswith('const '):
+        c_type = c_type[len('const '):]
+    if c_type in prim_layouts:
+        return prim_layouts[c_type]
+    if c_type in enums:
+        return 4, 4
+    if c_type in structs:
+        layout = struct_layout(c_type, structs, enums, layouts)
+        return None if layout is None else (layout.size, layout.align)
+    return None
+
+def struct_layout(struct_name, structs, enums, layouts=None):
+    # sequential C layout, None if a field type is unknown, memoized in
+    # 'layouts' if given (nested structs are laid out once, not once per use)
+    if layouts is not None and struct_name in layouts:
+        return layouts[struct_name]
+    offset = 0
+    align = 1
+    fields = []
+    for field in structs[struct_name]['fields']:
+        field_layout = type_layout(field['type'], structs, enums, layouts)
+        if field_layout is None:
+            if layouts is not None:
+                layouts[struct_name] = None
+            return None
+        size, field_align = field_layout
+        offset = align_up(offset, field_align)
+        fields.append(Field(field.get('name'), offset, size, field['type']))
+        offset += size
+        align = max(align, field_align)
+    layout = Layout(align_up(offset, align), align, fields)
+    if layouts is not None:
+        layouts[struct_name] = layout
+    return layout
+
+def layout_to_json(layout):
+    # lists instead of the namedtuples (which JSON can't tell apart), None
+    # stays None
+    return None if layout is None else [layout.size, layout.align, [list(field) for field in layout.fields]]
+
+def layout_from_json(data):
+    return None if data is None else Layout(data[0], data[1], [Field(*field) for field in data[2]])
+
+def single_element_type(c_type, structs, enums, layouts=None):
+    # the scalar type a single-element aggregate is lowered to, None if it
+    # isn't one (clang's isSingleElementStruct())
+    c_type = c_type.strip()
+    if util.is_1d_array_type(c_type):
+        if util.extract_array_sizes(c_type)[0] != '1':
+            return None
+        c_type = util.extract_array_type(c_type)
+    if c_type not in structs:
+        return c_type if type_layout(c_type, structs, enums, layouts) is not None else None
+    layout = struct_layout(c_type, structs, enums, layouts)
+    if layout is None:
+        return None
+    found = None
+    for field in layout.fields:
+        if field.size == 0:
+            continue    # empty structs and zero-length arrays don't count
+        if found is not None:
+            return None
+        found = single_element_type(field.type, structs, enums, layouts)
+        if found is None:
+            return None
+    if found is None or type_layout(found, structs, enums, layouts)[0] != layout.size:
+        return None
+    return found
+
+def returns_indirect(struct_name, structs, enums, layouts=None):
+    # True if a function returning the struct by value uses a hidden sret
+    # pointer on wasm32, unknown layouts are treated as indirect
+    layout = struct_layout(struct_name, structs, enums, layouts)
+    if layout is None:
+        return True
+    if layout.size == 0:
+        return False
+    return single_element_type(struct_name, structs, enums, layouts) is None
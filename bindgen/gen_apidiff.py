@@ -0,0 +1,99 @@
+#-------------------------------------------------------------------------------
+#   API-change summary between two runs of the bindings generator.
+#
+#   gen.py reads the IRs the previous run left in gen_ir.ir_dir before they
+#   are replaced, and diffs them against the new IRs per declaration, keyed
+#   by kind and name (anonymous enums by their first item). Only the
+#   signatures are compared (function prototypes, struct fields, enum
+#   items), not the comments.
+#-------------------------------------------------------------------------------
+import os
+import gen_irfile
+
+def load_irs(ir_dir, modules):
+    # the IRs of the given modules from the last run, by module, modules
+    # without a (readable) IR are left out
+    irs = {}
+    for module in modules:
+        try:
+            with gen_irfile.load(os.path.join(ir_dir, f'{module}.ir')) as irfile:
+                irs[module] = irfile.to_dict()
+        except (OSError, gen_irfile.IRFormatError):
+            pass
+    return irs
+
+def decl_key(decl):
+    if decl['kind'] == 'consts':
+        return 'consts', decl['items'][0]['name']
+    return decl['kind'], decl['name']
+
+def item_signatures(decl):
+    # the fields of a struct or the items of an enum, by name
+    if decl['kind'] == 'struct':
+        return { field['name']: f"{field['type']} {field['name']}" for field in decl['fields'] }
+    return { item['name']: f"{item['name']} = {item['value']}" if 'value' in item else item['name'] for item in decl['items'] }
+
+def signature(decl):
+    kind = decl['kind']
+    if kind == 'func':
+        result_type = decl['type'][:decl['type'].index('(')].strip()
+        params = ', '.join(f"{param['type']} {param['name']}" for param in decl['params'])
+        return f"{result_type} {decl['name']}({params})"
+    items = '; '.join(item_signatures(decl).values()) if kind == 'struct' else ', '.join(item_signatures(decl).values())
+    if kind == 'consts':
+        return f'enum {{ {items} }}'
+    return f"{kind} {decl['name']} {{ {items} }}"
+
+def item_changes(old, new):
+    # field/item level changes of a struct or enum, as '+ ...', '- ...' and
+    # '~ old => new' lines
+    old_items = item_signatures(old)
+    new_items = item_signatures(new)
+    changes = []
+    for name, item in new_items.items():
+        if name not in old_items:
+            changes.append(f'+ {item}')
+        elif old_items[name] != item:
+            changes.append(f'~ {old_items[name]} => {item}')
+    changes += [f'- {item}' for name, item in old_items.items() if name not in new_items]
+    if not changes and list(old_items) != list(new_items):
+        changes.append('reordered')
+    return changes
+
+def diff(old_ir, new_ir):
+    # added, removed and changed declarations of a module, JSON-serializable
+    old_decls = { decl_key(decl): decl for decl in old_ir['decls'] if not decl['is_dep'] }
+    new_decls = { decl_key(decl): decl for decl in new_ir['decls'] if not decl['is_dep'] }
+    changes = { 'added': [], 'removed': [], 'changed': [] }
+    for key, decl in new_decls.items():
+        old = old_decls.get(key)
+        if old is None:
+            changes['added'].append({ 'kind': key[0], 'name': key[1], 'signature': signature(decl) })
+        elif signature(old) != signature(decl):
+            change = { 'kind': key[0], 'name': key[1], 'old': signature(old), 'new': signature(decl) }
+            if key[0] != 'func':
+                change['items'] = item_changes(old, decl)
+            changes['changed'].append(change)
+    for key, decl in old_decls.items():
+        if key not in new_decls:
+            changes['removed'].append({ 'kind': key[0], 'name': key[1], 'signature': signature(decl) })
+    return changes
+
+def summary(module_changes):
+    # printable summary of the changes by module (as returned by diff())
+    counts = { kind: sum(len(changes[kind]) for changes in module_changes.values()) for kind in ('added', 'removed', 'changed') }
+    lines = [f"API changes: {counts['added']} added, {counts['removed']} removed, {counts['changed']} changed"]
+    for module, changes in module_changes.items():
+        if not any(changes.values()):
+            continue
+        lines.append(f'  {module}:')
+        for change in changes['added']:
+            lines.append(f"    + {change['kind']} {change['name']}: {change['signature']}")
+        for change in changes['removed']:
+            lines.append(f"    - {change['kind']} {change['name']}")
+        for change in changes['changed']:
+            if change['kind'] == 'func':
+                lines.append(f"    ~ func {change['name']}: {change['old']} => {change['new']}")
+            else:
+                lines.append(f"    ~ {change['kind']} {change['name']}: {', '.join(change['items'])}")
+    return '\n'.join(lines)
@@ -0,0 +1,168 @@
+#-------------------------------------------------------------------------------
+#   Persistent on-disk cache for the IR produced by gen_ir.py.
+#
+#   Works like ccache's "direct mode": the lookup key is a hash of everything
+#   that determines the IR except the contents of the included files (clang
+#   identity, command line, prefixes, the IR generator's own source), and each
+#   cache entry records the content hash of every file the translation unit
+#   pulled in (taken from clang's dependency output). A hit only needs to
+#   re-hash those files, so clang is never spawned for an unchanged task.
+#-------------------------------------------------------------------------------
+import gzip, hashlib, json, os, re, shutil, subprocess
+
+CACHE_VERSION = 1
+
+enabled = True
+cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'ir')
+max_size = 256 * 1024 * 1024    # bytes, oldest entries are evicted beyond this
+
+def configure(enable=True, directory=None, size_mb=None):
+    global enabled, cache_dir, max_size
+    enabled = enable
+    if directory is not None:
+        cache_dir = os.path.abspath(directory)
+    if size_mb is not None:
+        max_size = int(size_mb * 1024 * 1024)
+
+def config():
+    # picklable snapshot of the settings, used to configure worker processes
+    return { 'enable': enabled, 'directory': cache_dir, 'size_mb': max_size / (1024 * 1024) }
+
+def hash_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+def hash_file(path):
+    try:
+        with open(path, 'rb') as f:
+            return hash_bytes(f.read())
+    except OSError:
+        return None
+
+def compiler_identity(compiler):
+    # 'clang --version' output, memoized on disk by the binary's path, size
+    # and mtime so that a cache hit doesn't need to spawn the compiler
+    path = shutil.which(compiler)
+    if path is None:
+        return compiler
+    path = os.path.realpath(path)
+    st = os.stat(path)
+    stamp = hash_bytes(f'{path}:{st.st_size}:{st.st_mtime_ns}'.encode())
+    stamp_path = os.path.join(cache_dir, 'compilers', stamp)
+    try:
+        with open(stamp_path, 'r') as f:
+            return f.read()
+    except OSError:
+        pass
+    version = subprocess.check_output([path, '--version']).decode(errors='replace')
+    os.makedirs(os.path.dirname(stamp_path), exist_ok=True)
+    write_atomic(stamp_path, version.encode())
+    return version
+
+def make_key(cmd, parts):
+    h = hashlib.sha256()
+    h.update(f'v{CACHE_VERSION}\n'.encode())
+    h.update(compiler_identity(cmd[0]).encode())
+    for item in cmd[1:]:
+        h.update(f'\0{item}'.encode())
+    for item in parts:
+        h.update(f'\n{item}'.encode())
+    return h.hexdigest()
+
+def entry_path(key):
+    return os.path.join(cache_dir, key[:2], key + '.json.gz')
+
+def lookup_entry(key):
+    # the entry's IR and the content hashes of the files it depends on
+    # ('ir', 'deps'), None on a miss
+    path = entry_path(key)
+    try:
+        with gzip.open(path, 'rb') as f:
+            entry = json.loads(f.read())
+    except (OSError, EOFError, ValueError):
+        return None
+    for dep_path, dep_hash in entry['deps'].items():
+        if hash_file(dep_path) != dep_hash:
+            return None
+    # bump the mtime, eviction drops the least recently used entries first,
+    # another worker's evict() may have removed the entry since it was read
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return entry
+
+def lookup(key):
+    entry = lookup_entry(key)
+    return None if entry is None else entry['ir']
+
+def store(key, dep_paths, ir):
+    deps = {}
+    for dep_path in dep_paths:
+        dep_hash = hash_file(dep_path)
+        if dep_hash is None:
+            return
+        deps[dep_path] = dep_hash
+    path = entry_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    write_atomic(path, gzip.compress(json.dumps({ 'deps': deps, 'ir': ir }).encode(), compresslevel=6))
+    evict()
+
+def write_atomic(path, data):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def evict():
+    entries = []
+    total = 0
+    for root, _, files in os.walk(cache_dir):
+        for name in files:
+            if name.endswith('.json.gz'):
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+    if total <= max_size:
+        return
+    entries.sort()
+    for _, size, path in entries:
+        if total <= max_size:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+def parse_dep_file(path):
+    # parse a make-style dependency file as written by 'clang -MD -MF path'
+    with open(path, 'r') as f:
+        text = f.read()
+    text = text.replace('\\\r\n', ' ').replace('\\\n', ' ')
+    # the target ends at the first ':' followed by whitespace, not at the
+    # one of a Windows drive letter ('C:\\...')
+    match = re.search(r':(\s|$)', text)
+    text = text[match.end():] if match else ''
+    deps = []
+    token = ''
+    i = 0
+    while i < len(text):
+        c = text[i]
+        if c == '\\' and i + 1 < len(text) and text[i + 1] == ' ':
+            token += ' '
+            i += 2
+            continue
+        if c.isspace():
+            if token:
+                deps.append(token)
+                token = ''
+        else:
+            token += c
+        i += 1
+    if token:
+        deps.append(token)
+    return [os.path.abspath(dep) for dep in deps]
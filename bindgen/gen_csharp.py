@@ -9,6 +9,7 @@ import json, re, os, shutil
 import gen_ir
 import sys
 import gen_util as util
+import gen_outputs, gen_profile, gen_abi, gen_registry, gen_cache, gen_fragments
 
 module_names = {
     'slog_':    'SLog',
@@ -60,6 +61,9 @@ library_names = {
 }
 
 
+# build target to rebuild when a generated .cs file changes
+csharp_target = 'csharp:src/sokol/sokol.csproj'
+
 c_source_paths = {
     'slog_':    'c/sokol_log.c',
     'sg_':      'c/sokol_gfx.c',
@@ -88,8 +92,6 @@ c_source_paths = {
 name_ignores = [
     'sdtx_printf',
     'sdtx_vprintf',
-    'sg_install_trace_hooks',
-    'sg_trace_hooks',
     'cgltf_camera',
     'sg_color', # will be create manually inorder to support additional vonversion to Vector3,Vector4,float[] , Span
     'sgimgui_init',
@@ -220,34 +222,339 @@ web_wrapper_functions = {
 }
 
 # AUTO-DETECTED: Functions that return structs by value (detected automatically during binding generation)
-# This dictionary is populated by detect_struct_return_functions() during pre_parse()
+# Each ModuleGenerator detects its own in pre_parse(), gen() merges them in here
+# for the C header generation
 # Format: {'function_name': 'return_type'}
 web_wrapper_struct_return_functions = {}
+# Same for the struct returns which don't need a wrapper (see gen_abi)
+web_direct_struct_return_functions = {}
+
+# Opt-in emission modes per module prefix (can be overridden with gen.py --mode):
+#   'library_import':   functions with a blittable signature are declared as
+#                       [LibraryImport] partial methods, with inline wrappers
+#                       converting string, bool, in/ref/out arguments, see
+#                       ModuleGenerator.gen_func_library_import()
+#   'blittable_structs': bool struct fields are byte-backed and string fields
+#                       are UTF-8 byte pointers with helper properties on all
+#                       platforms (not only WEB), so that all structs of the
+#                       module are blittable and passed without marshalling
+#   'utf8_overloads':   functions with string parameters get additional
+#                       byte* and ReadOnlySpan<byte> overloads, which don't
+#                       allocate (e.g. for "..."u8 literals)
+#   'inline_arrays':    fixed-size array fields use [InlineArray] types shared
+#                       by all modules (one per element type and size) instead
+#                       of a nested struct with one field per element
+#   'profile_shims':    with SOKOL_BINDINGS_PROFILE defined, every native
+#                       function is called through a shim which records its
+#                       call count, time and marshalled bytes in
+#                       BindingsProfile, see ModuleGenerator.gen_extern()
+module_modes = {
+}
+emission_modes = ['library_import', 'blittable_structs', 'utf8_overloads', 'inline_arrays', 'profile_shims']
+
+# C# declarations shared by all modules, collected from the ModuleGenerators
+# by gen() and written into one file by gen.py, see gen_shared_source()
+# Format: {'type_name': ('source', ('modules', 'referenced', ...))}
+shared_decls = {}
+
+# Hot void functions of the sokol library which are also emitted as recorder
+# methods of the C# CommandBuffer class, and dispatched from one native call
+# by the generated sokol_csharp_command_buffer.h (the position in this list is
+# the command id), see gen_command_buffer_csharp()
+command_buffer_functions = [
+    'sg_apply_viewport',
+    'sg_apply_viewportf',
+    'sg_apply_scissor_rect',
+    'sg_apply_scissor_rectf',
+    'sg_apply_pipeline',
+    'sg_apply_bindings',
+    'sg_apply_uniforms',
+    'sg_draw',
+    'sgl_defaults',
+    'sgl_viewport',
+    'sgl_scissor_rect',
+    'sgl_load_pipeline',
+    'sgl_matrix_mode_modelview',
+    'sgl_load_identity',
+    'sgl_push_matrix',
+    'sgl_pop_matrix',
+    'sgl_translate',
+    'sgl_rotate',
+    'sgl_scale',
+    'sgl_begin_points',
+    'sgl_begin_lines',
+    'sgl_begin_triangles',
+    'sgl_begin_quads',
+    'sgl_end',
+    'sgl_t2f',
+    'sgl_c3f',
+    'sgl_c4f',
+    'sgl_c4b',
+    'sgl_v2f',
+    'sgl_v3f',
+    'sgl_v2f_c4b',
+    'sgl_v3f_c4b',
+    'sgl_v2f_t2f',
+    'sgl_v3f_t2f',
+    'sgl_v3f_t2f_c4b',
+    'sdtx_canvas',
+    'sdtx_origin',
+    'sdtx_home',
+    'sdtx_pos',
+    'sdtx_move',
+    'sdtx_crlf',
+    'sdtx_font',
+    'sdtx_color3b',
+    'sdtx_color4b',
+    'sdtx_color1i',
+    'sdtx_putc',
+    'sdtx_puts',
+    'sdtx_putr',
+]
 
-struct_types = []
-enum_types = []
-enum_items = {}
-out_lines = ''
-current_library_name = 'sokol'  # Default library name, will be set per module
-
-def reset_globals():
-    global struct_types
-    global enum_types
-    global enum_items
-    global out_lines
-    global web_wrapper_struct_return_functions
-    global current_library_name
-    struct_types = []
-    enum_types = []
-    enum_items = {}
-    out_lines = ''
-    current_library_name = 'sokol'  # Reset to default
-    # Note: web_wrapper_struct_return_functions is NOT reset here
-    # It accumulates across all modules for the C header generation
-
-def l(s):
-    global out_lines
-    out_lines += s + '\n'
+# (module prefix, hooks struct, install function) of the trace hooks which are
+# recorded into binary captures and replayed by the generated sokol_csharp_trace.h,
+# see gen_c_trace_header()
+trace_hooks = ('sg_', 'sg_trace_hooks', 'sg_install_trace_hooks')
+
+owned_utf8_source = '''public static unsafe class OwnedUtf8
+{
+    // the native copies made by the string setters of blittable structs,
+    // a pointer which came from somewhere else (like a "..."u8 literal
+    // assigned through the Utf8 property) is never freed
+    private static readonly System.Collections.Generic.HashSet<IntPtr> owned = new();
+
+    public static byte* Alloc(string value)
+    {
+        if (value == null)
+        {
+            return null;
+        }
+        IntPtr ptr = Marshal.StringToCoTaskMemUTF8(value);
+        lock (owned)
+        {
+            owned.Add(ptr);
+        }
+        return (byte*)ptr;
+    }
+
+    public static void Free(byte* ptr)
+    {
+        lock (owned)
+        {
+            if (!owned.Remove((IntPtr)ptr))
+            {
+                return;
+            }
+        }
+        Marshal.FreeCoTaskMem((IntPtr)ptr);
+    }
+}
+'''
+
+null_terminated_utf8_source = '''#nullable enable
+// a null-terminated UTF-8 string for the ReadOnlySpan<byte> overloads,
+// without an allocation per call
+public unsafe ref struct NullTerminatedUtf8
+{
+    public const int StackBufferSize = 256;
+
+    private static readonly byte[] empty = { 0 };
+    private byte[]? rented;
+
+    // the null-terminated string, pinned with fixed
+    public ReadOnlySpan<byte> Span;
+
+    // the string itself if it is null-terminated, otherwise a null-terminated
+    // copy in buffer, or in an array rented from ArrayPool<byte>.Shared
+    // until Dispose() if it doesn't fit, an empty string becomes "\\0"
+    // (not a null pointer, C expects a string)
+    public NullTerminatedUtf8(ReadOnlySpan<byte> str, Span<byte> buffer)
+    {
+        rented = null;
+        if (str.IndexOf((byte)0) >= 0)
+        {
+            Span = str;
+            return;
+        }
+        Span<byte> copy = buffer;
+        if (str.Length >= buffer.Length)
+        {
+            rented = System.Buffers.ArrayPool<byte>.Shared.Rent(str.Length + 1);
+            copy = rented;
+        }
+        str.CopyTo(copy);
+        copy[str.Length] = 0;
+        Span = copy.Slice(0, str.Length + 1);
+    }
+
+    public void Dispose()
+    {
+        if (rented != null)
+        {
+            System.Buffers.ArrayPool<byte>.Shared.Return(rented);
+            rented = null;
+        }
+    }
+
+    // a (str, end) range is pinned as it is (end bounds it, it needs no
+    // terminator), only an empty span is replaced by "\\0", pinning it
+    // would give a null pointer
+    public static ReadOnlySpan<byte> NonEmpty(ReadOnlySpan<byte> str)
+    {
+        return str.IsEmpty ? empty : str;
+    }
+}
+#nullable restore
+'''
+
+bindings_profile_source = '''#if SOKOL_BINDINGS_PROFILE
+// Call counts, time and marshalled bytes per native function, recorded by
+// the shims of the modules generated in 'profile_shims' mode
+public static class BindingsProfile
+{
+    // one table per module, indexed by the function ids of the module's shims
+    public sealed class Table
+    {
+        public readonly string Module;
+        public readonly string[] Functions;
+        internal readonly long[] Calls;
+        internal readonly long[] Ticks;
+        internal readonly long[] Bytes;
+
+        internal Table(string module, string[] functions)
+        {
+            Module = module;
+            Functions = functions;
+            Calls = new long[functions.Length];
+            Ticks = new long[functions.Length];
+            Bytes = new long[functions.Length];
+        }
+
+        [MethodImpl(MethodImplOptions.AggressiveInlining)]
+        public void Record(int id, long start, long bytes)
+        {
+            long ticks = System.Diagnostics.Stopwatch.GetTimestamp() - start;
+            System.Threading.Interlocked.Increment(ref Calls[id]);
+            System.Threading.Interlocked.Add(ref Ticks[id], ticks);
+            System.Threading.Interlocked.Add(ref Bytes[id], bytes);
+        }
+    }
+
+    public struct Entry
+    {
+        public string Module;
+        public string Function;
+        public long Calls;
+        public double Milliseconds;
+        public long Bytes;
+    }
+
+    private static Table[] tables = Array.Empty<Table>();
+
+    public static Table Register(string module, string[] functions)
+    {
+        var table = new Table(module, functions);
+        lock (typeof(BindingsProfile))
+        {
+            var registered = new Table[tables.Length + 1];
+            tables.CopyTo(registered, 0);
+            registered[tables.Length] = table;
+            tables = registered;
+        }
+        return table;
+    }
+
+    // the functions which were called since the last Reset(), by total time
+    public static Entry[] Snapshot()
+    {
+        var entries = new System.Collections.Generic.List<Entry>();
+        foreach (var table in tables)
+        {
+            for (int id = 0; id < table.Functions.Length; id++)
+            {
+                long calls = System.Threading.Interlocked.Read(ref table.Calls[id]);
+                if (calls == 0)
+                {
+                    continue;
+                }
+                entries.Add(new Entry
+                {
+                    Module = table.Module,
+                    Function = table.Functions[id],
+                    Calls = calls,
+                    Milliseconds = System.Threading.Interlocked.Read(ref table.Ticks[id]) * 1000.0 / System.Diagnostics.Stopwatch.Frequency,
+                    Bytes = System.Threading.Interlocked.Read(ref table.Bytes[id]),
+                });
+            }
+        }
+        entries.Sort((a, b) => b.Milliseconds.CompareTo(a.Milliseconds));
+        return entries.ToArray();
+    }
+
+    public static string Dump()
+    {
+        var text = new System.Text.StringBuilder();
+        text.AppendLine($"{"function",-48} {"calls",10} {"total ms",10} {"mean us",10} {"bytes",12}");
+        foreach (var entry in Snapshot())
+        {
+            text.AppendLine($"{entry.Function,-48} {entry.Calls,10} {entry.Milliseconds,10:F2} {entry.Milliseconds * 1000.0 / entry.Calls,10:F3} {entry.Bytes,12}");
+        }
+        return text.ToString();
+    }
+
+    public static void Reset()
+    {
+        foreach (var table in tables)
+        {
+            Array.Clear(table.Calls);
+            Array.Clear(table.Ticks);
+            Array.Clear(table.Bytes);
+        }
+    }
+}
+#endif
+'''
+
+def parse_csharp_params(args):
+    # (modifier, type, name) of the parameters in a C# parameter list as
+    # generated by funcdecl_args_csharp(), without marshalling attributes
+    params = []
+    for arg in args.split(','):
+        arg = arg.strip()
+        if not arg:
+            continue
+        if arg.startswith('['):
+            arg = arg[arg.index(']') + 1:].strip()
+        modifier = ''
+        for m in ('in ', 'ref ', 'out '):
+            if arg.startswith(m):
+                modifier = m.strip()
+                arg = arg[len(m):].strip()
+        arg_type, name = arg.rsplit(None, 1) if ' ' in arg else arg.rsplit('*', 1)
+        params.append((modifier, arg_type.strip(), name.strip()))
+    return params
+
+def marshalled_size(csharp_type, name=None, modifier=''):
+    # C# expression for the number of bytes passed for a parameter or result,
+    # in/ref/out parameters are passed as a pointer, bool as a 4-byte BOOL
+    # (the default marshalling, the declarations have no MarshalAs for it)
+    if modifier:
+        return 'IntPtr.Size'
+    if csharp_type == 'string':
+        return f'({name} == null ? 0 : Encoding.UTF8.GetByteCount({name}) + 1)' if name else 'IntPtr.Size'
+    if '*' in csharp_type or csharp_type == 'IntPtr':
+        return 'IntPtr.Size'
+    if csharp_type == 'bool':
+        return '4'
+    return f'Unsafe.SizeOf<{csharp_type}>()'
+
+def as_call_arg(param_name, csharp_type):
+    # forward a parameter, with its in/ref/out modifier
+    for modifier in ('in ', 'ref ', 'out '):
+        if csharp_type.startswith(modifier):
+            return f"{modifier}{param_name}"
+    return param_name
 
 def as_csharp_prim_type(s):
     return prim_types[s]
@@ -287,18 +594,9 @@ def as_pascal_case(s, prefix):
 def as_enum_item_name(s):
     return s
 
-def enum_default_item(enum_name):
-    return enum_items[enum_name][0]
-
 def is_prim_type(s):
     return s in prim_types
 
-def is_struct_type(s):
-    return s in struct_types
-
-def is_enum_type(s):
-    return s in enum_types
-
 def is_string_ptr(s):
     return s == "const char *"
 
@@ -308,45 +606,28 @@ def is_const_void_ptr(s):
 def is_void_ptr(s):
     return s == "void *"
 
+# identifiers in a spelled C type, see ModuleGenerator.decl_type_names()
+type_name_re = re.compile(r'[A-Za-z_]\w*')
+
+# Classification index of spelled C types: type string => set of classes.
+# The primitive types are fixed, each ModuleGenerator adds its struct and
+# enum types in pre_parse(), so all type predicates are dict lookups.
+def add_type_class(type_classes, s, type_class):
+    type_classes.setdefault(s, set()).add(type_class)
+
+prim_type_classes = {}
+for prim_type in prim_types:
+    add_type_class(prim_type_classes, f"{prim_type} *", 'prim_ptr')
+    add_type_class(prim_type_classes, f"const {prim_type} *", 'const_prim_ptr')
+
 def is_const_prim_ptr(s):
-    for prim_type in prim_types:
-        if s == f"const {prim_type} *":
-            return True
-    return False
+    return 'const_prim_ptr' in prim_type_classes.get(s, ())
 
 def is_prim_ptr(s):
-    for prim_type in prim_types:
-        if s == f"{prim_type} *":
-            return True
-    return False
-
-def is_struct_ptr(s):
-    for struct_type in struct_types:
-        if s == f"{struct_type} *":
-            return True
-    return False
-
-def is_struct_ptr_ptr(s):
-    for struct_type in struct_types:
-        if s == f"{struct_type} **":
-            return True
-    return False
-
-def is_const_struct_ptr(s):
-    for struct_type in struct_types:
-        if s == f"const {struct_type} *":
-            return True
-    return False
-
-def is_const_struct_sturct_ptr(s):
-    for struct_type in struct_types:
-        if s == f"const struct {struct_type} *":
-            return True
-    return False
-
+    return 'prim_ptr' in prim_type_classes.get(s, ())
 
 def is_func_ptr(s):
-    return '(*)' in s
+    return util.is_func_ptr(s)
 
 def type_default_value(s):
     return prim_defaults[s]
@@ -363,142 +644,8 @@ def extract_ptr_type(s):
     s = s.replace('const', '').replace('*', '').strip()
     return s
 
-def as_extern_c_arg_type(arg_type, prefix):
-    if arg_type == "void":
-        return "void"
-    elif is_prim_type(arg_type):
-        return as_csharp_prim_type(arg_type)
-    elif is_struct_type(arg_type):
-        return as_csharp_struct_type(arg_type, prefix)
-    elif is_enum_type(arg_type):
-        return as_csharp_enum_type(arg_type, prefix)
-    elif is_void_ptr(arg_type):
-        return "void*"
-    elif is_const_void_ptr(arg_type):
-        return "void*"
-    elif is_string_ptr(arg_type):
-        return "byte*"
-    elif is_const_struct_ptr(arg_type):
-        return f"{as_csharp_struct_type(extract_ptr_type(arg_type), prefix)}*"
-    elif is_const_struct_sturct_ptr(arg_type):
-        return f"void *" 
-    elif is_prim_ptr(arg_type):
-        return f"{as_csharp_prim_type(extract_ptr_type(arg_type))}*"
-    elif is_const_prim_ptr(arg_type):
-        return f"{as_csharp_prim_type(extract_ptr_type(arg_type))}*"
-    else:
-        return '??? (as_extern_c_arg_type)'
-
-
-def as_csharp_arg_type(arg_prefix, arg_type, prefix):
-    # NOTE: if arg_prefix is None, the result is used as return value
-    pre = "" if arg_prefix is None else arg_prefix
-    if arg_type == "void":
-        if arg_prefix is None:
-            return "void"
-        else:
-            return ""
-    elif arg_type.startswith("const ImVec4 *"):
-        return f"ImVec4_t *{pre}"
-    elif is_prim_type(arg_type):
-        return as_csharp_prim_type(arg_type) + pre
-    elif is_struct_type(arg_type):
-        return as_csharp_struct_type(arg_type, prefix) + pre
-    elif is_enum_type(arg_type):
-        return as_csharp_enum_type(arg_type, prefix) + pre
-    elif is_void_ptr(arg_type):
-        return "void*" + pre
-    elif is_const_void_ptr(arg_type):
-        return "void*" + pre
-    elif is_string_ptr(arg_type):
-        return "string" + pre
-    elif is_const_struct_ptr(arg_type):
-        # not a bug, pass const structs by value
-        return f"in {as_csharp_struct_type(extract_ptr_type(arg_type), prefix)}" + pre
-    elif is_struct_ptr(arg_type):
-        # For struct pointers, use pointer syntax (cgltf_data*) not ref
-        return f"{as_csharp_struct_type(extract_ptr_type(arg_type), prefix)}*" + pre
-    elif is_prim_ptr(arg_type):
-        if arg_prefix is None:
-            # Return type: use pointer syntax
-            return f"{as_csharp_prim_type(extract_ptr_type(arg_type))}*" + pre
-        else:
-            # Parameter: use ref
-            return f"ref {as_csharp_prim_type(extract_ptr_type(arg_type))}" + pre
-    elif is_const_prim_ptr(arg_type):
-        if arg_prefix is None:
-            # Return type: use pointer syntax
-            return f"{as_csharp_prim_type(extract_ptr_type(arg_type))}*" + pre
-        else:
-            # Parameter: use in
-            return f"in {as_csharp_prim_type(extract_ptr_type(arg_type))}" + pre
-    # Explicit handling for specific SGP types:
-    elif arg_type.startswith("const sgp_point *"):
-        return f"in sgp_vec2{pre}"
-    elif arg_type.startswith("sgp_state *"):
-        return f"ref sgp_state{pre}"
-    elif arg_type.startswith("cgltf_data **"):
-        return f" out cgltf_data *{pre}"
-    elif arg_type.startswith("cgltf_data *"):
-        return f"cgltf_data *{pre}"
-    elif arg_type.startswith("void **"):
-        return f" out IntPtr{pre}"
-    elif arg_type.startswith("float **"):
-        return f" out float *{pre}"
-    elif arg_type.startswith("const char **"):
-        return f" out byte *{pre}"
-    elif arg_type.startswith("const struct cgltf_memory_options*"):
-        return f"in cgltf_memory_options{pre}"
-    elif arg_type.startswith("const struct cgltf_file_options*"):
-        return f"in cgltf_file_options{pre}"
-    elif arg_type.startswith("const cgltf_sampler *"):
-        return f"in cgltf_sampler{pre}"
-    elif arg_type.startswith("cgltf_accessor *"):
-        return f"cgltf_accessor *"
-    elif arg_type.startswith("FONScontext *"):
-        return f"IntPtr{pre}"
-    elif arg_type.startswith("FONSparams *"):
-        return f"IntPtr{pre}"
-    elif arg_type.startswith("FONStextIter *"):
-        return f"IntPtr{pre}"
-    elif arg_type.startswith("struct FONSquad *"):
-        return f"IntPtr{pre}"
-    elif arg_type.startswith("const unsigned char *"):
-        return f"byte *{pre}"
-    elif arg_type.startswith("unsigned char *"):
-        return f"byte *{pre}"
-    # ozz-animation types
-    elif arg_type.startswith("const ozz_desc_t *"):
-        return f"in ozz_desc_t{pre}"
-    elif arg_type.startswith("ozz_instance_t *"):
-        return f"IntPtr{pre}"  # Handle as opaque pointer
-    elif arg_type.startswith("ozz_t"):
-        return f"IntPtr{pre}"  # Handle as opaque pointer
-    else:
-        print(f"[DEBUG] as_csharp_arg_type not handled for arg_type: '{arg_type}', arg_prefix: '{arg_prefix}', prefix: '{prefix}'", file=sys.stderr, flush=True)
-        if arg_prefix is None:
-            return "IntPtr  /* ??? (as_csharp_arg_type) */"
-        else:
-            return arg_prefix + "IntPtr  /* ??? (as_csharp_arg_type) */"
-
-# get C-style arguments of a function pointer as string
-def funcptr_args_c(field_type, prefix):
-    tokens = field_type[field_type.index('(*)')+4:-1].split(',')
-    s = ""
-    for token in tokens:
-        arg_type = token.strip()
-        if s != "":
-            s += ", "
-        c_arg = as_extern_c_arg_type(arg_type, prefix)
-        if (c_arg == "void"):
-            return ""
-        else:
-            s += c_arg
-    return s
-
-# get C-style result of a function pointer as string
 def funcptr_res_c(field_type):
-    res_type = field_type[:field_type.index('(*)')].strip()
+    res_type = util.parse_c_type(field_type).func_ptr.result
     if res_type == 'void':
         return 'void'
     elif is_const_void_ptr(res_type):
@@ -506,398 +653,1098 @@ def funcptr_res_c(field_type):
     else:
         return 'void*'
 
-def funcdecl_args_c(decl, prefix):
-    s = ""
-    func_name = decl['name']
-    for param_decl in decl['params']:
-        if s != "":
-            s += ", "
-        param_name = param_decl['name']
-        param_type = check_type_override(func_name, param_name, param_decl['type'])
-        s += as_extern_c_arg_type(param_type, prefix)
-    return s
-
-def funcdecl_args_csharp(decl, prefix):
-    s = ""
-    func_name = decl['name']
-    for param_decl in decl['params']:
-        if s != "":
-            s += ", "
-        param_name = check_name_override(param_decl['name'])
-        param_type = check_type_override(func_name, param_name, param_decl['type'])
-
-        if is_string_ptr(param_type):
-            s += "[M(U.LPUTF8Str)] "
+class ModuleGenerator:
+    """
+    Generates the C# source of one module. All generation state lives in the
+    instance, so several modules can be generated concurrently (in threads or
+    worker processes).
+    """
+    def __init__(self, library_name='sokol', modes=()):
+        self.library_name = library_name
+        self.modes = set(modes)
+        self.struct_types = []
+        self.enum_types = []
+        self.enum_items = {}
+        # struct and enum part of the type classification index, see add_type_class()
+        self.type_classes = {}
+        # struct declarations by name (including dependencies), and memoized
+        # results of is_blittable_struct()
+        self.struct_decls = {}
+        self.enum_decls = {}
+        self.blittable_structs = {}
+        # memoized wasm32 struct layouts (None until needed), see layouts()
+        self.struct_layouts = None
+        # functions of this module returning structs by value, see
+        # detect_struct_return_functions()
+        self.struct_return_functions = {}
+        # functions returning structs by value which the wasm32 ABI returns
+        # in a register (no wrapper needed), see gen_abi.returns_indirect()
+        self.direct_struct_return_functions = {}
+        # declarations shared by all modules (emitted once into Shared.cs),
+        # by name, see gen_shared_source()
+        self.shared_decls = {}
+        # native functions by the ids of their 'profile_shims' shims, see gen_extern()
+        self.profile_ids = {}
+        # the per-declaration fragment cache (None to emit every declaration),
+        # and the shared declarations used by the declaration being emitted,
+        # see gen_decl_fragment()
+        self.fragments = None
+        self.fragment_shared_decls = set()
+        # identifiers by type string and type override types by function or
+        # struct name, see decl_type_names()
+        self.type_string_names = {}
+        self.type_override_types = {}
+        for name, override_type in type_overrides.items():
+            self.type_override_types.setdefault(name.split('.')[0], []).append(override_type)
+        self.out_lines = []
+
+    def output(self):
+        return ''.join(self.out_lines)
+
+    def l(self, s):
+        self.out_lines.append(s + '\n')
+
+    def enum_default_item(self, enum_name):
+        return self.enum_items[enum_name][0]
+
+    def is_struct_type(self, s):
+        return 'struct' in self.type_classes.get(s, ())
+
+    def is_enum_type(self, s):
+        return 'enum' in self.type_classes.get(s, ())
+
+    def is_struct_ptr(self, s):
+        return 'struct_ptr' in self.type_classes.get(s, ())
+
+    def is_struct_ptr_ptr(self, s):
+        return 'struct_ptr_ptr' in self.type_classes.get(s, ())
+
+    def is_const_struct_ptr(self, s):
+        return 'const_struct_ptr' in self.type_classes.get(s, ())
+
+    def is_const_struct_sturct_ptr(self, s):
+        return 'const_struct_struct_ptr' in self.type_classes.get(s, ())
+
+    def add_struct_type(self, struct_type):
+        self.struct_types.append(struct_type)
+        add_type_class(self.type_classes, struct_type, 'struct')
+        add_type_class(self.type_classes, f"{struct_type} *", 'struct_ptr')
+        add_type_class(self.type_classes, f"{struct_type} **", 'struct_ptr_ptr')
+        add_type_class(self.type_classes, f"const {struct_type} *", 'const_struct_ptr')
+        add_type_class(self.type_classes, f"const struct {struct_type} *", 'const_struct_struct_ptr')
+
+    def struct_has_mode(self, struct_type, mode):
+        # modes of the module which emits the struct, which may be a dependency
+        dep_prefix = self.struct_decls[struct_type].get('dep_prefix')
+        if dep_prefix is None:
+            return mode in self.modes
+        return mode in module_modes.get(dep_prefix, ())
+
+    def is_blittable_struct(self, struct_type):
+        # bool and string fields are marshalled (outside of WEB, unless in
+        # 'blittable_structs' mode), which makes the struct and every struct
+        # embedding it non-blittable
+        if struct_type not in self.blittable_structs:
+            self.blittable_structs[struct_type] = self.type_result(struct_type, 'blittable', lambda: self.struct_fields_blittable(struct_type))
+        return self.blittable_structs[struct_type]
+
+    def struct_fields_blittable(self, struct_type):
+        blittable_fields = self.struct_has_mode(struct_type, 'blittable_structs')
+        for field in self.struct_decls[struct_type]['fields']:
+            field_type = check_type_override(struct_type, as_pascal_case(check_name_override(field['name']), ""), field['type'])
+            if util.is_1d_array_type(field_type) or util.is_2d_array_type(field_type):
+                field_type = util.extract_array_type(field_type)
+            if not blittable_fields and (field_type == 'bool' or util.is_string_ptr(field_type)):
+                return False
+            elif field_type in self.struct_decls and not self.is_blittable_struct(field_type):
+                return False
+        return True
+
+    def layouts(self):
+        # the memo for gen_abi.struct_layout(), with the layouts of the
+        # unchanged structs from the fragment cache, so that a changed struct
+        # only lays out itself (and the other changed ones)
+        if self.struct_layouts is None:
+            self.struct_layouts = {}
+            if self.fragments is not None:
+                for name in self.struct_decls:
+                    results = self.fragments.type_results(name)
+                    if 'layout' in results:
+                        self.struct_layouts[name] = gen_abi.layout_from_json(results['layout'])
+        return self.struct_layouts
+
+    def type_result(self, type_name, key, compute):
+        # compute() derived from a struct or enum type alone, reused from the
+        # fragment cache if the type didn't change since the last run
+        results = self.fragments.type_results(type_name) if self.fragments is not None else None
+        if results is None:
+            return compute()
+        if key not in results:
+            results[key] = compute()
+        return results[key]
+
+    def add_enum_type(self, enum_type):
+        self.enum_types.append(enum_type)
+        add_type_class(self.type_classes, enum_type, 'enum')
+
+    def as_extern_c_arg_type(self, arg_type, prefix):
+        if arg_type == "void":
+            return "void"
+        elif is_prim_type(arg_type):
+            return as_csharp_prim_type(arg_type)
+        elif self.is_struct_type(arg_type):
+            return as_csharp_struct_type(arg_type, prefix)
+        elif self.is_enum_type(arg_type):
+            return as_csharp_enum_type(arg_type, prefix)
+        elif is_void_ptr(arg_type):
+            return "void*"
+        elif is_const_void_ptr(arg_type):
+            return "void*"
+        elif is_string_ptr(arg_type):
+            return "byte*"
+        elif self.is_const_struct_ptr(arg_type):
+            return f"{as_csharp_struct_type(extract_ptr_type(arg_type), prefix)}*"
+        elif self.is_const_struct_sturct_ptr(arg_type):
+            return f"void *" 
+        elif is_prim_ptr(arg_type):
+            return f"{as_csharp_prim_type(extract_ptr_type(arg_type))}*"
+        elif is_const_prim_ptr(arg_type):
+            return f"{as_csharp_prim_type(extract_ptr_type(arg_type))}*"
+        else:
+            return '??? (as_extern_c_arg_type)'
 
-        s += f"{as_csharp_arg_type(f' {param_name}', param_type, prefix)}"
-    return s
 
-def funcdecl_result_c(decl, prefix):
-    func_name = decl['name']
-    decl_type = decl['type']
-    result_type = check_type_override(func_name, 'RESULT', decl_type[:decl_type.index('(')].strip())
-    return as_extern_c_arg_type(result_type, prefix)
-
-def funcdecl_result_csharp(decl, prefix):
-    func_name = decl['name']
-    decl_type = decl['type']
-    result_type = check_type_override(func_name, 'RESULT', decl_type[:decl_type.index('(')].strip())
-    csharp_res_type = as_csharp_arg_type(None, result_type, prefix)
-    if csharp_res_type == "":
-        csharp_res_type = "void"
-    return csharp_res_type
-
-def gen_struct(decl, prefix):
-    struct_name = decl['name']
-    csharp_type = as_csharp_struct_type(struct_name, prefix)
-    l(f"[StructLayout(LayoutKind.Sequential)]")
-    l(f"public struct {csharp_type}")
-    l("{")
-    for field in decl['fields']:
-        field_name = as_pascal_case(check_name_override(field['name']), "")
-        field_type = field['type']
-        field_type = check_type_override(struct_name, field_name, field_type)
-        if field_type == "bool":
-            # Conditional for bool fields with properties
-            l("#if WEB")
-            l(f"    private byte _{field_name};")
-            l(f"    public bool {field_name} {{ get => _{field_name} != 0; set => _{field_name} = value ? (byte)1 : (byte)0; }}")
-            l("#else")
-            l(f"    [M(U.I1)] public bool {field_name};")
-            l("#endif")
-        elif is_prim_type(field_type):
-            l(f"    public {as_csharp_prim_type(field_type)} {field_name};")
-        elif is_struct_type(field_type):
-            l(f"    public {as_csharp_struct_type(field_type, prefix)} {field_name};")
-        elif is_enum_type(field_type):
-            l(f"    public {as_csharp_enum_type(field_type, prefix)} {field_name};")
-        elif util.is_string_ptr(field_type):
-            # Conditional for string fields with properties
-            l("#if WEB")
-            l(f"    private IntPtr _{field_name};")
-            l(f"    public string {field_name} {{ get => Marshal.PtrToStringAnsi(_{field_name});  set {{ if (_{field_name} != IntPtr.Zero) {{ Marshal.FreeHGlobal(_{field_name}); _{field_name} = IntPtr.Zero; }} if (value != null) {{ _{field_name} = Marshal.StringToHGlobalAnsi(value); }} }} }}")
-            l("#else")
-            l(f"    [M(U.LPUTF8Str)] public string {field_name};")
-            l("#endif")
-        elif util.is_const_void_ptr(field_type):
-            l(f"    public void* {field_name};")
-        elif util.is_void_ptr(field_type):
-            l(f"    public void* {field_name};")
-        elif is_const_prim_ptr(field_type):
-            l(f"    public {as_csharp_prim_type(extract_ptr_type(field_type))}* {field_name};")
-        elif is_struct_ptr(field_type):
-            l(f"    public {as_csharp_struct_type(extract_ptr_type(field_type), prefix)}* {field_name};")
-        elif is_struct_ptr_ptr(field_type):
-            l(f"    public {as_csharp_struct_type(extract_ptr_type(field_type), prefix)}** {field_name};")
-        elif util.is_func_ptr(field_type):
-            args = funcptr_args_c(field_type, prefix)
-            if args != "":
-                args += ", "
-            l(f"    public delegate* unmanaged<{args}{funcptr_res_c(field_type)}> {field_name};")
-        elif util.is_1d_array_type(field_type):
-            array_type = util.extract_array_type(field_type)
-            array_nums = util.extract_array_sizes(field_type)
-            if is_prim_type(array_type) or is_struct_type(array_type) or is_enum_type(array_type)  or is_const_void_ptr(array_type):
-                if is_prim_type(array_type):
+    def as_csharp_arg_type(self, arg_prefix, arg_type, prefix):
+        # NOTE: if arg_prefix is None, the result is used as return value
+        pre = "" if arg_prefix is None else arg_prefix
+        if arg_type == "void":
+            if arg_prefix is None:
+                return "void"
+            else:
+                return ""
+        elif arg_type.startswith("const ImVec4 *"):
+            return f"ImVec4_t *{pre}"
+        elif is_prim_type(arg_type):
+            return as_csharp_prim_type(arg_type) + pre
+        elif self.is_struct_type(arg_type):
+            return as_csharp_struct_type(arg_type, prefix) + pre
+        elif self.is_enum_type(arg_type):
+            return as_csharp_enum_type(arg_type, prefix) + pre
+        elif is_void_ptr(arg_type):
+            return "void*" + pre
+        elif is_const_void_ptr(arg_type):
+            return "void*" + pre
+        elif is_string_ptr(arg_type):
+            return "string" + pre
+        elif self.is_const_struct_ptr(arg_type):
+            # not a bug, pass const structs by value
+            return f"in {as_csharp_struct_type(extract_ptr_type(arg_type), prefix)}" + pre
+        elif self.is_struct_ptr(arg_type):
+            # For struct pointers, use pointer syntax (cgltf_data*) not ref
+            return f"{as_csharp_struct_type(extract_ptr_type(arg_type), prefix)}*" + pre
+        elif is_prim_ptr(arg_type):
+            if arg_prefix is None:
+                # Return type: use pointer syntax
+                return f"{as_csharp_prim_type(extract_ptr_type(arg_type))}*" + pre
+            else:
+                # Parameter: use ref
+                return f"ref {as_csharp_prim_type(extract_ptr_type(arg_type))}" + pre
+        elif is_const_prim_ptr(arg_type):
+            if arg_prefix is None:
+                # Return type: use pointer syntax
+                return f"{as_csharp_prim_type(extract_ptr_type(arg_type))}*" + pre
+            else:
+                # Parameter: use in
+                return f"in {as_csharp_prim_type(extract_ptr_type(arg_type))}" + pre
+        # Explicit handling for specific SGP types:
+        elif arg_type.startswith("const sgp_point *"):
+            return f"in sgp_vec2{pre}"
+        elif arg_type.startswith("sgp_state *"):
+            return f"ref sgp_state{pre}"
+        elif arg_type.startswith("cgltf_data **"):
+            return f" out cgltf_data *{pre}"
+        elif arg_type.startswith("cgltf_data *"):
+            return f"cgltf_data *{pre}"
+        elif arg_type.startswith("void **"):
+            return f" out IntPtr{pre}"
+        elif arg_type.startswith("float **"):
+            return f" out float *{pre}"
+        elif arg_type.startswith("const char **"):
+            return f" out byte *{pre}"
+        elif arg_type.startswith("const struct cgltf_memory_options*"):
+            return f"in cgltf_memory_options{pre}"
+        elif arg_type.startswith("const struct cgltf_file_options*"):
+            return f"in cgltf_file_options{pre}"
+        elif arg_type.startswith("const cgltf_sampler *"):
+            return f"in cgltf_sampler{pre}"
+        elif arg_type.startswith("cgltf_accessor *"):
+            return f"cgltf_accessor *"
+        elif arg_type.startswith("FONScontext *"):
+            return f"IntPtr{pre}"
+        elif arg_type.startswith("FONSparams *"):
+            return f"IntPtr{pre}"
+        elif arg_type.startswith("FONStextIter *"):
+            return f"IntPtr{pre}"
+        elif arg_type.startswith("struct FONSquad *"):
+            return f"IntPtr{pre}"
+        elif arg_type.startswith("const unsigned char *"):
+            return f"byte *{pre}"
+        elif arg_type.startswith("unsigned char *"):
+            return f"byte *{pre}"
+        # ozz-animation types
+        elif arg_type.startswith("const ozz_desc_t *"):
+            return f"in ozz_desc_t{pre}"
+        elif arg_type.startswith("ozz_instance_t *"):
+            return f"IntPtr{pre}"  # Handle as opaque pointer
+        elif arg_type.startswith("ozz_t"):
+            return f"IntPtr{pre}"  # Handle as opaque pointer
+        else:
+            print(f"[DEBUG] as_csharp_arg_type not handled for arg_type: '{arg_type}', arg_prefix: '{arg_prefix}', prefix: '{prefix}'", file=sys.stderr, flush=True)
+            if arg_prefix is None:
+                return "IntPtr  /* ??? (as_csharp_arg_type) */"
+            else:
+                return arg_prefix + "IntPtr  /* ??? (as_csharp_arg_type) */"
+
+    # get C-style arguments of a function pointer as string
+    def funcptr_args_c(self, field_type, prefix):
+        s = ""
+        for arg_type in util.parse_c_type(field_type).func_ptr.args:
+            if s != "":
+                s += ", "
+            c_arg = self.as_extern_c_arg_type(arg_type, prefix)
+            if (c_arg == "void"):
+                return ""
+            elif (c_arg == "bool"):
+                # C bool is one byte, and [UnmanagedCallersOnly] callbacks can't take bool
+                s += "byte"
+            else:
+                s += c_arg
+        return s
+
+    # get C-style result of a function pointer as string
+    def funcdecl_args_c(self, decl, prefix):
+        s = ""
+        func_name = decl['name']
+        for param_decl in decl['params']:
+            if s != "":
+                s += ", "
+            param_name = param_decl['name']
+            param_type = check_type_override(func_name, param_name, param_decl['type'])
+            s += self.as_extern_c_arg_type(param_type, prefix)
+        return s
+
+    def funcdecl_args_csharp(self, decl, prefix):
+        s = ""
+        func_name = decl['name']
+        for param_decl in decl['params']:
+            if s != "":
+                s += ", "
+            param_name = check_name_override(param_decl['name'])
+            param_type = check_type_override(func_name, param_name, param_decl['type'])
+
+            if is_string_ptr(param_type):
+                s += "[M(U.LPUTF8Str)] "
+
+            s += f"{self.as_csharp_arg_type(f' {param_name}', param_type, prefix)}"
+        return s
+
+    def funcdecl_result_c(self, decl, prefix):
+        func_name = decl['name']
+        decl_type = decl['type']
+        result_type = check_type_override(func_name, 'RESULT', decl_type[:decl_type.index('(')].strip())
+        return self.as_extern_c_arg_type(result_type, prefix)
+
+    def funcdecl_result_csharp(self, decl, prefix):
+        func_name = decl['name']
+        decl_type = decl['type']
+        result_type = check_type_override(func_name, 'RESULT', decl_type[:decl_type.index('(')].strip())
+        csharp_res_type = self.as_csharp_arg_type(None, result_type, prefix)
+        if csharp_res_type == "":
+            csharp_res_type = "void"
+        return csharp_res_type
+
+    def gen_struct(self, decl, prefix):
+        struct_name = decl['name']
+        csharp_type = as_csharp_struct_type(struct_name, prefix)
+        blittable = 'blittable_structs' in self.modes
+        self.l(f"[StructLayout(LayoutKind.Sequential)]")
+        self.l(f"public struct {csharp_type}")
+        self.l("{")
+        for field in decl['fields']:
+            field_name = as_pascal_case(check_name_override(field['name']), "")
+            field_type = field['type']
+            field_type = check_type_override(struct_name, field_name, field_type)
+            if blittable and field_type == "bool":
+                self.l(f"    private byte _{field_name};")
+                self.l(f"    public bool {field_name} {{ get => _{field_name} != 0; set => _{field_name} = value ? (byte)1 : (byte)0; }}")
+            elif blittable and util.is_string_ptr(field_type):
+                # the string setter allocates a native UTF-8 copy, which is
+                # freed when the field is assigned again (the pointer may also
+                # come from the Utf8 property, those aren't freed, see OwnedUtf8),
+                # use the Utf8 property with a "..."u8 literal or pinned buffer
+                # to avoid the allocation
+                self.shared_decls['OwnedUtf8'] = (owned_utf8_source, ())
+                self.fragment_shared_decls.add('OwnedUtf8')
+                self.l(f"    private byte* _{field_name};")
+                self.l(f"    public byte* {field_name}Utf8 {{ get => _{field_name}; set {{ if (value != _{field_name}) {{ OwnedUtf8.Free(_{field_name}); }} _{field_name} = value; }} }}")
+                self.l(f"    public string {field_name} {{ get => _{field_name} == null ? null : Marshal.PtrToStringUTF8((IntPtr)_{field_name}); set {{ OwnedUtf8.Free(_{field_name}); _{field_name} = OwnedUtf8.Alloc(value); }} }}")
+            elif field_type == "bool":
+                # Conditional for bool fields with properties
+                self.l("#if WEB")
+                self.l(f"    private byte _{field_name};")
+                self.l(f"    public bool {field_name} {{ get => _{field_name} != 0; set => _{field_name} = value ? (byte)1 : (byte)0; }}")
+                self.l("#else")
+                self.l(f"    [M(U.I1)] public bool {field_name};")
+                self.l("#endif")
+            elif is_prim_type(field_type):
+                self.l(f"    public {as_csharp_prim_type(field_type)} {field_name};")
+            elif self.is_struct_type(field_type):
+                self.l(f"    public {as_csharp_struct_type(field_type, prefix)} {field_name};")
+            elif self.is_enum_type(field_type):
+                self.l(f"    public {as_csharp_enum_type(field_type, prefix)} {field_name};")
+            elif util.is_string_ptr(field_type):
+                # Conditional for string fields with properties
+                self.l("#if WEB")
+                self.l(f"    private IntPtr _{field_name};")
+                self.l(f"    public string {field_name} {{ get => Marshal.PtrToStringAnsi(_{field_name});  set {{ if (_{field_name} != IntPtr.Zero) {{ Marshal.FreeHGlobal(_{field_name}); _{field_name} = IntPtr.Zero; }} if (value != null) {{ _{field_name} = Marshal.StringToHGlobalAnsi(value); }} }} }}")
+                self.l("#else")
+                self.l(f"    [M(U.LPUTF8Str)] public string {field_name};")
+                self.l("#endif")
+            elif util.is_const_void_ptr(field_type):
+                self.l(f"    public void* {field_name};")
+            elif util.is_void_ptr(field_type):
+                self.l(f"    public void* {field_name};")
+            elif is_const_prim_ptr(field_type):
+                self.l(f"    public {as_csharp_prim_type(extract_ptr_type(field_type))}* {field_name};")
+            elif self.is_struct_ptr(field_type):
+                self.l(f"    public {as_csharp_struct_type(extract_ptr_type(field_type), prefix)}* {field_name};")
+            elif self.is_struct_ptr_ptr(field_type):
+                self.l(f"    public {as_csharp_struct_type(extract_ptr_type(field_type), prefix)}** {field_name};")
+            elif util.is_func_ptr(field_type):
+                args = self.funcptr_args_c(field_type, prefix)
+                if args != "":
+                    args += ", "
+                self.l(f"    public delegate* unmanaged<{args}{funcptr_res_c(field_type)}> {field_name};")
+            elif util.is_1d_array_type(field_type):
+                array_type = util.extract_array_type(field_type)
+                array_nums = util.extract_array_sizes(field_type)
+                if is_prim_type(array_type) or self.is_struct_type(array_type) or self.is_enum_type(array_type)  or is_const_void_ptr(array_type):
+                    if blittable and array_type == 'bool':
+                        csharp_type = 'byte'
+                    elif is_prim_type(array_type):
+                        csharp_type = as_csharp_prim_type(array_type)
+                    elif self.is_struct_type(array_type):
+                        csharp_type = as_csharp_struct_type(array_type, prefix)
+                    elif self.is_enum_type(array_type):
+                        csharp_type = as_csharp_enum_type(array_type, prefix)
+                    elif is_const_void_ptr(array_type):
+                        csharp_type = "IntPtr"
+                    else:
+                        csharp_type = '??? (1d array type)'
+                    if 'inline_arrays' in self.modes:
+                        self.l(f"    public {self.inline_array_type(csharp_type, array_type, array_nums)} {field_name};")
+                        continue
+                    self.l("    #pragma warning disable 169")
+                    self.l(f"    public struct {field_name}Collection")
+                    self.l("    {")
+                    self.l(f"        public ref {csharp_type} this[int index] => ref MemoryMarshal.CreateSpan(ref _item0, {array_nums[0]})[index];")
+                    for i in range(0, int(array_nums[0])):
+                        self.l(f"        private {csharp_type} _item{i};")
+                    self.l("    }")
+                    self.l("    #pragma warning restore 169")
+
+                    self.l(f"    public {field_name}Collection {field_name};")
+                elif util.is_const_void_ptr(array_type):
+                    self.l(f"    {field_name}: [{array_nums[0]}]?*const anyopaque = [_]?*const anyopaque{{null}} ** {array_sizes[0]},")
+                else:
+                    sys.exit(f"ERROR gen_struct: array {field_name}: {field_type} => {array_type} [{array_nums[0]}]")
+            elif util.is_2d_array_type(field_type):
+                array_type = util.extract_array_type(field_type)
+                array_nums = util.extract_array_sizes(field_type)
+                if blittable and array_type == 'bool':
+                    csharp_type = 'byte'
+                elif is_prim_type(array_type):
                     csharp_type = as_csharp_prim_type(array_type)
-                elif is_struct_type(array_type):
+                    def_val = type_default_value(array_type)
+                elif self.is_struct_type(array_type):
                     csharp_type = as_csharp_struct_type(array_type, prefix)
-                elif is_enum_type(array_type):
+                    def_val = ".{ }"
+                elif self.is_enum_type(array_type):
                     csharp_type = as_csharp_enum_type(array_type, prefix)
                 elif is_const_void_ptr(array_type):
                     csharp_type = "IntPtr"
                 else:
-                    csharp_type = '??? (1d array type)'
-                l("    #pragma warning disable 169")
-                l(f"    public struct {field_name}Collection")
-                l("    {")
-                l(f"        public ref {csharp_type} this[int index] => ref MemoryMarshal.CreateSpan(ref _item0, {array_nums[0]})[index];")
-                for i in range(0, int(array_nums[0])):
-                    l(f"        private {csharp_type} _item{i};")
-                l("    }")
-                l("    #pragma warning restore 169")
-
-                l(f"    public {field_name}Collection {field_name};")
-            elif util.is_const_void_ptr(array_type):
-                l(f"    {field_name}: [{array_nums[0]}]?*const anyopaque = [_]?*const anyopaque{{null}} ** {array_sizes[0]},")
+                    csharp_type = '??? (2d array type)'
+                    def_val = "???"
+
+                if 'inline_arrays' in self.modes:
+                    self.l(f"    public {self.inline_array_type(csharp_type, array_type, array_nums)} {field_name};")
+                    continue
+                self.l("    #pragma warning disable 169")
+                self.l(f"    public struct {field_name}Collection")
+                self.l("    {")
+                self.l(f"        public ref {csharp_type} this[int x, int y] {{ get {{ fixed ({csharp_type}* pTP = &_item0) return ref *(pTP + x + (y * {array_nums[0]})); }} }}")
+                for i in range(0, int(array_nums[0]) * int(array_nums[1])):
+                    self.l(f"        private {csharp_type} _item{i};")
+                self.l("    }")
+                self.l("    #pragma warning restore 169")
+
+                self.l(f"    public {field_name}Collection {field_name};")
+
+                #t0 = f"[{array_nums[0]}][{array_nums[1]}]{csharp_type}"
+                #self.l(f"    {field_name}: {t0} = [_][{array_nums[1]}]{csharp_type}{{[_]{csharp_type}{{ {def_val} }}**{array_nums[1]}}}**{array_nums[0]},")
             else:
-                sys.exit(f"ERROR gen_struct: array {field_name}: {field_type} => {array_type} [{array_nums[0]}]")
-        elif util.is_2d_array_type(field_type):
-            array_type = util.extract_array_type(field_type)
-            array_nums = util.extract_array_sizes(field_type)
-            if is_prim_type(array_type):
-                csharp_type = as_csharp_prim_type(array_type)
-                def_val = type_default_value(array_type)
-            elif is_struct_type(array_type):
-                csharp_type = as_csharp_struct_type(array_type, prefix)
-                def_val = ".{ }"
-            elif is_enum_type(array_type):
-                csharp_type = as_csharp_enum_type(array_type, prefix)
-            elif is_const_void_ptr(array_type):
-                csharp_type = "IntPtr"
+                self.l(f"// FIXME: {field_name}: {field_type};")
+        self.l("}")
+
+    def type_module(self, c_type):
+        # the module which declares a struct or enum type, None for others
+        decl = self.struct_decls.get(c_type) or self.enum_decls.get(c_type)
+        if decl is None:
+            return None
+        if decl.get('dep_prefix') is None:
+            return self.module_name
+        return module_names[decl['dep_prefix']]
+
+    def inline_array_type(self, csharp_type, c_type, array_nums):
+        # shared [InlineArray] type for the element type and size(s), 2D arrays
+        # are stored flat and indexed like the nested Collection structs
+        dims = [int(n) for n in array_nums]
+        length = dims[0] if len(dims) == 1 else dims[0] * dims[1]
+        type_name = f"InlineArray{'x'.join(str(d) for d in dims)}_{csharp_type}"
+        if type_name not in self.shared_decls:
+            lines = [f"[InlineArray({length})]", f"public struct {type_name}", "{", f"    private {csharp_type} _element0;"]
+            if len(dims) == 2:
+                lines.append(f"    [UnscopedRef] public ref {csharp_type} this[int x, int y] => ref Unsafe.Add(ref _element0, x + (y * {dims[0]}));")
+            lines.append(f"    [UnscopedRef] public Span<{csharp_type}> AsSpan() => MemoryMarshal.CreateSpan(ref _element0, {length});")
+            lines.append("}")
+            module = self.type_module(c_type)
+            self.shared_decls[type_name] = ('\n'.join(lines) + '\n', (module,) if module else ())
+        self.fragment_shared_decls.add(type_name)
+        return type_name
+
+    def gen_consts(self, decl, prefix):
+        for item in decl['items']:
+            self.l(f"public const int {as_pascal_case(item['name'], prefix)} = {item['value']};")
+
+    def gen_enum(self, decl, prefix):
+        self.l(f"public enum {as_csharp_enum_type(decl['name'], prefix)}")
+        self.l("{")
+        for item in decl['items']:
+            item_name = as_enum_item_name(item['name'])
+            if item_name != "ForceU32":
+                if 'value' in item:
+                    self.l(f"    {item_name} = {item['value']},")
+                else:
+                    self.l(f"    {item_name},")
+        self.l("}")
+
+    def gen_func_c(self, decl, prefix):
+        c_func_name = decl['name']
+        if c_func_name not in self.struct_return_functions:
+            # Use framework path on iOS, library name on all other platforms
+            self.l("#if __IOS__")
+            self.l(f"[DllImport(\"@rpath/{self.library_name}.framework/{self.library_name}\", EntryPoint = \"{decl['name']}\", CallingConvention = CallingConvention.Cdecl)]")
+            self.l("#else")
+            self.l(f"[DllImport(\"{self.library_name}\", EntryPoint = \"{decl['name']}\", CallingConvention = CallingConvention.Cdecl)]")
+            self.l("#endif")
+
+    def gen_func_csharp(self, decl, prefix):
+        c_func_name = decl['name']
+        csharp_func_name = as_pascal_case(check_name_override(decl['name']), prefix)
+        csharp_res_type = self.funcdecl_result_csharp(decl, prefix)
+
+        # Special case for sg_make_shader on WebAssembly
+        if c_func_name in web_wrapper_functions:
+            self.l("#if WEB")
+            self.gen_extern("", "uint", f"{csharp_func_name}_internal", self.funcdecl_args_csharp(decl, prefix), c_func_name)
+            self.l(f"public static {csharp_res_type} {csharp_func_name}({self.funcdecl_args_csharp(decl, prefix)})")
+            self.l("{")
+            # Handle functions with parameters vs those without
+            if decl['params']:
+                # Functions like sg_make_shader that take parameters - use the actual parameter names
+                param_names = [check_name_override(param['name']) for param in decl['params']]
+                param_list = ", ".join(param_names)
+                self.l(f"    uint _id = {csharp_func_name}_internal({param_list});")
             else:
-                csharp_type = '??? (2d array type)'
-                def_val = "???"
-
-            l("    #pragma warning disable 169")
-            l(f"    public struct {field_name}Collection")
-            l("    {")
-            l(f"        public ref {csharp_type} this[int x, int y] {{ get {{ fixed ({csharp_type}* pTP = &_item0) return ref *(pTP + x + (y * {array_nums[0]})); }} }}")
-            for i in range(0, int(array_nums[0]) * int(array_nums[1])):
-                l(f"        private {csharp_type} _item{i};")
-            l("    }")
-            l("    #pragma warning restore 169")
-
-            l(f"    public {field_name}Collection {field_name};")
-
-            #t0 = f"[{array_nums[0]}][{array_nums[1]}]{csharp_type}"
-            #l(f"    {field_name}: {t0} = [_][{array_nums[1]}]{csharp_type}{{[_]{csharp_type}{{ {def_val} }}**{array_nums[1]}}}**{array_nums[0]},")
-        else:
-            l(f"// FIXME: {field_name}: {field_type};")
-    l("}")
-
-def gen_consts(decl, prefix):
-    for item in decl['items']:
-        l(f"public const int {as_pascal_case(item['name'], prefix)} = {item['value']};")
-
-def gen_enum(decl, prefix):
-    l(f"public enum {as_csharp_enum_type(decl['name'], prefix)}")
-    l("{")
-    for item in decl['items']:
-        item_name = as_enum_item_name(item['name'])
-        if item_name != "ForceU32":
-            if 'value' in item:
-                l(f"    {item_name} = {item['value']},")
+                # Functions like sg_alloc_shader that take no parameters
+                self.l(f"    uint _id = {csharp_func_name}_internal();")
+
+            self.l(f"    return new {csharp_res_type} {{ id = _id }};")
+            self.l("}")
+            self.l("#else")
+            if csharp_res_type == "string":
+                # Manual string marshalling for non-WebAssembly and WebAssembly platforms
+                self.gen_extern("private", "IntPtr", f"{csharp_func_name}_native", self.funcdecl_args_csharp(decl, prefix), c_func_name)
+                self.l("")
+                self.l(f"public static string {csharp_func_name}({self.funcdecl_args_csharp(decl, prefix)})")
+                self.l("{")
+                if decl['params']:
+                    param_names = [check_name_override(param['name']) for param in decl['params']]
+                    param_list = ", ".join(param_names)
+                    self.l(f"    IntPtr ptr = {csharp_func_name}_native({param_list});")
+                else:
+                    self.l(f"    IntPtr ptr = {csharp_func_name}_native();")
+                self.l("    if (ptr == IntPtr.Zero)")
+                self.l("        return \"\";")
+                self.l("")
+                self.l("    // Manual UTF-8 to string conversion to avoid marshalling corruption")
+                self.l("    try")
+                self.l("    {")
+                self.l("        return Marshal.PtrToStringUTF8(ptr) ?? \"\";")
+                self.l("    }")
+                self.l("    catch")
+                self.l("    {")
+                self.l("        // Fallback in case of any marshalling issues")
+                self.l("        return \"\";")
+                self.l("    }")
+                self.l("}")
             else:
-                l(f"    {item_name},")
-    l("}")
-
-def gen_func_c(decl, prefix):
-    c_func_name = decl['name']
-    if c_func_name not in web_wrapper_struct_return_functions:
-        # Use framework path on iOS, library name on all other platforms
-        l("#if __IOS__")
-        l(f"[DllImport(\"@rpath/{current_library_name}.framework/{current_library_name}\", EntryPoint = \"{decl['name']}\", CallingConvention = CallingConvention.Cdecl)]")
-        l("#else")
-        l(f"[DllImport(\"{current_library_name}\", EntryPoint = \"{decl['name']}\", CallingConvention = CallingConvention.Cdecl)]")
-        l("#endif")
-
-def gen_func_csharp(decl, prefix):
-    c_func_name = decl['name']
-    csharp_func_name = as_pascal_case(check_name_override(decl['name']), prefix)
-    csharp_res_type = funcdecl_result_csharp(decl, prefix)
-
-    # Special case for sg_make_shader on WebAssembly
-    if c_func_name in web_wrapper_functions:
-        l("#if WEB")
-        l(f"static extern uint {csharp_func_name}_internal({funcdecl_args_csharp(decl, prefix)});")
-        l(f"public static {csharp_res_type} {csharp_func_name}({funcdecl_args_csharp(decl, prefix)})")
-        l("{")
-        # Handle functions with parameters vs those without
-        if decl['params']:
-            # Functions like sg_make_shader that take parameters - use the actual parameter names
-            param_names = [check_name_override(param['name']) for param in decl['params']]
-            param_list = ", ".join(param_names)
-            l(f"    uint _id = {csharp_func_name}_internal({param_list});")
-        else:
-            # Functions like sg_alloc_shader that take no parameters
-            l(f"    uint _id = {csharp_func_name}_internal();")
-
-        l(f"    return new {csharp_res_type} {{ id = _id }};")
-        l("}")
-        l("#else")
-        if csharp_res_type == "string":
-            # Manual string marshalling for non-WebAssembly and WebAssembly platforms
-            l(f"private static extern IntPtr {csharp_func_name}_native({funcdecl_args_csharp(decl, prefix)});")
-            l("")
-            l(f"public static string {csharp_func_name}({funcdecl_args_csharp(decl, prefix)})")
-            l("{")
+                self.gen_extern("public", csharp_res_type, csharp_func_name, self.funcdecl_args_csharp(decl, prefix), c_func_name)
+            self.l("#endif")
+            self.l("")
+            return
+
+          # Special case for large struct return functions in WebAssembly
+        if c_func_name in self.struct_return_functions:
+            self.l("#if WEB")
+            self.l(f"public static {csharp_res_type} {csharp_func_name}({self.funcdecl_args_csharp(decl, prefix)})")
+            self.l("{")
+            self.l(f"    {csharp_res_type} result = default;")
             if decl['params']:
                 param_names = [check_name_override(param['name']) for param in decl['params']]
                 param_list = ", ".join(param_names)
-                l(f"    IntPtr ptr = {csharp_func_name}_native({param_list});")
+                self.l(f"    {csharp_func_name}_internal(ref result, {param_list});")
             else:
-                l(f"    IntPtr ptr = {csharp_func_name}_native();")
-            l("    if (ptr == IntPtr.Zero)")
-            l("        return \"\";")
-            l("")
-            l("    // Manual UTF-8 to string conversion to avoid marshalling corruption")
-            l("    try")
-            l("    {")
-            l("        return Marshal.PtrToStringUTF8(ptr) ?? \"\";")
-            l("    }")
-            l("    catch")
-            l("    {")
-            l("        // Fallback in case of any marshalling issues")
-            l("        return \"\";")
-            l("    }")
-            l("}")
-        else:
-            l(f"public static extern {csharp_res_type} {csharp_func_name}({funcdecl_args_csharp(decl, prefix)});")
-        l("#endif")
-        l("")
-        return
-
-      # Special case for large struct return functions in WebAssembly
-    if c_func_name in web_wrapper_struct_return_functions:
-        l("#if WEB")
-        l(f"public static {csharp_res_type} {csharp_func_name}({funcdecl_args_csharp(decl, prefix)})")
-        l("{")
-        l(f"    {csharp_res_type} result = default;")
-        if decl['params']:
-            param_names = [check_name_override(param['name']) for param in decl['params']]
-            param_list = ", ".join(param_names)
-            l(f"    {csharp_func_name}_internal(ref result, {param_list});")
-        else:
-            l(f"    {csharp_func_name}_internal(ref result);")
-        l("    return result;")
-        l("}")
-        l("#else")
-        # Use framework path on iOS, library name on all other platforms
-        l("#if __IOS__")
-        l(f"[DllImport(\"@rpath/{current_library_name}.framework/{current_library_name}\", EntryPoint = \"{decl['name']}\", CallingConvention = CallingConvention.Cdecl)]")
-        l("#else")
-        l(f"[DllImport(\"{current_library_name}\", EntryPoint = \"{decl['name']}\", CallingConvention = CallingConvention.Cdecl)]")
-        l("#endif")
+                self.l(f"    {csharp_func_name}_internal(ref result);")
+            self.l("    return result;")
+            self.l("}")
+            self.l("#else")
+            # Use framework path on iOS, library name on all other platforms
+            self.l("#if __IOS__")
+            self.l(f"[DllImport(\"@rpath/{self.library_name}.framework/{self.library_name}\", EntryPoint = \"{decl['name']}\", CallingConvention = CallingConvention.Cdecl)]")
+            self.l("#else")
+            self.l(f"[DllImport(\"{self.library_name}\", EntryPoint = \"{decl['name']}\", CallingConvention = CallingConvention.Cdecl)]")
+            self.l("#endif")
+            if csharp_res_type == "string":
+                # Manual string marshalling for WebAssembly to avoid corruption
+                self.gen_extern("private", "IntPtr", f"{csharp_func_name}_native", self.funcdecl_args_csharp(decl, prefix), c_func_name)
+                self.l("")
+                self.l(f"public static string {csharp_func_name}({self.funcdecl_args_csharp(decl, prefix)})")
+                self.l("{")
+                if decl['params']:
+                    param_names = [check_name_override(param['name']) for param in decl['params']]
+                    param_list = ", ".join(param_names)
+                    self.l(f"    IntPtr ptr = {csharp_func_name}_native({param_list});")
+                else:
+                    self.l(f"    IntPtr ptr = {csharp_func_name}_native();")
+                self.l("    if (ptr == IntPtr.Zero)")
+                self.l("        return \"\";")
+                self.l("")
+                self.l("    // Manual UTF-8 to string conversion to avoid marshalling corruption")
+                self.l("    try")
+                self.l("    {")
+                self.l("        return Marshal.PtrToStringUTF8(ptr) ?? \"\";")
+                self.l("    }")
+                self.l("    catch")
+                self.l("    {")
+                self.l("        // Fallback in case of any marshalling issues")
+                self.l("        return \"\";")
+                self.l("    }")
+                self.l("}")
+            else:
+                self.gen_extern("public", csharp_res_type, csharp_func_name, self.funcdecl_args_csharp(decl, prefix), c_func_name)
+            self.l("#endif")
+            self.l("")
+            self.gen_func_out_overload(decl, prefix)
+            return
+      
         if csharp_res_type == "string":
-            # Manual string marshalling for WebAssembly to avoid corruption
-            l(f"private static extern IntPtr {csharp_func_name}_native({funcdecl_args_csharp(decl, prefix)});")
-            l("")
-            l(f"public static string {csharp_func_name}({funcdecl_args_csharp(decl, prefix)})")
-            l("{")
+            # Manual string marshalling for all platforms to avoid corruption
+            self.gen_extern("private", "IntPtr", f"{csharp_func_name}_native", self.funcdecl_args_csharp(decl, prefix), c_func_name)
+            self.l("")
+            self.l(f"public static string {csharp_func_name}({self.funcdecl_args_csharp(decl, prefix)})")
+            self.l("{")
             if decl['params']:
                 param_names = [check_name_override(param['name']) for param in decl['params']]
                 param_list = ", ".join(param_names)
-                l(f"    IntPtr ptr = {csharp_func_name}_native({param_list});")
+                self.l(f"    IntPtr ptr = {csharp_func_name}_native({param_list});")
             else:
-                l(f"    IntPtr ptr = {csharp_func_name}_native();")
-            l("    if (ptr == IntPtr.Zero)")
-            l("        return \"\";")
-            l("")
-            l("    // Manual UTF-8 to string conversion to avoid marshalling corruption")
-            l("    try")
-            l("    {")
-            l("        return Marshal.PtrToStringUTF8(ptr) ?? \"\";")
-            l("    }")
-            l("    catch")
-            l("    {")
-            l("        // Fallback in case of any marshalling issues")
-            l("        return \"\";")
-            l("    }")
-            l("}")
+                self.l(f"    IntPtr ptr = {csharp_func_name}_native();")
+            self.l("    if (ptr == IntPtr.Zero)")
+            self.l("        return \"\";")
+            self.l("")
+            self.l("    // Manual UTF-8 to string conversion to avoid marshalling corruption")
+            self.l("    try")
+            self.l("    {")
+            self.l("        return Marshal.PtrToStringUTF8(ptr) ?? \"\";")
+            self.l("    }")
+            self.l("    catch")
+            self.l("    {")
+            self.l("        // Fallback in case of any marshalling issues")
+            self.l("        return \"\";")
+            self.l("    }")
+            self.l("}")
         else:
-            l(f"public static extern {csharp_res_type} {csharp_func_name}({funcdecl_args_csharp(decl, prefix)});")
-        l("#endif")
-        l("")
-        return
-      
-    if csharp_res_type == "string":
-        # Manual string marshalling for all platforms to avoid corruption
-        l(f"private static extern IntPtr {csharp_func_name}_native({funcdecl_args_csharp(decl, prefix)});")
-        l("")
-        l(f"public static string {csharp_func_name}({funcdecl_args_csharp(decl, prefix)})")
-        l("{")
-        if decl['params']:
-            param_names = [check_name_override(param['name']) for param in decl['params']]
-            param_list = ", ".join(param_names)
-            l(f"    IntPtr ptr = {csharp_func_name}_native({param_list});")
+            self.gen_extern("public", csharp_res_type, csharp_func_name, self.funcdecl_args_csharp(decl, prefix), c_func_name)
+        self.l("")
+
+    def gen_func_out_overload(self, decl, prefix):
+        # 'void func(out T result, ...)' overload of a function returning a
+        # struct by value, on all platforms, which lets the _internal C
+        # wrapper write the result directly into the caller's variable
+        # instead of copying it out of the native frame
+        csharp_func_name = as_pascal_case(check_name_override(decl['name']), prefix)
+        csharp_res_type = self.funcdecl_result_csharp(decl, prefix)
+        args = self.funcdecl_args_csharp(decl, prefix)
+        call_args = ["ref result"] + [f"{m} {n}" if m else n for m, _, n in parse_csharp_params(args)]
+        self.l(f"public static void {csharp_func_name}(out {csharp_res_type} result{', ' + args if args else ''})")
+        self.l("{")
+        if self.is_blittable_struct(self.struct_return_functions[decl['name']]):
+            self.l("    System.Runtime.CompilerServices.Unsafe.SkipInit(out result);")
         else:
-            l(f"    IntPtr ptr = {csharp_func_name}_native();")
-        l("    if (ptr == IntPtr.Zero)")
-        l("        return \"\";")
-        l("")
-        l("    // Manual UTF-8 to string conversion to avoid marshalling corruption")
-        l("    try")
-        l("    {")
-        l("        return Marshal.PtrToStringUTF8(ptr) ?? \"\";")
-        l("    }")
-        l("    catch")
-        l("    {")
-        l("        // Fallback in case of any marshalling issues")
-        l("        return \"\";")
-        l("    }")
-        l("}")
-    else:
-        l(f"public static extern {csharp_res_type} {csharp_func_name}({funcdecl_args_csharp(decl, prefix)});")
-    l("")
-
-def detect_struct_return_functions(inp):
-    """
-    Automatically detect functions that return structs by value.
-    These need special handling for WebAssembly marshalling.
-    """
-    global web_wrapper_struct_return_functions
+            # marshalled structs are also converted on the way in
+            self.l("    result = default;")
+        self.l(f"    {csharp_func_name}_internal({', '.join(call_args)});")
+        self.l("}")
+        self.l("")
+
+    def as_library_import_arg_type(self, csharp_type):
+        # blittable native type and argument conversion for a C# parameter or
+        # result type, None if it can't be passed without marshalling
+        csharp_type = csharp_type.strip()
+        if csharp_type == 'string':
+            return 'byte*', 'string'
+        elif csharp_type == 'bool':
+            return 'byte', 'bool'
+        for modifier in ('in ', 'ref ', 'out '):
+            if csharp_type.startswith(modifier):
+                base_type = csharp_type[len(modifier):].strip()
+                if base_type in self.struct_decls and not self.is_blittable_struct(base_type):
+                    return None
+                return f'{base_type}*', modifier.strip()
+        if csharp_type in self.struct_decls and not self.is_blittable_struct(csharp_type):
+            return None
+        if '???' in csharp_type:
+            return None
+        return csharp_type, None
+
+    def library_import_signature(self, decl, prefix):
+        # C# name, C# result type, (native type, conversion) of the result and
+        # (name, C# type, native type, conversion) of each parameter, None if
+        # the function needs the DllImport path (special WEB handling or
+        # non-blittable types)
+        c_func_name = decl['name']
+        if c_func_name in web_wrapper_functions or c_func_name in self.struct_return_functions:
+            return None
+        csharp_func_name = as_pascal_case(check_name_override(c_func_name), prefix)
+        csharp_res_type = self.funcdecl_result_csharp(decl, prefix)
+        res = self.as_library_import_arg_type(csharp_res_type)
+        if res is None:
+            return None
+        params = []
+        for param_decl in decl['params']:
+            param_name = check_name_override(param_decl['name'])
+            param_type = check_type_override(c_func_name, param_name, param_decl['type'])
+            csharp_type = self.as_csharp_arg_type('', param_type, prefix).strip()
+            arg = self.as_library_import_arg_type(csharp_type)
+            if arg is None:
+                return None
+            params.append((param_name, csharp_type, arg[0], arg[1]))
+        return csharp_func_name, csharp_res_type, res, params
+
+    def gen_extern(self, visibility, res_type, func_name, args, native_name, kind='extern'):
+        # declaration of a native function, the preceding attributes apply to
+        # it. In 'profile_shims' mode it is renamed with SOKOL_BINDINGS_PROFILE
+        # defined, and called by a shim with the original name and signature
+        # which records the call in BindingsProfile.
+        vis = f"{visibility} " if visibility else ""
+        if 'profile_shims' not in self.modes:
+            self.l(f"{vis}static {kind} {res_type} {func_name}({args});")
+            return
+        func_id = self.profile_ids.setdefault(native_name, len(self.profile_ids))
+        params = parse_csharp_params(args)
+        sizes = [marshalled_size(arg_type, name, modifier) for modifier, arg_type, name in params]
+        if res_type != 'void':
+            sizes.append(marshalled_size(res_type))
+        call = f"{func_name}_profiled({', '.join(f'{m} {n}' if m else n for m, _, n in params)})"
+        self.shared_decls['BindingsProfile'] = (bindings_profile_source, ())
+        self.fragment_shared_decls.add('BindingsProfile')
+        self.l("#if SOKOL_BINDINGS_PROFILE")
+        self.l(f"private static {kind} {res_type} {func_name}_profiled({args});")
+        self.l(f"{vis}static {res_type} {func_name}({args})")
+        self.l("{")
+        self.l("    long __start = Stopwatch.GetTimestamp();")
+        if res_type == 'void':
+            self.l(f"    {call};")
+        else:
+            self.l(f"    {res_type} __result = {call};")
+        self.l(f"    __profile.Record({func_id}, __start, {' + '.join(sizes) or '0'});")
+        if res_type != 'void':
+            self.l("    return __result;")
+        self.l("}")
+        self.l("#else")
+        self.l(f"{vis}static {kind} {res_type} {func_name}({args});")
+        self.l("#endif")
+
+    def gen_profile_table(self):
+        # the module's BindingsProfile table, one entry per shimmed native function
+        if not self.profile_ids:
+            return
+        self.l("#if SOKOL_BINDINGS_PROFILE")
+        self.l(f"private static readonly BindingsProfile.Table __profile = BindingsProfile.Register(\"{self.module_name}\", new string[] {{")
+        for native_name in self.profile_ids:
+            self.l(f"    \"{native_name}\",")
+        self.l("});")
+        self.l("#endif")
+
+    def gen_func_library_import(self, decl, prefix):
+        # [LibraryImport] with a blittable signature, so that no marshalling
+        # stub is generated, and a thin wrapper with the regular API shape if
+        # any argument needs converting. Returns False if the function needs
+        # the DllImport path.
+        signature = self.library_import_signature(decl, prefix)
+        if signature is None:
+            return False
+        csharp_func_name, csharp_res_type, res, params = signature
+        native_args = ", ".join(f"{native_type} {param_name}" for param_name, _, native_type, _ in params)
+        needs_wrapper = res[1] is not None or any(conv is not None for _, _, _, conv in params)
+        native_func_name = f"{csharp_func_name}_native" if needs_wrapper else csharp_func_name
+        self.l("#if __IOS__")
+        self.l(f"[LibraryImport(\"@rpath/{self.library_name}.framework/{self.library_name}\", EntryPoint = \"{decl['name']}\")]")
+        self.l("#else")
+        self.l(f"[LibraryImport(\"{self.library_name}\", EntryPoint = \"{decl['name']}\")]")
+        self.l("#endif")
+        self.l("[UnmanagedCallConv(CallConvs = new[] { typeof(CallConvCdecl) })]")
+        self.gen_extern('private' if needs_wrapper else 'public', res[0], native_func_name, native_args, decl['name'], 'partial')
+        self.l("")
+        if needs_wrapper:
+            self.gen_library_import_wrapper(csharp_func_name, csharp_res_type, res, params, native_func_name)
+        if 'utf8_overloads' in self.modes and any(conv == 'string' for _, _, _, conv in params):
+            # byte* overload, strings are passed through as they are
+            utf8_params = [(n, 'byte*', 'byte*', None) if conv == 'string' else (n, t, nt, conv) for n, t, nt, conv in params]
+            self.gen_library_import_wrapper(csharp_func_name, csharp_res_type, res, utf8_params, native_func_name)
+            self.gen_func_utf8_span_overload(csharp_func_name, csharp_res_type, [(n, t) for n, t, _, _ in params])
+        return True
+
+    def gen_library_import_wrapper(self, csharp_func_name, csharp_res_type, res, params, native_func_name):
+        # pin in/ref/out arguments, convert strings to null-terminated UTF-8
+        # (on the stack for short strings), bools to bytes
+        wrapper_args = ", ".join(f"{csharp_type} {param_name}" for param_name, csharp_type, _, _ in params)
+        self.l("[MethodImpl(MethodImplOptions.AggressiveInlining)]")
+        self.l(f"public static {csharp_res_type} {csharp_func_name}({wrapper_args})")
+        self.l("{")
+        indent = "    "
+        call_args = []
+        string_params = []
+        for param_name, csharp_type, native_type, conv in params:
+            if conv == 'string':
+                self.l(f"{indent}byte* __{param_name}_buf = stackalloc byte[Utf8StringMarshaller.ManagedToUnmanagedIn.BufferSize];")
+                self.l(f"{indent}var __{param_name} = new Utf8StringMarshaller.ManagedToUnmanagedIn();")
+                self.l(f"{indent}__{param_name}.FromManaged({param_name}, new Span<byte>(__{param_name}_buf, Utf8StringMarshaller.ManagedToUnmanagedIn.BufferSize));")
+                call_args.append(f"__{param_name}.ToUnmanaged()")
+                string_params.append(param_name)
+            elif conv == 'bool':
+                call_args.append(f"{param_name} ? (byte)1 : (byte)0")
+            elif conv in ('in', 'ref', 'out'):
+                call_args.append(f"__{param_name}")
+            else:
+                call_args.append(param_name)
+        if string_params:
+            self.l(f"{indent}try")
+            self.l(f"{indent}{{")
+            indent += "    "
+        for param_name, _, _, conv in params:
+            if conv == 'out':
+                self.l(f"{indent}{param_name} = default;")
+        pinned = False
+        for param_name, _, native_type, conv in params:
+            if conv in ('in', 'ref', 'out'):
+                self.l(f"{indent}fixed ({native_type} __{param_name} = &{param_name})")
+                pinned = True
+        if pinned:
+            self.l(f"{indent}{{")
+            indent += "    "
+        call = f"{native_func_name}({', '.join(call_args)})"
+        if res[1] == 'string':
+            self.l(f"{indent}byte* __result = {call};")
+            self.l(f"{indent}return __result == null ? \"\" : Marshal.PtrToStringUTF8((IntPtr)__result) ?? \"\";")
+        elif res[1] == 'bool':
+            self.l(f"{indent}return {call} != 0;")
+        elif csharp_res_type == 'void':
+            self.l(f"{indent}{call};")
+        else:
+            self.l(f"{indent}return {call};")
+        if pinned:
+            indent = indent[:-4]
+            self.l(f"{indent}}}")
+        if string_params:
+            indent = indent[:-4]
+            self.l(f"{indent}}}")
+            self.l(f"{indent}finally")
+            self.l(f"{indent}{{")
+            for param_name in string_params:
+                self.l(f"{indent}    __{param_name}.Free();")
+            self.l(f"{indent}}}")
+        self.l("}")
+        self.l("")
+        return True
+
+    def has_string_params(self, decl):
+        func_name = decl['name']
+        for param_decl in decl['params']:
+            if is_string_ptr(check_type_override(func_name, check_name_override(param_decl['name']), param_decl['type'])):
+                return True
+        return False
+
+    def gen_func_utf8_overloads(self, decl, prefix):
+        # byte* and ReadOnlySpan<byte> overloads of a DllImport function with
+        # string parameters, the byte* one binds to the same native function
+        c_func_name = decl['name']
+        if c_func_name in web_wrapper_functions or c_func_name in self.struct_return_functions:
+            return
+        csharp_func_name = as_pascal_case(check_name_override(c_func_name), prefix)
+        csharp_res_type = self.funcdecl_result_csharp(decl, prefix)
+        params = []
+        for param_decl in decl['params']:
+            param_name = check_name_override(param_decl['name'])
+            param_type = check_type_override(c_func_name, param_name, param_decl['type'])
+            params.append((param_name, self.as_csharp_arg_type('', param_type, prefix).strip()))
+        utf8_args = ", ".join(f"{'byte*' if csharp_type == 'string' else csharp_type} {param_name}" for param_name, csharp_type in params)
+        self.gen_func_c(decl, prefix)
+        if csharp_res_type == "string":
+            self.gen_extern("private", "IntPtr", f"{csharp_func_name}_native", utf8_args, c_func_name)
+            self.l("")
+            self.l(f"public static string {csharp_func_name}({utf8_args})")
+            self.l("{")
+            self.l(f"    IntPtr ptr = {csharp_func_name}_native({', '.join(as_call_arg(n, t) for n, t in params)});")
+            self.l("    return ptr == IntPtr.Zero ? \"\" : Marshal.PtrToStringUTF8(ptr) ?? \"\";")
+            self.l("}")
+        else:
+            self.gen_extern("public", csharp_res_type, csharp_func_name, utf8_args, c_func_name)
+        self.l("")
+        self.gen_func_utf8_span_overload(csharp_func_name, csharp_res_type, params)
+
+    def gen_func_utf8_span_overload(self, csharp_func_name, csharp_res_type, params):
+        # ReadOnlySpan<byte> overload forwarding to the byte* overload, spans
+        # which aren't null-terminated (like "..."u8 literals) are copied into
+        # a stack buffer (or a pooled array) with a terminator, see
+        # NullTerminatedUtf8. A string 'end' pointer after a string parameter
+        # (fontstash's (str, end) ranges) isn't a parameter of the overload,
+        # it's set to the end of the preceding span, which is pinned as it is
+        range_ends = {}
+        for (prev_name, prev_type), (param_name, csharp_type) in zip(params, params[1:]):
+            if param_name == 'end' and csharp_type == 'string' and prev_type == 'string':
+                range_ends[param_name] = prev_name
+        span_args = ", ".join(f"{'ReadOnlySpan<byte>' if csharp_type == 'string' else csharp_type} {param_name}" for param_name, csharp_type in params if param_name not in range_ends)
+        self.shared_decls['NullTerminatedUtf8'] = (null_terminated_utf8_source, ())
+        self.fragment_shared_decls.add('NullTerminatedUtf8')
+        self.l(f"public static {csharp_res_type} {csharp_func_name}({span_args})")
+        self.l("{")
+        range_starts = set(range_ends.values())
+        for param_name, csharp_type in params:
+            if csharp_type == 'string' and param_name not in range_ends and param_name not in range_starts:
+                self.l(f"    using var __{param_name}_utf8 = new NullTerminatedUtf8({param_name}, stackalloc byte[NullTerminatedUtf8.StackBufferSize]);")
+        call_args = []
+        for param_name, csharp_type in params:
+            if param_name in range_ends:
+                call_args.append(f"__{range_ends[param_name]} + {range_ends[param_name]}.Length")
+            elif param_name in range_starts:
+                self.l(f"    fixed (byte* __{param_name} = NullTerminatedUtf8.NonEmpty({param_name}))")
+                call_args.append(f"__{param_name}")
+            elif csharp_type == 'string':
+                self.l(f"    fixed (byte* __{param_name} = __{param_name}_utf8.Span)")
+                call_args.append(f"__{param_name}")
+            else:
+                call_args.append(as_call_arg(param_name, csharp_type))
+        self.l("    {")
+        call = f"{csharp_func_name}({', '.join(call_args)})"
+        self.l(f"        {call};" if csharp_res_type == "void" else f"        return {call};")
+        self.l("    }")
+        self.l("}")
+        self.l("")
+
+    def detect_struct_return_functions(self, inp):
+        """
+        Automatically detect functions that return structs by value.
+        These need special handling for WebAssembly marshalling.
+        """
     
-    for decl in inp['decls']:
-        if not decl['is_dep'] and decl['kind'] == 'func':
-            func_name = decl['name']
+        for decl in inp['decls']:
+            if not decl['is_dep'] and decl['kind'] == 'func':
+                func_name = decl['name']
             
-            # Skip if already in web_wrapper_functions (those have special id-based handling)
-            if func_name in web_wrapper_functions:
-                continue
+                # Skip if already in web_wrapper_functions (those have special id-based handling)
+                if func_name in web_wrapper_functions:
+                    continue
             
-            # Skip if function is in ignore list
-            if check_name_ignore(func_name):
-                continue
+                # Skip if function is in ignore list
+                if check_name_ignore(func_name):
+                    continue
             
-            # Extract return type from function signature
-            decl_type = decl['type']
-            return_type = check_type_override(func_name, 'RESULT', 
-                                              decl_type[:decl_type.index('(')].strip())
+                # Extract return type from function signature
+                decl_type = decl['type']
+                return_type = check_type_override(func_name, 'RESULT', 
+                                                  decl_type[:decl_type.index('(')].strip())
             
-            # Check if return type is a struct (not pointer, not primitive, not void)
-            if (is_struct_type(return_type) and 
-                not is_struct_ptr(return_type) and 
-                not is_const_struct_ptr(return_type) and
-                return_type != 'void'):
-                
-                # Add to the dictionary for WebAssembly wrapper generation
-                web_wrapper_struct_return_functions[func_name] = return_type
-                print(f"  [AUTO-DETECTED] {func_name} returns struct {return_type}")
-
-def pre_parse(inp):
-    global struct_types
-    global enum_types
-    for decl in inp['decls']:
-        kind = decl['kind']
-        if kind == 'struct':
-            struct_types.append(decl['name'])
-        elif kind == 'enum':
-            enum_name = decl['name']
-            enum_types.append(enum_name)
-            enum_items[enum_name] = []
-            for item in decl['items']:
-                enum_items[enum_name].append(as_enum_item_name(item['name']))
+                # Check if return type is a struct (not pointer, not primitive, not void)
+                if (self.is_struct_type(return_type) and 
+                    not self.is_struct_ptr(return_type) and 
+                    not self.is_const_struct_ptr(return_type) and
+                    return_type != 'void'):
+
+                    # Structs returned in a register on wasm32 don't need a wrapper
+                    if not self.type_result(return_type, 'returns_indirect', lambda: gen_abi.returns_indirect(return_type, self.struct_decls, self.enum_decls, self.layouts())):
+                        self.direct_struct_return_functions[func_name] = return_type
+                        continue
+
+                    # Add to the dictionary for WebAssembly wrapper generation
+                    self.struct_return_functions[func_name] = return_type
+
+    def pre_parse(self, inp):
+        # the types of the dependencies are resolved from the registry, the
+        # module's IR only has its own declarations
+        for decl in gen_registry.dep_decls(inp['dep_prefixes']) + inp['decls']:
+            kind = decl['kind']
+            if kind == 'struct':
+                self.add_struct_type(decl['name'])
+                self.struct_decls[decl['name']] = decl
+            elif kind == 'enum':
+                enum_name = decl['name']
+                self.add_enum_type(enum_name)
+                self.enum_items[enum_name] = []
+                self.enum_decls[enum_name] = decl
+                for item in decl['items']:
+                    self.enum_items[enum_name].append(as_enum_item_name(item['name']))
+        if self.fragments is not None:
+            self.fragments.changed_types(dict(self.enum_decls, **self.struct_decls), self.decl_type_names)
     
-    # After parsing types, detect struct-returning functions for WebAssembly
-    detect_struct_return_functions(inp)
-
-def gen_imports(inp, dep_prefixes):
-    for dep_prefix in dep_prefixes:
-        dep_module_name = module_names[dep_prefix]
-        l(f'using static Sokol.{dep_module_name};')
-        l('')
-
-def gen_internal_functions(inp, prefix):
-    """Generate _internal function declarations for web wrapper struct return functions."""
-    for decl in inp['decls']:
-        if not decl['is_dep'] and decl['kind'] == 'func':
-            c_func_name = decl['name']
-            if c_func_name in web_wrapper_struct_return_functions:
-                csharp_func_name = as_pascal_case(check_name_override(decl['name']), prefix)
-                csharp_res_type = funcdecl_result_csharp(decl, prefix)
+        # After parsing types, detect struct-returning functions for WebAssembly
+        self.detect_struct_return_functions(inp)
+        if self.fragments is not None and self.struct_layouts is not None:
+            for name, layout in self.struct_layouts.items():
+                results = self.fragments.type_results(name)
+                if 'layout' not in results:
+                    results['layout'] = gen_abi.layout_to_json(layout)
+
+    def gen_imports(self, inp, dep_prefixes):
+        for dep_prefix in dep_prefixes:
+            dep_module_name = module_names[dep_prefix]
+            self.l(f'using static Sokol.{dep_module_name};')
+            self.l('')
+
+    def gen_internal_functions(self, inp, prefix):
+        """Generate _internal function declarations for web wrapper struct return functions."""
+        for decl in inp['decls']:
+            if not decl['is_dep'] and decl['kind'] == 'func':
+                c_func_name = decl['name']
+                if c_func_name in self.struct_return_functions:
+                    csharp_func_name = as_pascal_case(check_name_override(decl['name']), prefix)
+                    csharp_res_type = self.funcdecl_result_csharp(decl, prefix)
                 
-                # Use framework path on iOS, library name on all other platforms
-                l("#if __IOS__")
-                l(f"[DllImport(\"@rpath/{current_library_name}.framework/{current_library_name}\", EntryPoint = \"{c_func_name}_internal\", CallingConvention = CallingConvention.Cdecl)]")
-                l("#else")
-                l(f"[DllImport(\"{current_library_name}\", EntryPoint = \"{c_func_name}_internal\", CallingConvention = CallingConvention.Cdecl)]")
-                l("#endif")
-                if decl['params']:
-                    l(f"public static extern void {csharp_func_name}_internal(ref {csharp_res_type} result, {funcdecl_args_csharp(decl, prefix)});")
+                    # Use framework path on iOS, library name on all other platforms
+                    self.l("#if __IOS__")
+                    self.l(f"[DllImport(\"@rpath/{self.library_name}.framework/{self.library_name}\", EntryPoint = \"{c_func_name}_internal\", CallingConvention = CallingConvention.Cdecl)]")
+                    self.l("#else")
+                    self.l(f"[DllImport(\"{self.library_name}\", EntryPoint = \"{c_func_name}_internal\", CallingConvention = CallingConvention.Cdecl)]")
+                    self.l("#endif")
+                    if decl['params']:
+                        self.gen_extern("public", "void", f"{csharp_func_name}_internal", f"ref {csharp_res_type} result, {self.funcdecl_args_csharp(decl, prefix)}", f"{c_func_name}_internal")
+                    else:
+                        self.gen_extern("public", "void", f"{csharp_func_name}_internal", f"ref {csharp_res_type} result", f"{c_func_name}_internal")
+                    self.l("")
+
+    def gen_module(self, inp, dep_prefixes):
+        self.module_name = inp['module']
+        self.l('// machine generated, do not edit')
+        self.l('using System;')
+        self.l('using System.Runtime.InteropServices;')
+        self.l('using M = System.Runtime.InteropServices.MarshalAsAttribute;')
+        self.l('using U = System.Runtime.InteropServices.UnmanagedType;')
+        if 'library_import' in self.modes:
+            self.l('using System.Runtime.CompilerServices;')
+            self.l('using System.Runtime.InteropServices.Marshalling;')
+        if 'profile_shims' in self.modes:
+            self.l('#if SOKOL_BINDINGS_PROFILE')
+            self.l('using System.Diagnostics;')
+            if 'library_import' not in self.modes:
+                self.l('using System.Runtime.CompilerServices;')
+            self.l('using System.Text;')
+            self.l('#endif')
+        self.l('')
+        self.gen_imports(inp, dep_prefixes)
+        with gen_profile.span('pre_parse', module=inp['module']):
+            self.pre_parse(inp)
+        prefix = inp['prefix']
+        self.l("namespace Sokol")
+        self.l("{")
+        self.l(f"public static unsafe partial class {inp['module']}")
+        self.l("{")
+        for decl in inp['decls']:
+            if not decl['is_dep']:
+                if self.fragments is None:
+                    self.gen_decl(decl, prefix)
                 else:
-                    l(f"public static extern void {csharp_func_name}_internal(ref {csharp_res_type} result);")
-                l("")
+                    self.gen_decl_fragment(decl, prefix)
+        if self.fragments is not None:
+            self.fragments.save()
+        # Generate _internal function declarations for WebAssembly
+        self.gen_internal_functions(inp, prefix)
+        self.gen_profile_table()
+        self.l("}")
+        self.l("}")
+
+    def gen_decl(self, decl, prefix):
+        kind = decl['kind']
+        if kind == 'consts':
+            self.gen_consts(decl, prefix)
+        elif not check_name_ignore(decl['name']):
+            if kind == 'struct':
+                with gen_profile.span('gen_struct', decl=decl['name']):
+                    self.gen_struct(decl, prefix)
+            elif kind == 'enum':
+                with gen_profile.span('gen_enum', decl=decl['name']):
+                    self.gen_enum(decl, prefix)
+            elif kind == 'func':
+                with gen_profile.span('gen_func_csharp', decl=decl['name']):
+                    if not ('library_import' in self.modes and self.gen_func_library_import(decl, prefix)):
+                        self.gen_func_c(decl, prefix)
+                        self.gen_func_csharp(decl, prefix)
+                        if 'utf8_overloads' in self.modes and self.has_string_params(decl):
+                            self.gen_func_utf8_overloads(decl, prefix)
+
+    def decl_type_names(self, decl):
+        # the identifiers the types of a declaration mention (including the
+        # type overrides), a superset of the struct and enum types it
+        # depends on, see gen_fragments.FragmentCache.changed_types()
+        type_strings = [item['type'] for item in decl.get('fields', decl.get('params', ()))]
+        if 'type' in decl:
+            type_strings.append(decl['type'])
+        type_strings += self.type_override_types.get(decl.get('name'), ())
+        names = set()
+        for type_string in type_strings:
+            type_string_names = self.type_string_names.get(type_string)
+            if type_string_names is None:
+                type_string_names = self.type_string_names[type_string] = type_name_re.findall(type_string)
+            names.update(type_string_names)
+        return sorted(names)
+
+    def gen_decl_fragment(self, decl, prefix):
+        # the C# of a declaration is reused from the fragment cache if neither
+        # the declaration nor the types it mentions changed since the last
+        # run, the module is stitched together from the fragments
+        fragment = self.fragments.lookup(decl)
+        if fragment is None:
+            start = len(self.out_lines)
+            self.fragment_shared_decls = set()
+            self.gen_decl(decl, prefix)
+            text = ''.join(self.out_lines[start:])
+            del self.out_lines[start:]
+            fragment = self.fragments.store(decl, self.decl_type_names(decl), text, { name: self.shared_decls[name] for name in sorted(self.fragment_shared_decls) })
+        text, fragment_shared_decls = fragment
+        self.out_lines.append(text)
+        for name, shared_decl in fragment_shared_decls.items():
+            self.shared_decls.setdefault(name, shared_decl)
 
 def gen_c_internal_wrappers_header(all_inputs):
     """Generate C header file with _internal wrapper function implementations (excluding spine-c)."""
@@ -965,13 +1812,7 @@ def gen_c_internal_wrappers_header(all_inputs):
                 param_type = check_type_override(c_func_name, param['name'], param['type'])
                 param_name = param['name']
                 
-                # Convert type to C syntax
-                if is_const_struct_ptr(param_type):
-                    params_c.append(f"{param_type} {param_name}")
-                elif is_prim_type(param_type):
-                    params_c.append(f"{param_type} {param_name}")
-                else:
-                    params_c.append(f"{param_type} {param_name}")
+                params_c.append(f"{param_type} {param_name}")
             
             params_str = ", ".join(params_c) if params_c else ""
             if params_str:
@@ -1050,13 +1891,7 @@ def gen_c_spine_wrappers_header(all_inputs):
                         param_type = check_type_override(c_func_name, param['name'], param['type'])
                         param_name = param['name']
                         
-                        # Convert type to C syntax
-                        if is_const_struct_ptr(param_type):
-                            params_c.append(f"{param_type} {param_name}")
-                        elif is_prim_type(param_type):
-                            params_c.append(f"{param_type} {param_name}")
-                        else:
-                            params_c.append(f"{param_type} {param_name}")
+                        params_c.append(f"{param_type} {param_name}")
                     
                     params_str = ", ".join(params_c) if params_c else ""
                     if params_str:
@@ -1129,13 +1964,7 @@ def gen_c_ozzutil_wrappers_header(all_inputs):
                         param_type = check_type_override(c_func_name, param['name'], param['type'])
                         param_name = param['name']
                         
-                        # Convert type to C syntax
-                        if is_const_struct_ptr(param_type):
-                            params_c.append(f"{param_type} {param_name}")
-                        elif is_prim_type(param_type):
-                            params_c.append(f"{param_type} {param_name}")
-                        else:
-                            params_c.append(f"{param_type} {param_name}")
+                        params_c.append(f"{param_type} {param_name}")
                     
                     params_str = ", ".join(params_c) if params_c else ""
                     if params_str:
@@ -1152,54 +1981,967 @@ def gen_c_ozzutil_wrappers_header(all_inputs):
     
     header_lines.append("#endif // OZZUTIL_CSHARP_INTERNAL_WRAPPERS_H")
     header_lines.append("")
-    
+
     return "\n".join(header_lines)
 
-def gen_module(inp, dep_prefixes):
-    l('// machine generated, do not edit')
-    l('using System;')
-    l('using System.Runtime.InteropServices;')
-    l('using M = System.Runtime.InteropServices.MarshalAsAttribute;')
-    l('using U = System.Runtime.InteropServices.UnmanagedType;')
-    l('')
-    gen_imports(inp, dep_prefixes)
-    pre_parse(inp)
-    prefix = inp['prefix']
-    l("namespace Sokol")
-    l("{")
-    l(f"public static unsafe partial class {inp['module']}")
-    l("{")
-    for decl in inp['decls']:
-        if not decl['is_dep']:
-            kind = decl['kind']
-            if kind == 'consts':
-                gen_consts(decl, prefix)
-            elif not check_name_ignore(decl['name']):
-                if kind == 'struct':
-                    gen_struct(decl, prefix)
-                elif kind == 'enum':
-                    gen_enum(decl, prefix)
-                elif kind == 'func':
-                    gen_func_c(decl, prefix)
-                    gen_func_csharp(decl, prefix)
-    # Generate _internal function declarations for WebAssembly
-    gen_internal_functions(inp, prefix)
-    l("}")
-    l("}")
+def command_buffer_param_kind(generator, param_type):
+    # how a parameter is encoded in a command, None if it can't be recorded:
+    #   'value':      copied into the command's args struct
+    #   'bool':       same, as a byte
+    #   'struct_ptr': const pointer to a struct, the struct is copied
+    #   'range':      const pointer to a {ptr, size} struct, the pointed-to
+    #                 bytes are copied behind the args struct
+    #   'string':     the UTF-8 bytes are copied behind the args struct
+    if param_type == 'bool':
+        return 'bool'
+    elif is_prim_type(param_type) and '*' not in param_type:
+        return 'value'
+    elif generator.is_enum_type(param_type):
+        return 'value'
+    elif generator.is_struct_type(param_type):
+        return 'value' if generator.is_blittable_struct(param_type) else None
+    elif generator.is_const_struct_ptr(param_type):
+        struct_type = extract_ptr_type(param_type)
+        if not generator.is_blittable_struct(struct_type):
+            return None
+        return 'range' if command_buffer_range_fields(generator, struct_type) else 'struct_ptr'
+    elif is_string_ptr(param_type):
+        return 'string'
+    return None
+
+def command_buffer_range_fields(generator, struct_type):
+    # (ptr field, size field) of a range struct like sg_range, None for other structs
+    fields = generator.struct_decls[struct_type]['fields']
+    ptr_fields = [field['name'] for field in fields if is_const_void_ptr(field['type'])]
+    size_fields = [field['name'] for field in fields if field['type'] == 'size_t']
+    if len(fields) != 2 or len(ptr_fields) != 1 or len(size_fields) != 1:
+        return None
+    return ptr_fields[0], size_fields[0]
+
+def command_buffer_commands(all_inputs):
+    # the recordable command_buffer_functions of the generated modules, in
+    # the order of command_buffer_functions (which defines the command ids)
+    commands = {}
+    for inp in all_inputs:
+        prefix = inp['prefix']
+        library_name = library_names.get(prefix, 'sokol')
+        generator = None
+        for decl in inp['decls']:
+            if decl['is_dep'] or decl['kind'] != 'func' or decl['name'] not in command_buffer_functions:
+                continue
+            func_name = decl['name']
+            if library_name != 'sokol':
+                print(f"  [COMMAND BUFFER] skipping {func_name}: not in the sokol library")
+                continue
+            if generator is None:
+                generator = ModuleGenerator(library_name, module_modes.get(prefix, ()))
+                generator.module_name = inp['module']
+                generator.pre_parse(inp)
+            decl_type = decl['type']
+            if decl_type[:decl_type.index('(')].strip() != 'void':
+                print(f"  [COMMAND BUFFER] skipping {func_name}: only functions returning void can be recorded")
+                continue
+            params = []
+            for param_decl in decl['params']:
+                param_type = check_type_override(func_name, param_decl['name'], param_decl['type'])
+                kind = command_buffer_param_kind(generator, param_type)
+                if kind is None:
+                    break
+                params.append({
+                    'name': param_decl['name'],
+                    'csharp_name': check_name_override(param_decl['name']),
+                    'type': param_type,
+                    'kind': kind,
+                })
+            else:
+                commands[func_name] = { 'name': func_name, 'prefix': prefix, 'generator': generator, 'decl': decl, 'params': params }
+                continue
+            print(f"  [COMMAND BUFFER] skipping {func_name}: parameter {param_decl['name']} ({param_type}) can't be recorded")
+    return [commands[func_name] for func_name in command_buffer_functions if func_name in commands]
+
+def command_buffer_args_fields_c(command):
+    # fields of the C args struct of a command, empty if it has no parameters
+    fields = []
+    for param in command['params']:
+        if param['kind'] == 'string':
+            fields.append(f"uint32_t {param['name']}_size")
+        elif param['kind'] in ('struct_ptr', 'range'):
+            fields.append(f"{extract_ptr_type(param['type'])} {param['name']}")
+        else:
+            fields.append(f"{param['type']} {param['name']}")
+    return fields
+
+def command_buffer_args_fields_csharp(command):
+    # same as command_buffer_args_fields_c(), with the same layout
+    generator = command['generator']
+    fields = []
+    for param in command['params']:
+        kind = param['kind']
+        name = param['csharp_name']
+        if kind == 'string':
+            fields.append(f"uint {name}_size")
+        elif kind == 'bool':
+            fields.append(f"byte {name}")
+        elif kind in ('struct_ptr', 'range'):
+            fields.append(f"{as_csharp_struct_type(extract_ptr_type(param['type']), command['prefix'])} {name}")
+        else:
+            fields.append(f"{generator.as_csharp_arg_type(None, param['type'], command['prefix'])} {name}")
+    return fields
+
+def gen_command_buffer_csharp(commands):
+    """Generate the C# command buffer recorder for the command_buffer_functions."""
+    usings = set()
+    for command in commands:
+        for param in command['params']:
+            module = command['generator'].type_module(extract_ptr_type(param['type']))
+            if module is not None:
+                usings.add(module)
+    lines = [
+        '// machine generated, do not edit',
+        'using System;',
+        'using System.Runtime.InteropServices;',
+        'using System.Text;',
+    ]
+    lines += [f'using static Sokol.{module};' for module in sorted(usings)]
+    lines += [
+        '',
+        'namespace Sokol',
+        '{',
+        '// Records calls of hot sokol functions into a native buffer, which is',
+        '// dispatched by sokol_csharp_command_buffer_execute() in one native call',
+        '// per Submit() (or when the buffer is full), instead of one P/Invoke',
+        '// transition per call. Not thread-safe, and the recorded calls are only',
+        '// executed on Submit(), so call Submit() before any function which',
+        '// depends on them (e.g. sg_end_pass(), sgl_draw(), sdtx_draw()).',
+        'public static unsafe class CommandBuffer',
+        '{',
+        '    public const int DefaultCapacity = 64 * 1024;',
+        '',
+        '    // must match _sokol_csharp_command_header in sokol_csharp_command_buffer.h',
+        '    [StructLayout(LayoutKind.Sequential)]',
+        '    private struct Header',
+        '    {',
+        '        public uint id;',
+        '        public uint size;',
+        '    }',
+        '',
+    ]
+    for command in commands:
+        fields = command_buffer_args_fields_csharp(command)
+        if not fields:
+            continue
+        lines.append('    [StructLayout(LayoutKind.Sequential)]')
+        lines.append(f"    private struct {command['name']}_args")
+        lines.append('    {')
+        for field in fields:
+            lines.append(f'        public {field};')
+        lines.append('    }')
+        lines.append('')
+    lines += [
+        '    private static byte* buffer;',
+        '    private static int capacity;',
+        '    private static int used;',
+        '',
+        '#if __IOS__',
+        '    [DllImport("@rpath/sokol.framework/sokol", EntryPoint = "sokol_csharp_command_buffer_execute", CallingConvention = CallingConvention.Cdecl)]',
+        '#else',
+        '    [DllImport("sokol", EntryPoint = "sokol_csharp_command_buffer_execute", CallingConvention = CallingConvention.Cdecl)]',
+        '#endif',
+        '    private static extern void sokol_csharp_command_buffer_execute(byte* commands, uint size);',
+        '',
+        '    // number of recorded bytes which are not submitted yet',
+        '    public static int Used => used;',
+        '',
+        '    // executes the recorded calls',
+        '    public static void Submit()',
+        '    {',
+        '        if (used > 0)',
+        '        {',
+        '            sokol_csharp_command_buffer_execute(buffer, (uint)used);',
+        '            used = 0;',
+        '        }',
+        '    }',
+        '',
+        '    // submits the recorded calls and frees the buffer',
+        '    public static void Shutdown()',
+        '    {',
+        '        Submit();',
+        '        NativeMemory.AlignedFree(buffer);',
+        '        buffer = null;',
+        '        capacity = 0;',
+        '    }',
+        '',
+        '    private static int Align(int size) => (size + 7) & ~7;',
+        '',
+        '    // appends a command, the args struct follows the header and the',
+        '    // (already aligned) payload follows the args struct',
+        '    private static byte* Record(uint id, int args_size, int payload_size)',
+        '    {',
+        '        int size = sizeof(Header) + Align(args_size) + payload_size;',
+        '        if (used + size > capacity)',
+        '        {',
+        '            Submit();',
+        '            if (size > capacity)',
+        '            {',
+        '                NativeMemory.AlignedFree(buffer);',
+        '                capacity = Math.Max(DefaultCapacity, Align(size));',
+        '                buffer = (byte*)NativeMemory.AlignedAlloc((nuint)capacity, 16);',
+        '            }',
+        '        }',
+        '        Header* header = (Header*)(buffer + used);',
+        '        header->id = id;',
+        '        header->size = (uint)size;',
+        '        used += size;',
+        '        return (byte*)(header + 1);',
+        '    }',
+    ]
+    for command_id, command in enumerate(commands, 1):
+        generator = command['generator']
+        func_name = command['name']
+        prefix = command['prefix']
+        params = command['params']
+        payloads = [param for param in params if param['kind'] in ('range', 'string')]
+        args_type = f'{func_name}_args'
+        args_size = f'sizeof({args_type})' if params else '0'
+        csharp_params = ', '.join(generator.as_csharp_arg_type(f" {param['csharp_name']}", param['type'], prefix) for param in params)
+        lines.append('')
+        lines.append(f'    public static void {func_name}({csharp_params})')
+        lines.append('    {')
+        for param in payloads:
+            name = param['csharp_name']
+            if param['kind'] == 'string':
+                lines.append(f'        int {name}_size = {name} == null ? 0 : Encoding.UTF8.GetByteCount({name}) + 1;')
+            else:
+                size_field = command_buffer_range_fields(generator, extract_ptr_type(param['type']))[1]
+                lines.append(f'        int {name}_size = (int){name}.{size_field};')
+        payload_size = ' + '.join(f"Align({param['csharp_name']}_size)" for param in payloads) or '0'
+        if not params:
+            lines.append(f'        Record({command_id}, 0, 0);')
+            lines.append('    }')
+            continue
+        lines.append(f'        byte* command = Record({command_id}, {args_size}, {payload_size});')
+        lines.append(f'        {args_type}* args = ({args_type}*)command;')
+        for param in params:
+            name = param['csharp_name']
+            kind = param['kind']
+            if kind == 'string':
+                lines.append(f'        args->{name}_size = (uint){name}_size;')
+            elif kind == 'bool':
+                lines.append(f'        args->{name} = {name} ? (byte)1 : (byte)0;')
+            else:
+                lines.append(f'        args->{name} = {name};')
+        if payloads:
+            lines.append(f'        byte* payload = command + Align({args_size});')
+        for index, param in enumerate(payloads):
+            name = param['csharp_name']
+            if param['kind'] == 'string':
+                lines.append(f'        if ({name} != null)')
+                lines.append('        {')
+                lines.append(f'            payload[Encoding.UTF8.GetBytes({name}, new Span<byte>(payload, {name}_size))] = 0;')
+                lines.append('        }')
+            else:
+                ptr_field = command_buffer_range_fields(generator, extract_ptr_type(param['type']))[0]
+                lines.append(f'        Buffer.MemoryCopy({name}.{ptr_field}, payload, {name}_size, {name}_size);')
+            if index + 1 < len(payloads):
+                lines.append(f'        payload += Align({name}_size);')
+        lines.append('    }')
+    lines.append('}')
+    lines.append('}')
+    return '\n'.join(lines) + '\n'
+
+def gen_c_command_buffer_header(commands):
+    """Generate the C decoder/dispatcher of the commands recorded by CommandBuffer.cs."""
+    header_lines = []
+    header_lines.append("/*")
+    header_lines.append("    AUTO-GENERATED C COMMAND BUFFER DISPATCHER")
+    header_lines.append("    This file is automatically generated by gen_csharp.py")
+    header_lines.append("    DO NOT EDIT MANUALLY")
+    header_lines.append("")
+    header_lines.append("    Executes the calls recorded by the C# CommandBuffer class, so that many")
+    header_lines.append("    calls of hot functions only need one P/Invoke transition. Each command is")
+    header_lines.append("    a header, the function's arguments and the copied pointed-to data (strings,")
+    header_lines.append("    ranges), all 8-byte aligned. See command_buffer_functions in gen_csharp.py.")
+    header_lines.append("*/")
+    header_lines.append("")
+    header_lines.append("#ifndef SOKOL_CSHARP_COMMAND_BUFFER_H")
+    header_lines.append("#define SOKOL_CSHARP_COMMAND_BUFFER_H")
+    header_lines.append("")
+    header_lines.append("#include <stdint.h>")
+    header_lines.append("#include <stddef.h>")
+    header_lines.append("")
+    header_lines.append("#define _SOKOL_CSHARP_COMMAND_ALIGN(size) (((size) + 7) & ~(size_t)7)")
+    header_lines.append("")
+    header_lines.append("typedef struct {")
+    header_lines.append("    uint32_t id;")
+    header_lines.append("    uint32_t size;")
+    header_lines.append("} _sokol_csharp_command_header;")
+    header_lines.append("")
+    if commands:
+        header_lines.append("enum {")
+        for command_id, command in enumerate(commands, 1):
+            header_lines.append(f"    _SOKOL_CSHARP_COMMAND_{command['name'].upper()} = {command_id},")
+        header_lines.append("};")
+        header_lines.append("")
+    for command in commands:
+        fields = command_buffer_args_fields_c(command)
+        if not fields:
+            continue
+        header_lines.append("typedef struct {")
+        for field in fields:
+            header_lines.append(f"    {field};")
+        header_lines.append(f"}} _sokol_csharp_{command['name']}_args;")
+        header_lines.append("")
+
+    header_lines.append("SOKOL_API_IMPL void sokol_csharp_command_buffer_execute(const uint8_t* commands, uint32_t size) {")
+    header_lines.append("    const uint8_t* end = commands + size;")
+    header_lines.append("    while (commands < end) {")
+    header_lines.append("        const _sokol_csharp_command_header* header = (const _sokol_csharp_command_header*)commands;")
+    header_lines.append("        switch (header->id) {")
+    for command in commands:
+        func_name = command['name']
+        generator = command['generator']
+        params = command['params']
+        header_lines.append(f"            case _SOKOL_CSHARP_COMMAND_{func_name.upper()}: {{")
+        if not params:
+            header_lines.append(f"                {func_name}();")
+            header_lines.append("                break;")
+            header_lines.append("            }")
+            continue
+        args_type = f"_sokol_csharp_{func_name}_args"
+        header_lines.append(f"                const {args_type}* args = (const {args_type}*)(header + 1);")
+        payloads = [param for param in params if param['kind'] in ('range', 'string')]
+        if payloads:
+            header_lines.append(f"                const uint8_t* payload = (const uint8_t*)args + _SOKOL_CSHARP_COMMAND_ALIGN(sizeof({args_type}));")
+        call_args = []
+        for index, param in enumerate(payloads):
+            name = param['name']
+            if param['kind'] == 'string':
+                header_lines.append(f"                const char* {name} = args->{name}_size ? (const char*)payload : 0;")
+                size = f"args->{name}_size"
+            else:
+                ptr_field, size_field = command_buffer_range_fields(generator, extract_ptr_type(param['type']))
+                header_lines.append(f"                {extract_ptr_type(param['type'])} {name} = args->{name};")
+                header_lines.append(f"                {name}.{ptr_field} = {name}.{size_field} ? payload : 0;")
+                size = f"{name}.{size_field}"
+            if index + 1 < len(payloads):
+                header_lines.append(f"                payload += _SOKOL_CSHARP_COMMAND_ALIGN({size});")
+        for param in params:
+            name = param['name']
+            if param['kind'] == 'string':
+                call_args.append(name)
+            elif param['kind'] == 'range':
+                call_args.append(f"&{name}")
+            elif param['kind'] == 'struct_ptr':
+                call_args.append(f"&args->{name}")
+            else:
+                call_args.append(f"args->{name}")
+        header_lines.append(f"                {func_name}({', '.join(call_args)});")
+        header_lines.append("                break;")
+        header_lines.append("            }")
+    header_lines.append("            default:")
+    header_lines.append("                // unknown command, the C# and C side were generated from different function lists")
+    header_lines.append("                return;")
+    header_lines.append("        }")
+    header_lines.append("        commands += header->size;")
+    header_lines.append("    }")
+    header_lines.append("}")
+    header_lines.append("")
+    header_lines.append("#endif // SOKOL_CSHARP_COMMAND_BUFFER_H")
+    header_lines.append("")
+
+    return "\n".join(header_lines)
+
+def trace_hook_arg_kind(generator, arg_type):
+    # how a hook argument is written to the capture and read back on replay:
+    # 'value' (copied), 'string', 'struct_ptr' (the descriptor and its nested
+    # data), or 'pointer' (only the address is recorded, can't be replayed)
+    if is_string_ptr(arg_type):
+        return 'string'
+    elif generator.is_const_struct_ptr(arg_type):
+        return 'struct_ptr'
+    elif '*' in arg_type or '[' in arg_type:
+        return 'pointer'
+    return 'value'
+
+def trace_walk_fields(generator, struct_type, walkers):
+    # fills walkers with the nested data (ranges, strings) to be written after
+    # a descriptor of struct_type, in dependency order, returns False if
+    # struct_type doesn't point to any such data
+    if struct_type in walkers:
+        return walkers[struct_type] is not None
+    walkers[struct_type] = None
+    decl = generator.struct_decls[struct_type]
+    range_fields = command_buffer_range_fields(generator, struct_type)
+    steps = []
+    if range_fields is not None:
+        steps.append(('data',) + range_fields)
+    else:
+        for field in decl['fields']:
+            field_type = field['type']
+            c_type = util.parse_c_type(field_type)
+            if is_string_ptr(field_type):
+                steps.append(('string', field['name']))
+            elif c_type.array_dims and not c_type.ptr_depth and c_type.base in generator.struct_decls:
+                if trace_walk_fields(generator, c_type.base, walkers):
+                    steps.append(('array', field['name'], c_type.base, c_type.array_dims))
+            elif field_type in generator.struct_decls:
+                if trace_walk_fields(generator, field_type, walkers):
+                    steps.append(('struct', field['name'], field_type))
+    if not steps:
+        return False
+    # the dict keeps the insertion order, so re-insert after the nested structs
+    del walkers[struct_type]
+    walkers[struct_type] = steps
+    return True
+
+def trace_hook_list(all_inputs):
+    # the function pointers of the trace_hooks struct, with the function which
+    # re-issues the call on replay (None if there is no matching function)
+    prefix, struct_name, install_func = trace_hooks
+    inp = next((inp for inp in all_inputs if inp['prefix'] == prefix), None)
+    if inp is None:
+        return None
+    generator = ModuleGenerator(library_names.get(prefix, 'sokol'), module_modes.get(prefix, ()))
+    generator.module_name = inp['module']
+    generator.pre_parse(inp)
+    if struct_name not in generator.struct_decls:
+        return None
+    funcs = { decl['name']: decl for decl in inp['decls'] if decl['kind'] == 'func' and not decl['is_dep'] }
+    hooks = []
+    walkers = {}
+    for field in generator.struct_decls[struct_name]['fields']:
+        if not is_func_ptr(field['type']):
+            continue
+        hook_name = field['name']
+        args = list(util.parse_c_type(field['type']).func_ptr.args)
+        if args and is_void_ptr(args[-1]):
+            args = args[:-1]
+        else:
+            print(f"  [TRACE] skipping {hook_name}: the last argument isn't the user_data pointer")
+            continue
+        kinds = [trace_hook_arg_kind(generator, arg_type) for arg_type in args]
+        for arg_type, kind in zip(args, kinds):
+            if kind == 'struct_ptr':
+                trace_walk_fields(generator, extract_ptr_type(arg_type), walkers)
+        replay = None
+        func_decl = funcs.get(f'{prefix}{hook_name}')
+        if func_decl is not None:
+            func_type = func_decl['type']
+            result_type = func_type[:func_type.index('(')].strip()
+            param_types = [param['type'] for param in func_decl['params']]
+            # hooks of functions with a result get the result as last argument
+            call_args = args[:-1] if result_type != 'void' and args and args[-1] == result_type else args
+            if param_types == call_args and 'pointer' not in kinds[:len(call_args)]:
+                replay = { 'name': func_decl['name'], 'num_args': len(call_args) }
+        if replay is None:
+            print(f"  [TRACE] {hook_name} is only recorded: no matching {prefix}{hook_name}() to replay it")
+        hooks.append({ 'name': hook_name, 'args': args, 'kinds': kinds, 'replay': replay })
+    return { 'prefix': prefix, 'struct': struct_name, 'install': install_func, 'hooks': hooks,
+             'walkers': { name: steps for name, steps in walkers.items() if steps is not None } }
+
+def gen_c_trace_header(trace):
+    """Generate the C recorder and replayer of the trace hooks binary captures."""
+    struct_name = trace['struct']
+    hooks = trace['hooks']
+    walkers = trace['walkers']
+    header_lines = []
+    header_lines.append("/*")
+    header_lines.append("    AUTO-GENERATED C TRACE CAPTURE RECORDER AND REPLAYER")
+    header_lines.append("    This file is automatically generated by gen_csharp.py")
+    header_lines.append("    DO NOT EDIT MANUALLY")
+    header_lines.append("")
+    header_lines.append(f"    sokol_csharp_trace_begin() installs {struct_name} which write every traced")
+    header_lines.append("    call, its arguments and the data its descriptors point to (ranges, strings)")
+    header_lines.append("    into a binary capture until sokol_csharp_trace_end(). Previously installed")
+    header_lines.append("    hooks are still called. sokol_csharp_trace_replay() re-issues the calls of")
+    header_lines.append("    a capture, e.g. to benchmark one frame with the dummy backend. Native")
+    header_lines.append("    handles and pointers in descriptors are replayed as they were recorded.")
+    header_lines.append("    See bindgen/trace_capture.py for the format and a reader.")
+    header_lines.append("*/")
+    header_lines.append("")
+    header_lines.append("#ifndef SOKOL_CSHARP_TRACE_H")
+    header_lines.append("#define SOKOL_CSHARP_TRACE_H")
+    header_lines.append("")
+    header_lines.append("#include <stdio.h>")
+    header_lines.append("#include <stdlib.h>")
+    header_lines.append("#include <string.h>")
+    header_lines.append("#include <stdint.h>")
+    header_lines.append("#include <stdbool.h>")
+    header_lines.append("")
+    header_lines.append('#define _SOKOL_CSHARP_TRACE_MAGIC "SCTR"')
+    header_lines.append("#define _SOKOL_CSHARP_TRACE_VERSION 1")
+    header_lines.append(f"#define _SOKOL_CSHARP_TRACE_NUM_HOOKS {len(hooks)}")
+    header_lines.append("// blob tags, the NULL flag is set for null pointers")
+    header_lines.append("#define _SOKOL_CSHARP_TRACE_ARG 0")
+    header_lines.append("#define _SOKOL_CSHARP_TRACE_DATA 1")
+    header_lines.append("#define _SOKOL_CSHARP_TRACE_NULL 2")
+    commit = next((index for index, hook in enumerate(hooks) if hook['name'] == 'commit'), -1)
+    header_lines.append("// the record which ends a frame")
+    header_lines.append(f"#define _SOKOL_CSHARP_TRACE_COMMIT {commit}")
+    header_lines.append("")
+    header_lines.append("static const char* _sokol_csharp_trace_hook_names[_SOKOL_CSHARP_TRACE_NUM_HOOKS] = {")
+    for hook in hooks:
+        header_lines.append(f"    \"{hook['name']}\",")
+    header_lines.append("};")
+    header_lines.append("static const char* _sokol_csharp_trace_hook_args[_SOKOL_CSHARP_TRACE_NUM_HOOKS] = {")
+    for hook in hooks:
+        header_lines.append(f"    \"{', '.join(hook['args'])}\",")
+    header_lines.append("};")
+    header_lines.append("")
+    header_lines.append("typedef struct {")
+    header_lines.append("    bool replay;")
+    header_lines.append("    // recording")
+    header_lines.append("    FILE* file;")
+    header_lines.append("    uint8_t* buf;")
+    header_lines.append("    uint32_t size;")
+    header_lines.append("    uint32_t capacity;")
+    header_lines.append("    // replaying")
+    header_lines.append("    const uint8_t* pos;")
+    header_lines.append("    const uint8_t* end;")
+    header_lines.append("} _sokol_csharp_trace_t;")
+    header_lines.append("")
+    header_lines.append("static _sokol_csharp_trace_t _sokol_csharp_trace;")
+    header_lines.append(f"static {struct_name} _sokol_csharp_trace_prev_hooks;")
+    header_lines.append("")
+    header_lines.append("static void _sokol_csharp_trace_put(_sokol_csharp_trace_t* t, const void* data, uint32_t size) {")
+    header_lines.append("    if (t->size + size > t->capacity) {")
+    header_lines.append("        t->capacity = (t->size + size) * 2;")
+    header_lines.append("        t->buf = (uint8_t*)realloc(t->buf, t->capacity);")
+    header_lines.append("    }")
+    header_lines.append("    memcpy(t->buf + t->size, data, size);")
+    header_lines.append("    t->size += size;")
+    header_lines.append("}")
+    header_lines.append("")
+    header_lines.append("static void _sokol_csharp_trace_put_blob(_sokol_csharp_trace_t* t, uint8_t tag, const void* data, uint32_t size) {")
+    header_lines.append("    if (data == 0) {")
+    header_lines.append("        tag |= _SOKOL_CSHARP_TRACE_NULL;")
+    header_lines.append("        size = 0;")
+    header_lines.append("    }")
+    header_lines.append("    _sokol_csharp_trace_put(t, &tag, 1);")
+    header_lines.append("    _sokol_csharp_trace_put(t, &size, 4);")
+    header_lines.append("    if (size > 0) {")
+    header_lines.append("        _sokol_csharp_trace_put(t, data, size);")
+    header_lines.append("    }")
+    header_lines.append("}")
+    header_lines.append("")
+    header_lines.append("static void _sokol_csharp_trace_put_string(_sokol_csharp_trace_t* t, uint8_t tag, const char* str) {")
+    header_lines.append("    _sokol_csharp_trace_put_blob(t, tag, str, str ? (uint32_t)strlen(str) + 1 : 0);")
+    header_lines.append("}")
+    header_lines.append("")
+    header_lines.append("// returns the next blob of the record (0 for null pointers), sets ok to false")
+    header_lines.append("// if the record is truncated")
+    header_lines.append("static const void* _sokol_csharp_trace_get_blob(_sokol_csharp_trace_t* t, uint32_t* size, bool* ok) {")
+    header_lines.append("    *size = 0;")
+    header_lines.append("    if (t->pos + 5 > t->end) {")
+    header_lines.append("        *ok = false;")
+    header_lines.append("        return 0;")
+    header_lines.append("    }")
+    header_lines.append("    uint8_t tag = t->pos[0];")
+    header_lines.append("    memcpy(size, t->pos + 1, 4);")
+    header_lines.append("    const uint8_t* data = t->pos + 5;")
+    header_lines.append("    if (*size > (size_t)(t->end - data)) {")
+    header_lines.append("        *size = 0;")
+    header_lines.append("        *ok = false;")
+    header_lines.append("        return 0;")
+    header_lines.append("    }")
+    header_lines.append("    t->pos = data + *size;")
+    header_lines.append("    return (tag & _SOKOL_CSHARP_TRACE_NULL) ? 0 : data;")
+    header_lines.append("}")
+    header_lines.append("")
+    header_lines.append("// reads an argument of the given size into value, a null pointer for descriptors")
+    header_lines.append("static bool _sokol_csharp_trace_get_arg(_sokol_csharp_trace_t* t, void* value, uint32_t size, bool* is_null) {")
+    header_lines.append("    bool ok = true;")
+    header_lines.append("    uint32_t blob_size;")
+    header_lines.append("    const void* data = _sokol_csharp_trace_get_blob(t, &blob_size, &ok);")
+    header_lines.append("    *is_null = ok && data == 0;")
+    header_lines.append("    if (!ok || (data != 0 && blob_size != size)) {")
+    header_lines.append("        return false;")
+    header_lines.append("    }")
+    header_lines.append("    if (data != 0) {")
+    header_lines.append("        memcpy(value, data, size);")
+    header_lines.append("    }")
+    header_lines.append("    return true;")
+    header_lines.append("}")
+    header_lines.append("")
+    header_lines.append("// nested data of a descriptor: written after it when recording, the pointer")
+    header_lines.append("// is patched to point into the capture when replaying")
+    header_lines.append("static void _sokol_csharp_trace_walk_data(_sokol_csharp_trace_t* t, const void** ptr, size_t size) {")
+    header_lines.append("    if (t->replay) {")
+    header_lines.append("        bool ok = true;")
+    header_lines.append("        uint32_t blob_size;")
+    header_lines.append("        *ptr = _sokol_csharp_trace_get_blob(t, &blob_size, &ok);")
+    header_lines.append("    } else {")
+    header_lines.append("        _sokol_csharp_trace_put_blob(t, _SOKOL_CSHARP_TRACE_DATA, *ptr, (uint32_t)size);")
+    header_lines.append("    }")
+    header_lines.append("}")
+    header_lines.append("")
+    header_lines.append("static void _sokol_csharp_trace_walk_string(_sokol_csharp_trace_t* t, const char** str) {")
+    header_lines.append("    if (t->replay) {")
+    header_lines.append("        bool ok = true;")
+    header_lines.append("        uint32_t blob_size;")
+    header_lines.append("        *str = (const char*)_sokol_csharp_trace_get_blob(t, &blob_size, &ok);")
+    header_lines.append("    } else {")
+    header_lines.append("        _sokol_csharp_trace_put_string(t, _SOKOL_CSHARP_TRACE_DATA, *str);")
+    header_lines.append("    }")
+    header_lines.append("}")
+    header_lines.append("")
+
+    # per-struct walkers over the nested data, nested structs come first
+    for walk_struct, steps in walkers.items():
+        header_lines.append(f"static void _sokol_csharp_trace_walk_{walk_struct}(_sokol_csharp_trace_t* t, {walk_struct}* v) {{")
+        for step in steps:
+            if step[0] == 'data':
+                header_lines.append(f"    _sokol_csharp_trace_walk_data(t, &v->{step[1]}, v->{step[2]});")
+            elif step[0] == 'string':
+                header_lines.append(f"    _sokol_csharp_trace_walk_string(t, &v->{step[1]});")
+            elif step[0] == 'struct':
+                header_lines.append(f"    _sokol_csharp_trace_walk_{step[2]}(t, &v->{step[1]});")
+            else:
+                _, field_name, item_type, dims = step
+                count = 1
+                for dim in dims:
+                    count *= dim
+                header_lines.append(f"    for (int i = 0; i < {count}; i++) {{")
+                header_lines.append(f"        _sokol_csharp_trace_walk_{item_type}(t, &(({item_type}*)v->{field_name})[i]);")
+                header_lines.append("    }")
+        header_lines.append("}")
+        header_lines.append("")
+
+    # the recording hooks
+    for hook_index, hook in enumerate(hooks):
+        hook_name = hook['name']
+        params = [f"{arg_type} a{index}" if not arg_type.endswith('*') else f"{arg_type}a{index}" for index, arg_type in enumerate(hook['args'])]
+        header_lines.append(f"static void _sokol_csharp_trace_{hook_name}({', '.join(params + ['void* user_data'])}) {{")
+        header_lines.append("    (void)user_data;")
+        header_lines.append("    _sokol_csharp_trace_t* t = &_sokol_csharp_trace;")
+        header_lines.append("    t->size = 0;")
+        header_lines.append(f"    uint32_t record[2] = {{ {hook_index}, 0 }};")
+        header_lines.append("    _sokol_csharp_trace_put(t, record, sizeof(record));")
+        for index, (arg_type, kind) in enumerate(zip(hook['args'], hook['kinds'])):
+            arg = f"a{index}"
+            if kind == 'string':
+                header_lines.append(f"    _sokol_csharp_trace_put_string(t, _SOKOL_CSHARP_TRACE_ARG, {arg});")
+            elif kind == 'struct_ptr':
+                struct_type = extract_ptr_type(arg_type)
+                header_lines.append(f"    _sokol_csharp_trace_put_blob(t, _SOKOL_CSHARP_TRACE_ARG, {arg}, sizeof({struct_type}));")
+                if struct_type in walkers:
+                    header_lines.append(f"    if ({arg}) {{")
+                    header_lines.append(f"        _sokol_csharp_trace_walk_{struct_type}(t, ({struct_type}*){arg});")
+                    header_lines.append("    }")
+            else:
+                header_lines.append(f"    _sokol_csharp_trace_put_blob(t, _SOKOL_CSHARP_TRACE_ARG, &{arg}, sizeof({arg}));")
+        header_lines.append("    record[1] = t->size - (uint32_t)sizeof(record);")
+        header_lines.append("    memcpy(t->buf + 4, &record[1], 4);")
+        header_lines.append("    fwrite(t->buf, 1, t->size, t->file);")
+        call_args = [f"a{index}" for index in range(len(hook['args']))] + ["_sokol_csharp_trace_prev_hooks.user_data"]
+        header_lines.append(f"    if (_sokol_csharp_trace_prev_hooks.{hook_name}) {{")
+        header_lines.append(f"        _sokol_csharp_trace_prev_hooks.{hook_name}({', '.join(call_args)});")
+        header_lines.append("    }")
+        header_lines.append("}")
+        header_lines.append("")
+
+    header_lines.append("static void _sokol_csharp_trace_write_string(FILE* file, const char* str) {")
+    header_lines.append("    uint16_t len = (uint16_t)strlen(str);")
+    header_lines.append("    fwrite(&len, 1, 2, file);")
+    header_lines.append("    fwrite(str, 1, len, file);")
+    header_lines.append("}")
+    header_lines.append("")
+    header_lines.append("// starts recording into a new capture file, returns false if the file can't")
+    header_lines.append("// be created or a capture is already being recorded")
+    header_lines.append("SOKOL_API_IMPL bool sokol_csharp_trace_begin(const char* path) {")
+    header_lines.append("    if (_sokol_csharp_trace.file) {")
+    header_lines.append("        return false;")
+    header_lines.append("    }")
+    header_lines.append('    FILE* file = fopen(path, "wb");')
+    header_lines.append("    if (!file) {")
+    header_lines.append("        return false;")
+    header_lines.append("    }")
+    header_lines.append("    uint32_t version = _SOKOL_CSHARP_TRACE_VERSION;")
+    header_lines.append("    uint32_t num_hooks = _SOKOL_CSHARP_TRACE_NUM_HOOKS;")
+    header_lines.append("    fwrite(_SOKOL_CSHARP_TRACE_MAGIC, 1, 4, file);")
+    header_lines.append("    fwrite(&version, 1, 4, file);")
+    header_lines.append("    fwrite(&num_hooks, 1, 4, file);")
+    header_lines.append("    for (int i = 0; i < _SOKOL_CSHARP_TRACE_NUM_HOOKS; i++) {")
+    header_lines.append("        _sokol_csharp_trace_write_string(file, _sokol_csharp_trace_hook_names[i]);")
+    header_lines.append("        _sokol_csharp_trace_write_string(file, _sokol_csharp_trace_hook_args[i]);")
+    header_lines.append("    }")
+    header_lines.append("    _sokol_csharp_trace.file = file;")
+    header_lines.append("    _sokol_csharp_trace.replay = false;")
+    header_lines.append(f"    {struct_name} hooks;")
+    header_lines.append("    memset(&hooks, 0, sizeof(hooks));")
+    for hook in hooks:
+        header_lines.append(f"    hooks.{hook['name']} = _sokol_csharp_trace_{hook['name']};")
+    header_lines.append(f"    _sokol_csharp_trace_prev_hooks = {trace['install']}(&hooks);")
+    header_lines.append("    return true;")
+    header_lines.append("}")
+    header_lines.append("")
+    header_lines.append("// stops recording, re-installs the previous hooks and closes the capture file")
+    header_lines.append("SOKOL_API_IMPL void sokol_csharp_trace_end(void) {")
+    header_lines.append("    if (!_sokol_csharp_trace.file) {")
+    header_lines.append("        return;")
+    header_lines.append("    }")
+    header_lines.append(f"    {trace['install']}(&_sokol_csharp_trace_prev_hooks);")
+    header_lines.append("    fclose(_sokol_csharp_trace.file);")
+    header_lines.append("    free(_sokol_csharp_trace.buf);")
+    header_lines.append("    memset(&_sokol_csharp_trace, 0, sizeof(_sokol_csharp_trace));")
+    header_lines.append("}")
+    header_lines.append("")
+
+    # replaying
+    header_lines.append("static void _sokol_csharp_trace_replay_record(_sokol_csharp_trace_t* t, uint32_t hook) {")
+    header_lines.append("    bool is_null = false;")
+    header_lines.append("    switch (hook) {")
+    for hook_index, hook in enumerate(hooks):
+        replay = hook['replay']
+        if replay is None:
+            continue
+        header_lines.append(f"        case {hook_index}: {{")
+        call_args = []
+        for index in range(replay['num_args']):
+            arg_type = hook['args'][index]
+            kind = hook['kinds'][index]
+            arg = f"a{index}"
+            if kind == 'string':
+                header_lines.append(f"            const char* {arg} = 0;")
+                header_lines.append(f"            _sokol_csharp_trace_walk_string(t, &{arg});")
+                call_args.append(arg)
+            elif kind == 'struct_ptr':
+                struct_type = extract_ptr_type(arg_type)
+                header_lines.append(f"            {struct_type} {arg};")
+                header_lines.append(f"            if (!_sokol_csharp_trace_get_arg(t, &{arg}, sizeof({arg}), &is_null)) {{")
+                header_lines.append("                return;")
+                header_lines.append("            }")
+                header_lines.append(f"            bool {arg}_null = is_null;")
+                if struct_type in walkers:
+                    header_lines.append(f"            if (!{arg}_null) {{")
+                    header_lines.append(f"                _sokol_csharp_trace_walk_{struct_type}(t, &{arg});")
+                    header_lines.append("            }")
+                call_args.append(f"{arg}_null ? 0 : &{arg}")
+            else:
+                header_lines.append(f"            {arg_type} {arg};")
+                header_lines.append(f"            if (!_sokol_csharp_trace_get_arg(t, &{arg}, sizeof({arg}), &is_null) || is_null) {{")
+                header_lines.append("                return;")
+                header_lines.append("            }")
+                call_args.append(arg)
+        header_lines.append(f"            {replay['name']}({', '.join(call_args)});")
+        header_lines.append("            break;")
+        header_lines.append("        }")
+    header_lines.append("        default:")
+    header_lines.append("            // only recorded")
+    header_lines.append("            break;")
+    header_lines.append("    }")
+    header_lines.append("}")
+    header_lines.append("")
+    header_lines.append("static bool _sokol_csharp_trace_check_string(const uint8_t** pos, const uint8_t* end, const char* str) {")
+    header_lines.append("    uint16_t len;")
+    header_lines.append("    if (*pos + 2 > end) {")
+    header_lines.append("        return false;")
+    header_lines.append("    }")
+    header_lines.append("    memcpy(&len, *pos, 2);")
+    header_lines.append("    *pos += 2;")
+    header_lines.append("    if (*pos + len > end || len != strlen(str) || memcmp(*pos, str, len) != 0) {")
+    header_lines.append("        return false;")
+    header_lines.append("    }")
+    header_lines.append("    *pos += len;")
+    header_lines.append("    return true;")
+    header_lines.append("}")
+    header_lines.append("")
+    header_lines.append("// re-issues the calls of a capture: the frames before 'frame' once (creating the")
+    header_lines.append("// resources, the handles match if the capture was recorded right after setup),")
+    header_lines.append("// then frame 'frame' 'repeat' times, a frame ends with a commit call. Returns")
+    header_lines.append("// the number of committed frames in the capture, -1 if the capture is invalid")
+    header_lines.append("SOKOL_API_IMPL int sokol_csharp_trace_replay(const uint8_t* capture, uint32_t size, int frame, int repeat) {")
+    header_lines.append("    const uint8_t* pos = capture;")
+    header_lines.append("    const uint8_t* end = capture + size;")
+    header_lines.append("    uint32_t version, num_hooks;")
+    header_lines.append("    if (size < 12 || memcmp(pos, _SOKOL_CSHARP_TRACE_MAGIC, 4) != 0) {")
+    header_lines.append("        return -1;")
+    header_lines.append("    }")
+    header_lines.append("    memcpy(&version, pos + 4, 4);")
+    header_lines.append("    memcpy(&num_hooks, pos + 8, 4);")
+    header_lines.append("    pos += 12;")
+    header_lines.append("    if (version != _SOKOL_CSHARP_TRACE_VERSION || num_hooks != _SOKOL_CSHARP_TRACE_NUM_HOOKS) {")
+    header_lines.append("        return -1;")
+    header_lines.append("    }")
+    header_lines.append("    for (int i = 0; i < _SOKOL_CSHARP_TRACE_NUM_HOOKS; i++) {")
+    header_lines.append("        if (!_sokol_csharp_trace_check_string(&pos, end, _sokol_csharp_trace_hook_names[i]) ||")
+    header_lines.append("            !_sokol_csharp_trace_check_string(&pos, end, _sokol_csharp_trace_hook_args[i])) {")
+    header_lines.append("            return -1;")
+    header_lines.append("        }")
+    header_lines.append("    }")
+    header_lines.append("    // validate the records and find the benchmarked frame before issuing any call")
+    header_lines.append("    const uint8_t* records = pos;")
+    header_lines.append("    const uint8_t* frame_begin = end;")
+    header_lines.append("    const uint8_t* frame_end = end;")
+    header_lines.append("    int num_frames = 0;")
+    header_lines.append("    while (pos < end) {")
+    header_lines.append("        uint32_t hook, body;")
+    header_lines.append("        if (end - pos < 8) {")
+    header_lines.append("            return -1;")
+    header_lines.append("        }")
+    header_lines.append("        memcpy(&hook, pos, 4);")
+    header_lines.append("        memcpy(&body, pos + 4, 4);")
+    header_lines.append("        if (hook >= _SOKOL_CSHARP_TRACE_NUM_HOOKS || body > (size_t)(end - pos - 8)) {")
+    header_lines.append("            return -1;")
+    header_lines.append("        }")
+    header_lines.append("        if (num_frames == frame && frame_begin == end) {")
+    header_lines.append("            frame_begin = pos;")
+    header_lines.append("        }")
+    header_lines.append("        pos += 8 + body;")
+    header_lines.append("        if ((int)hook == _SOKOL_CSHARP_TRACE_COMMIT) {")
+    header_lines.append("            if (num_frames == frame) {")
+    header_lines.append("                frame_end = pos;")
+    header_lines.append("            }")
+    header_lines.append("            num_frames++;")
+    header_lines.append("        }")
+    header_lines.append("    }")
+    header_lines.append("    _sokol_csharp_trace_t t;")
+    header_lines.append("    memset(&t, 0, sizeof(t));")
+    header_lines.append("    t.replay = true;")
+    header_lines.append("    for (int pass = 0; pass < 1 + repeat; pass++) {")
+    header_lines.append("        // the frames before the benchmarked frame once, then the benchmarked frame")
+    header_lines.append("        const uint8_t* last = pass == 0 ? frame_begin : frame_end;")
+    header_lines.append("        for (pos = pass == 0 ? records : frame_begin; pos < last; ) {")
+    header_lines.append("            uint32_t hook, body;")
+    header_lines.append("            memcpy(&hook, pos, 4);")
+    header_lines.append("            memcpy(&body, pos + 4, 4);")
+    header_lines.append("            t.pos = pos + 8;")
+    header_lines.append("            t.end = t.pos + body;")
+    header_lines.append("            _sokol_csharp_trace_replay_record(&t, hook);")
+    header_lines.append("            pos = t.end;")
+    header_lines.append("        }")
+    header_lines.append("    }")
+    header_lines.append("    return num_frames;")
+    header_lines.append("}")
+    header_lines.append("")
+    header_lines.append("#endif // SOKOL_CSHARP_TRACE_H")
+    header_lines.append("")
+
+    return "\n".join(header_lines)
+
+def gen_trace_capture_csharp(trace):
+    """Generate the C# TraceCapture class over the natives of sokol_csharp_trace.h."""
+    lines = [
+        '// machine generated, do not edit',
+        'using System;',
+        'using System.Runtime.InteropServices;',
+        'using M = System.Runtime.InteropServices.MarshalAsAttribute;',
+        'using U = System.Runtime.InteropServices.UnmanagedType;',
+        '',
+        'namespace Sokol',
+        '{',
+        f"// Records all calls reported by {trace['struct']} into a binary capture file",
+        '// and replays captures natively, see bindgen/trace_capture.py to inspect them.',
+        '// Start recording right after setup, so that a replay in a fresh context',
+        '// (e.g. with the dummy backend) creates the same resource handles.',
+        'public static unsafe class TraceCapture',
+        '{',
+        '    public static bool Begin(string path) => sokol_csharp_trace_begin(path);',
+        '',
+        '    public static void End() => sokol_csharp_trace_end();',
+        '',
+        "    // replays the frames before 'frame' once and frame 'frame' 'repeat' times,",
+        '    // returns the number of frames in the capture, -1 if it is invalid',
+        '    public static int Replay(ReadOnlySpan<byte> capture, int frame, int repeat = 1)',
+        '    {',
+        '        fixed (byte* data = capture)',
+        '        {',
+        '            return sokol_csharp_trace_replay(data, (uint)capture.Length, frame, repeat);',
+        '        }',
+        '    }',
+        '',
+    ]
+    for res_type, func_name, args in [
+        ('bool', 'sokol_csharp_trace_begin', '[M(U.LPUTF8Str)] string path'),
+        ('void', 'sokol_csharp_trace_end', ''),
+        ('int', 'sokol_csharp_trace_replay', 'byte* capture, uint size, int frame, int repeat'),
+    ]:
+        lines.append('#if __IOS__')
+        lines.append(f'    [DllImport("@rpath/sokol.framework/sokol", EntryPoint = "{func_name}", CallingConvention = CallingConvention.Cdecl)]')
+        lines.append('#else')
+        lines.append(f'    [DllImport("sokol", EntryPoint = "{func_name}", CallingConvention = CallingConvention.Cdecl)]')
+        lines.append('#endif')
+        if res_type == 'bool':
+            lines.append('    [return: M(U.I1)]')
+        lines.append(f'    private static extern {res_type} {func_name}({args});')
+        lines.append('')
+    lines.pop()
+    lines.append('}')
+    lines.append('}')
+    return '\n'.join(lines) + '\n'
 
 def prepare():
     print('Generating C# bindings:')
 
-def gen(c_header_path, c_prefix, dep_c_prefixes):
-    global current_library_name
+def make_ir(c_header_path, c_prefix, dep_c_prefixes):
+    # clang front-end and IR extraction only, no global state is touched,
+    # so this can run in a worker process
     module_name = module_names[c_prefix]
     c_source_path = c_source_paths[c_prefix]
+    # the first dependency (usually sokol_gfx) is shared by the most modules
+    pch_source_path = c_source_paths.get(dep_c_prefixes[0]) if dep_c_prefixes else None
+    return gen_ir.gen(c_header_path, c_source_path, module_name, c_prefix, dep_c_prefixes, pch_source_path=pch_source_path)
+
+def gen_source(ir, c_prefix, dep_c_prefixes):
+    # C# emission only, returns the module source, the functions of the
+    # module returning structs by value (with and without wrapper), the
+    # shared declarations it uses and the fragment cache statistics (None
+    # without fragment cache), no global state is touched (the
+    # dependencies' declarations are read from gen_registry)
+    library_name = library_names.get(c_prefix, 'sokol')
+    modes = module_modes.get(c_prefix, ())
+    generator = ModuleGenerator(library_name, modes)
+    # the 'profile_shims' ids are numbered in emission order, so the
+    # fragments of such a module can't be reused independently
+    if gen_fragments.enabled and gen_cache.enabled and 'profile_shims' not in modes:
+        generator.fragments = gen_fragments.FragmentCache(ir['module'], [c_prefix, library_name, json.dumps(module_modes, sort_keys=True)])
+    with gen_profile.span('gen_csharp.gen_module', module=ir['module']):
+        generator.gen_module(ir, dep_c_prefixes)
+    stats = generator.fragments.stats() if generator.fragments is not None else None
+    return generator.output(), generator.struct_return_functions, generator.direct_struct_return_functions, generator.shared_decls, stats
+
+def gen_shared_source():
+    # the declarations used by more than one module, None if there are none
+    if not shared_decls:
+        return None
+    lines = [
+        '// machine generated, do not edit',
+        'using System;',
+        'using System.Diagnostics.CodeAnalysis;',
+        'using System.Runtime.CompilerServices;',
+        'using System.Runtime.InteropServices;',
+        '',
+        'namespace Sokol',
+        '{',
+    ]
+    usings = sorted(set(module for _, modules in shared_decls.values() for module in modules))
+    if usings:
+        lines[lines.index(''):lines.index('')] = [f'using static Sokol.{module};' for module in usings]
+    for name in sorted(shared_decls):
+        lines.append(shared_decls[name][0])
+    lines.append('}')
+    return '\n'.join(lines) + '\n'
+
+def gen(c_header_path, c_prefix, dep_c_prefixes, ir=None, source=None, outputs=None):
+    module_name = module_names[c_prefix]
     print(f'  {c_header_path} => {module_name} (lib: {library_names.get(c_prefix, "sokol")})')
-    reset_globals()
-    current_library_name = library_names.get(c_prefix, 'sokol')  # Set library name AFTER reset_globals
-    ir = gen_ir.gen(c_header_path, c_source_path, module_name, c_prefix, dep_c_prefixes)
-    gen_module(ir, dep_c_prefixes)
+    if ir is None:
+        ir = make_ir(c_header_path, c_prefix, dep_c_prefixes)
+    gen_registry.register(ir)
+    if source is None:
+        source = gen_source(ir, c_prefix, dep_c_prefixes)
+    source_text, struct_return_functions, direct_struct_return_functions, module_shared_decls, _ = source
+    for func_name, return_type in struct_return_functions.items():
+        print(f"  [AUTO-DETECTED] {func_name} returns struct {return_type}")
+    for func_name, return_type in direct_struct_return_functions.items():
+        print(f"  [ABI] {func_name} returns struct {return_type} in a register on wasm32, no wrapper needed")
+    web_wrapper_struct_return_functions.update(struct_return_functions)
+    web_direct_struct_return_functions.update(direct_struct_return_functions)
+    shared_decls.update(module_shared_decls)
     output_path = f"../src/sokol/generated/{ir['module']}.cs"
-    with open(output_path, 'w', newline='\n') as f_outp:
-        f_outp.write(out_lines)
-    return ir  # Return IR for header generation
\ No newline at end of file
+    if outputs is None:
+        gen_outputs.write_if_changed(output_path, source_text)
+    else:
+        outputs.add_ir(ir['module'], c_header_path, ir, f"native:{library_names.get(c_prefix, 'sokol')}")
+        outputs.write(output_path, source_text, csharp_target, [ir['module']])
+    return ir  # Return IR for header generation
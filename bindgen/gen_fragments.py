@@ -0,0 +1,242 @@
+#-------------------------------------------------------------------------------
+#   Per-declaration fragment cache for the C# emission.
+#
+#   The C# of each declaration of a module is cached as a fragment, along
+#   with the declaration it was emitted from and the names its types mention.
+#   The next run diffs the module's declarations and the struct and enum
+#   types it can see (including the dependencies') against the previous run,
+#   keyed by kind and name. A type counts as changed if its declaration
+#   differs, if it was added or removed, or if a type it mentions changed
+#   (see changed_types()). Only the declarations which differ or mention a
+#   changed type are emitted again, the module file is stitched together
+#   from the fragments (see ModuleGenerator.gen_decl_fragment()).
+#
+#   The previous run's declarations are compared as dicts, which is much
+#   cheaper than serializing and hashing them (and than emitting them).
+#
+#   Results the generator derives from a struct or enum type alone (like its
+#   wasm32 return classification or blittability, see type_results()) are
+#   kept with the type and reused as long as the type doesn't count as
+#   changed, so a run without changes doesn't lay out the structs again.
+#
+#   The fragments live in the IR cache directory (not subject to the cache
+#   eviction), per module an index and a data file with the fragment texts.
+#   The index is a log of JSON lines, a header followed by one line per run
+#   with the types and fragments which were added, changed or removed, the
+#   texts of new fragments are appended to the data file. Once most of the
+#   data file is unused (or the index is damaged) both are rewritten with
+#   only the last run's entries. The fragments are bypassed along with the
+#   IR cache (gen.py --no-cache). The emission settings and the generator's
+#   own source are hashed into a context, a different context discards all
+#   fragments.
+#-------------------------------------------------------------------------------
+import hashlib, json, os
+import gen_cache
+
+FRAGMENT_VERSION = 2
+
+enabled = True
+
+# the modules which determine the C# of a declaration
+generator_sources = ['gen_csharp.py', 'gen_abi.py', 'gen_util.py', 'gen_fragments.py']
+_generator_hash = None
+
+def generator_hash():
+    global _generator_hash
+    if _generator_hash is None:
+        directory = os.path.dirname(os.path.abspath(__file__))
+        _generator_hash = gen_cache.hash_bytes(''.join(f'{gen_cache.hash_file(os.path.join(directory, name))}\n' for name in generator_sources).encode())
+    return _generator_hash
+
+def fragment_path(module):
+    # the index, the data file is named in its header
+    return os.path.join(gen_cache.cache_dir, 'fragments', f'{module}.json')
+
+def decl_id(decl):
+    # kind and name, anonymous enums by their first item
+    if decl['kind'] == 'consts':
+        return f"consts {decl['items'][0]['name']}"
+    return f"{decl['kind']} {decl['name']}"
+
+class FragmentCache:
+    # the fragments of one module, 'context' is a list of strings with the
+    # module's emission settings
+    def __init__(self, module, context):
+        self.module = module
+        self.path = fragment_path(module)
+        h = hashlib.sha256(f'v{FRAGMENT_VERSION}\n{generator_hash()}\n{module}'.encode())
+        for item in context:
+            h.update(f'\n{item}'.encode())
+        self.context = h.hexdigest()
+        # the data file, its generation (increased by each rewrite) and
+        # content, and whether the index has to be rewritten
+        self.data_name = None
+        self.generation = 0
+        self.data = b''
+        self.rewrite = False
+        self.prev_types, self.prev_fragments = self.load()
+        # [decl, names, results] by type name, and [decl (None for types),
+        # names, [offset, length] in the data file (None if new), shared
+        # declarations] by decl_id() of this run, and the texts of the new
+        # fragments by decl_id()
+        self.types = {}
+        self.fragments = {}
+        self.texts = {}
+        self.changed = set()
+        self.reused = 0
+        self.emitted = 0
+
+    def load(self):
+        # the types and fragments of the last run, replayed from the index
+        try:
+            with open(self.path, 'rb') as f:
+                lines = f.read().split(b'\n')
+            header = json.loads(lines[0])
+        except (OSError, ValueError):
+            return {}, {}
+        if header.get('version') != FRAGMENT_VERSION or header.get('context') != self.context:
+            return {}, {}
+        try:
+            with open(os.path.join(os.path.dirname(self.path), header['data']), 'rb') as f:
+                self.data = f.read()
+        except OSError:
+            return {}, {}
+        self.data_name = header['data']
+        self.generation = header['generation']
+        types = {}
+        fragments = {}
+        # the last line is empty unless the last run's line was cut off
+        if lines[-1]:
+            self.rewrite = True
+        for line in lines[1:-1]:
+            try:
+                run = json.loads(line)
+            except ValueError:
+                self.rewrite = True
+                break
+            types.update(run['types'])
+            fragments.update(run['fragments'])
+            for name in run['removed_types']:
+                types.pop(name, None)
+            for name in run['removed_fragments']:
+                fragments.pop(name, None)
+        if any(fragment[2][0] + fragment[2][1] > len(self.data) for fragment in fragments.values()):
+            self.data_name = None
+            return {}, {}
+        return types, fragments
+
+    def changed_types(self, types, type_names):
+        # the names of the types which changed since the last run, 'types'
+        # are the struct and enum declarations by name, type_names(decl) the
+        # names (any identifier) the types of a declaration mention
+        names = {}
+        for name, decl in types.items():
+            prev = self.prev_types.get(name)
+            if prev is not None and prev[0] == decl:
+                names[name] = prev[1]
+                self.types[name] = [decl, names[name], dict(prev[2])]
+            else:
+                names[name] = type_names(decl)
+                self.types[name] = [decl, names[name], {}]
+                self.changed.add(name)
+        self.changed.update(name for name in self.prev_types if name not in types)
+        # and the types mentioning them, transitively
+        referrers = {}
+        for name, mentioned in names.items():
+            for ref in mentioned:
+                referrers.setdefault(ref, []).append(name)
+        pending = list(self.changed)
+        while pending:
+            for name in referrers.get(pending.pop(), ()):
+                if name not in self.changed:
+                    self.changed.add(name)
+                    self.types[name][2] = {}
+                    pending.append(name)
+        return self.changed
+
+    def type_results(self, name):
+        # the dict with the results derived from a type (empty if the type
+        # changed), the generator adds the ones it computes, None for
+        # unknown types
+        entry = self.types.get(name)
+        return None if entry is None else entry[2]
+
+    def lookup(self, decl):
+        # (text, shared declarations) if neither the declaration nor the
+        # types it mentions changed, else None
+        fragment = self.prev_fragments.get(decl_id(decl))
+        if fragment is None or (fragment[0] is not None and fragment[0] != decl) or not self.changed.isdisjoint(fragment[1]):
+            return None
+        self.reused += 1
+        self.fragments[decl_id(decl)] = fragment
+        _, _, (offset, length), shared_decls = fragment
+        text = self.data[offset:offset + length].decode()
+        return text, { name: (source, tuple(modules)) for name, (source, modules) in shared_decls.items() }
+
+    def store(self, decl, names, text, shared_decls):
+        # struct and enum declarations are already in self.types, their
+        # changes are tracked by changed_types()
+        self.emitted += 1
+        if decl['kind'] in ('struct', 'enum'):
+            self.fragments[decl_id(decl)] = [None, [decl['name']], None, shared_decls]
+        else:
+            self.fragments[decl_id(decl)] = [decl, names, None, shared_decls]
+        self.texts[decl_id(decl)] = text
+        return text, shared_decls
+
+    def stats(self):
+        return { 'reused': self.reused, 'emitted': self.emitted }
+
+    def save(self):
+        # appends this run's changes to the index and the new texts to the
+        # data file, both are rewritten if most of the data is unused
+        types = { name: entry for name, entry in self.types.items() if name in self.changed or entry[2] != self.prev_types[name][2] }
+        removed_types = [name for name in self.prev_types if name not in self.types]
+        removed_fragments = [name for name in self.prev_fragments if name not in self.fragments]
+        if not types and not removed_types and not removed_fragments and not self.texts and not self.rewrite:
+            return
+        texts = { name: text.encode() for name, text in self.texts.items() }
+        used = sum(fragment[2][1] for fragment in self.fragments.values() if fragment[2] is not None) + sum(len(text) for text in texts.values())
+        directory = os.path.dirname(self.path)
+        os.makedirs(directory, exist_ok=True)
+        if self.rewrite or self.data_name is None or len(self.data) + sum(len(text) for text in texts.values()) > 2 * used:
+            self.save_all(directory, texts)
+            return
+        with open(os.path.join(directory, self.data_name), 'ab') as f:
+            # a run which died after writing texts leaves unused bytes
+            offset = f.seek(0, os.SEEK_END)
+            for name, text in texts.items():
+                f.write(text)
+                self.fragments[name][2] = [offset, len(text)]
+                offset += len(text)
+        fragments = { name: self.fragments[name] for name in texts }
+        line = json.dumps({ 'types': types, 'removed_types': removed_types, 'fragments': fragments, 'removed_fragments': removed_fragments })
+        with open(self.path, 'ab') as f:
+            f.write(f'{line}\n'.encode())
+
+    def save_all(self, directory, texts):
+        # a new data file with only the used texts and an index with a single
+        # run, the index refers to the new data file once it was replaced
+        data = []
+        offset = 0
+        for name, fragment in self.fragments.items():
+            if name in texts:
+                text = texts[name]
+            else:
+                text = self.data[fragment[2][0]:fragment[2][0] + fragment[2][1]]
+            fragment[2] = [offset, len(text)]
+            data.append(text)
+            offset += len(text)
+        generation = self.generation + 1
+        data_name = f'{self.module}.{generation}.frag'
+        gen_cache.write_atomic(os.path.join(directory, data_name), b''.join(data))
+        header = json.dumps({ 'version': FRAGMENT_VERSION, 'context': self.context, 'data': data_name, 'generation': generation })
+        line = json.dumps({ 'types': self.types, 'removed_types': [], 'fragments': self.fragments, 'removed_fragments': [] })
+        gen_cache.write_atomic(self.path, f'{header}\n{line}\n'.encode())
+        # including the ones of other contexts
+        for name in os.listdir(directory):
+            if name != data_name and name.startswith(f'{self.module}.') and name.endswith('.frag') and name[len(self.module) + 1:-len('.frag')].isdigit():
+                try:
+                    os.remove(os.path.join(directory, name))
+                except OSError:
+                    pass
@@ -1,7 +1,31 @@
 #-------------------------------------------------------------------------------
 #   Generate an intermediate representation of a clang AST dump.
 #-------------------------------------------------------------------------------
-import re, json, sys, subprocess , os
+import re, json, sys, subprocess , os, tempfile, io, codecs, contextlib, atexit, shutil
+import gen_cache, gen_irfile, gen_outputs, gen_profile
+
+try:
+    import clang.cindex as cindex
+except ImportError:
+    cindex = None       # only needed for the libclang front-end (pip install libclang)
+
+# use clang's -ast-dump-filter to only dump the declarations of interest
+# instead of the whole translation unit (see clang_filtered())
+ast_filter = False
+
+# 'json' runs the clang binary and decodes its JSON AST dump, 'libclang'
+# parses in-process with the libclang Python bindings (see libclang_parse())
+frontend = 'json'
+frontends = ['json', 'libclang']
+
+# gen() writes each module's IR to ir_dir as a binary .ir file (see
+# gen_irfile.py), and also as JSON for debugging if json_export is set
+ir_dir = 'ir'
+json_export = False
+
+# the files the translation unit of each module depends on (absolute paths,
+# from clang's dependency output or the IR cache entry), recorded by gen()
+module_deps = {}
 
 def is_api_decl(decl, prefix):
     if 'name' in decl:
@@ -20,6 +44,9 @@ def strip_comments(items):
     return [i for i in items if i['kind'] != 'FullComment']
 
 def extract_comment(comment, source):
+    if 'text' in comment:
+        # from the libclang front-end
+        return comment['text'].rstrip()
     return source[comment['range']['begin']['offset']:comment['range']['end']['offset']+1].rstrip()
 
 def is_dep_decl(decl, dep_prefixes):
@@ -28,12 +55,6 @@ def is_dep_decl(decl, dep_prefixes):
             return True
     return False
 
-def dep_prefix(decl, dep_prefixes):
-    for prefix in dep_prefixes:
-        if is_api_decl(decl, prefix):
-            return prefix
-    return None
-
 def filter_types(str):
     return str.replace('_Bool', 'bool')
 
@@ -151,8 +172,7 @@ def parse_decl(decl, source):
 #         cmd.append('-fparse-all-comments')
 #     return subprocess.check_output(cmd)
 
-def clang(csrc_path, with_comments=False):
-    import os
+def clang_cmd(csrc_path, with_comments=False):
     ext = os.path.splitext(csrc_path)[1]
     if ext == '.cpp':
         compiler = "clang++"
@@ -167,12 +187,522 @@ def clang(csrc_path, with_comments=False):
     cmd += ['-I..', '-Xclang', '-ast-dump=json', "-c", csrc_path]
     if with_comments:
         cmd.append('-fparse-all-comments')
+    return cmd
+
+def clang(csrc_path, with_comments=False, dep_file=None):
+    cmd = clang_cmd(csrc_path, with_comments)
+    if dep_file is not None:
+        # also write the list of included files (used by the IR cache)
+        cmd += ['-MD', '-MF', dep_file]
     return subprocess.check_output(cmd)
 
+@contextlib.contextmanager
+def clang_stream(csrc_path, with_comments=False, dep_file=None):
+    # same as clang(), but yields clang's stdout as a stream instead of
+    # buffering the whole (possibly hundreds of MB) AST dump in memory
+    cmd = clang_cmd(csrc_path, with_comments)
+    if dep_file is not None:
+        cmd += ['-MD', '-MF', dep_file]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE)
+    try:
+        yield proc.stdout
+    except BaseException:
+        proc.kill()
+        raise
+    finally:
+        proc.stdout.close()
+        retcode = proc.wait()
+    if retcode != 0:
+        raise subprocess.CalledProcessError(retcode, cmd)
+
+def ast_filters(header_path, main_prefix):
+    # -ast-dump-filter matches a substring of each declaration's qualified
+    # name. Anonymous declarations are named like '(anonymous enum at
+    # ../ext/sokol/sokol_gfx.h:1234:1)', which the last filter uses to pick
+    # up the anonymous enums and structs of the target header only.
+    # Dependency declarations come from gen_registry, not from the dump.
+    return [main_prefix, f'{os.path.basename(header_path)}:']
+
+def clang_filtered(csrc_path, filters, with_comments=False, dep_file=None):
+    # clang only takes one -ast-dump-filter per invocation, so run one clang
+    # per filter (concurrently) and return their outputs in filter order
+    procs = []
+    for i, filter in enumerate(filters):
+        cmd = clang_cmd(csrc_path, with_comments) + ['-Xclang', '-ast-dump-filter', '-Xclang', filter]
+        if i == 0 and dep_file is not None:
+            cmd += ['-MD', '-MF', dep_file]
+        procs.append((cmd, subprocess.Popen(cmd, stdout=subprocess.PIPE)))
+    outputs = []
+    for cmd, proc in procs:
+        output, _ = proc.communicate()
+        if proc.returncode != 0:
+            raise subprocess.CalledProcessError(proc.returncode, cmd)
+        outputs.append(output)
+    return outputs
+
+# Clang pretty-prints its JSON AST dump with a 2-space indent, so the items of
+# the top-level 'inner' array open with '{' at column 4, close with '}' at
+# column 4, and their own keys sit at column 6. JSON strings can't contain raw
+# newlines, so these markers can be used to cut out one top-level declaration
+# at a time, and to peek at its kind and name before deciding to decode it.
+re_ast_inner_start = re.compile(r'\n  "inner": \[')
+re_ast_item_start = re.compile(r'[\s,]*')
+re_ast_item_kind = re.compile(r'\n      "kind": "(\w+)"')
+re_ast_item_name = re.compile(r'\n      "name": "([^"]*)"')
+ast_item_end = '\n    }'
+
+def iter_ast_items(stream, chunk_size=1 << 20):
+    """
+    Incrementally split a clang JSON AST dump into its top-level declarations,
+    yielded as (kind, name, text, decl) tuples. Normally only the raw JSON
+    text is returned and decl is None, decoding is up to the caller.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    buf = ''
+    pos = 0
+    eof = False
+
+    def fill():
+        # the unconsumed rest of buf is copied on each refill, reading at
+        # least as much as is left keeps that linear for items (or a header)
+        # spanning many chunks, the buffer at least doubles in size then
+        nonlocal buf, pos, eof
+        with gen_profile.stage('clang'):
+            # time spent waiting for clang's output
+            data = stream.read(max(chunk_size, len(buf) - pos))
+        eof = not data
+        buf = buf[pos:] + decoder.decode(data, final=eof)
+        pos = 0
+
+    search_pos = 0
+    while True:
+        match = re_ast_inner_start.search(buf, search_pos)
+        if match or eof:
+            break
+        search_pos = max(0, len(buf) - len('\n  "inner": ['))
+        fill()
+    if match is None:
+        # not the expected formatting, fall back to decoding everything
+        with gen_profile.stage('json decode'):
+            ast = json.loads(buf)
+        for decl in ast.get('inner', []):
+            yield decl['kind'], decl.get('name'), None, decl
+        return
+    pos = match.end()
+    while True:
+        pos = re_ast_item_start.match(buf, pos).end()
+        if pos == len(buf):
+            if eof:
+                sys.exit("ERROR: unexpected end of clang AST dump")
+            fill()
+            continue
+        if buf[pos] == ']':
+            return
+        search_pos = pos
+        while True:
+            end = buf.find(ast_item_end, search_pos)
+            if end >= 0:
+                break
+            if eof:
+                sys.exit("ERROR: unexpected end of clang AST dump")
+            # don't rescan what was already searched after refilling
+            search_pos = max(0, len(buf) - pos - len(ast_item_end))
+            fill()
+        end += len(ast_item_end)
+        text = buf[pos:end]
+        kind = re_ast_item_kind.search(text)
+        name = re_ast_item_name.search(text)
+        if kind is None:
+            with gen_profile.stage('json decode'):
+                decl = json.loads(text)
+            yield decl['kind'], decl.get('name'), text, decl
+        else:
+            yield kind.group(1), name.group(1) if name else None, text, None
+        pos = end
+
+def iter_api_decls(items, main_prefix):
+    """
+    Filter the top-level declarations down to the ones that can end up in the
+    IR, decoding only those. Anonymous RecordDecls directly followed by a
+    TypedefDecl of the main prefix are merged into a named RecordDecl
+    (the 'typedef struct { ... } prefix_bla_t;' pattern). Declarations of
+    the dependencies are skipped, see gen_registry.
+    """
+    pending_record = None
+    for kind, name, text, decl in items:
+        if pending_record is not None:
+            merged_decl = None
+            if kind == 'TypedefDecl' and name and name.startswith(main_prefix):
+                with gen_profile.stage('merge'):
+                    record = pending_record if isinstance(pending_record, dict) else json.loads(pending_record)
+                    if 'inner' in record and len(record['inner']) > 0:
+                        # This is a typedef struct pattern, merge them
+                        merged_decl = record.copy()
+                        merged_decl['name'] = name  # Use the typedef name
+            pending_record = None
+            if merged_decl is not None:
+                yield merged_decl
+                continue
+        if kind == 'RecordDecl' and not name:
+            # anonymous, only of interest if a typedef follows
+            pending_record = text if decl is None else decl
+        elif (name and name.startswith(main_prefix)) or (not name and kind == 'EnumDecl'):
+            if decl is None:
+                with gen_profile.stage('json decode'):
+                    decl = json.loads(text)
+            yield decl
+
+# a filtered dump is a sequence of top-level JSON objects (one per matching
+# declaration, possibly each preceded by a 'Dumping name:' line)
+re_filtered_ast_item = re.compile(r'^\{$.*?^\}$', re.M | re.S)
+
+# declarations which can never be top-level in C, but show up in a filtered
+# dump when their parent didn't match the filter but they did
+nested_decl_kinds = { 'FieldDecl', 'IndirectFieldDecl', 'EnumConstantDecl', 'ParmVarDecl' }
+
+def iter_filtered_ast_items(ast, seen_ids):
+    for match in re_filtered_ast_item.finditer(ast.decode('utf-8')):
+        with gen_profile.stage('json decode'):
+            decl = json.loads(match.group(0))
+        if decl['kind'] in nested_decl_kinds or decl.get('id') in seen_ids:
+            continue
+        seen_ids.add(decl.get('id'))
+        yield decl
+
+def decl_offset(decl):
+    loc = decl.get('loc', {})
+    return loc.get('offset', loc.get('expansionLoc', {}).get('offset'))
+
+def merge_filtered_items(asts):
+    """
+    Stitch the outputs of clang_filtered() back into the order of a full
+    AST dump: the main prefix declarations with the anonymous declarations
+    of the target header merged in by source offset.
+    """
+    seen_ids = set()
+    main_decls = list(iter_filtered_ast_items(asts[0], seen_ids))
+    anon_decls = [decl for decl in iter_filtered_ast_items(asts[1], seen_ids) if 'name' not in decl]
+    merged = []
+    i = 0
+    with gen_profile.stage('merge'):
+        for decl in main_decls:
+            offset = decl_offset(decl)
+            while i < len(anon_decls) and offset is not None and (decl_offset(anon_decls[i]) or 0) < offset:
+                merged.append(anon_decls[i])
+                i += 1
+            merged.append(decl)
+        merged += anon_decls[i:]
+    for decl in merged:
+        yield decl['kind'], decl.get('name'), None, decl
+
+# libclang front-end: parses the translation units in-process and converts the
+# top-level cursors into the same declaration dicts as clang's JSON AST dump
+# (only the parts parse_decl() looks at), so both front-ends share the IR
+# extraction. The index lives as long as the process, and a dependency's
+# source (e.g. sokol_gfx.c for every module depending on 'sg_') is parsed
+# only once into a precompiled header which its dependents include.
+libclang_index = None
+libclang_pchs = {}      # dependency source path => (PCH path, included files)
+libclang_pch_dir = None
+
+# clang's AST node names for the cursor kinds which differ from the
+# CamelCase of the cursor kind name (see libclang_kind())
+libclang_kinds = {
+    'STRUCT_DECL': 'RecordDecl',
+    'UNION_DECL': 'RecordDecl',
+    'PARM_DECL': 'ParmVarDecl',
+    'UNEXPOSED_EXPR': 'ImplicitCastExpr',
+}
+
+def libclang_kind(cursor):
+    name = cursor.kind.name
+    kind = libclang_kinds.get(name)
+    if kind is None:
+        # FIELD_DECL => FieldDecl, INTEGER_LITERAL => IntegerLiteral
+        kind = libclang_kinds[name] = ''.join(part.capitalize() for part in name.split('_'))
+    return kind
+
+def libclang_name(cursor, kind):
+    spelling = cursor.spelling
+    if kind in ('RecordDecl', 'EnumDecl'):
+        # libclang names 'typedef struct { ... } bla_t;' after the typedef,
+        # the JSON dump leaves it anonymous like the declaration is written
+        if cursor.is_anonymous():
+            return None
+        if cursor.type.spelling == spelling and cursor.location.offset == cursor.extent.start.offset:
+            return None
+    return spelling or None
+
+libclang_resource_dir = None
+
+def find_resource_dir():
+    # the Python bindings' libclang may come without the builtin headers
+    # (stddef.h, ...), use the ones of the installed clang if there is one
+    global libclang_resource_dir
+    if libclang_resource_dir is None:
+        libclang_resource_dir = ''
+        if shutil.which('clang'):
+            try:
+                libclang_resource_dir = subprocess.check_output(['clang', '-print-resource-dir']).decode().strip()
+            except (OSError, subprocess.CalledProcessError):
+                pass
+    return libclang_resource_dir
 
-def gen(header_path, source_path, module, main_prefix, dep_prefixes, with_comments=False):
-    ast = clang(source_path, with_comments=with_comments)
-    inp = json.loads(ast)
+def libclang_args(source_path, with_comments):
+    # the same language and include path as clang_cmd()
+    if os.path.splitext(source_path)[1] == '.cpp':
+        args = ['-x', 'c++', '-std=c++17']
+    else:
+        args = ['-x', 'c']
+    args.append('-I..')
+    if find_resource_dir():
+        args += ['-resource-dir', find_resource_dir()]
+    if with_comments:
+        args.append('-fparse-all-comments')
+    return args
+
+def libclang_identity():
+    # the library's path, size and mtime stand in for 'clang --version'
+    path = os.path.realpath(cindex.conf.get_filename())
+    try:
+        st = os.stat(path)
+        return f'libclang:{path}:{st.st_size}:{st.st_mtime_ns}'
+    except OSError:
+        return f'libclang:{path}'
+
+def libclang_parse(source_path, args, check=True):
+    # returns None on errors if check is False
+    global libclang_index
+    if libclang_index is None:
+        libclang_index = cindex.Index.create()
+    tu = libclang_index.parse(source_path, args=args)
+    errors = [diag for diag in tu.diagnostics if diag.severity >= cindex.Diagnostic.Error]
+    if errors:
+        if not check:
+            return None
+        sys.exit(f"ERROR: libclang failed to parse {source_path}:\n" + '\n'.join(f'  {diag.location.file}:{diag.location.line}: {diag.spelling}' for diag in errors))
+    return tu
+
+def libclang_includes(tu):
+    return [os.path.abspath(inclusion.include.name) for inclusion in tu.get_includes()]
+
+def libclang_pch(source_path, args):
+    # precompiled header of a dependency's source, built once per process
+    global libclang_pch_dir
+    if source_path not in libclang_pchs:
+        if libclang_pch_dir is None:
+            libclang_pch_dir = tempfile.mkdtemp(prefix='bindgen-pch-')
+            atexit.register(shutil.rmtree, libclang_pch_dir, True)
+        pch_path = os.path.join(libclang_pch_dir, f'{len(libclang_pchs)}.pch')
+        # args start with the language ('-x c'), parse it as a header
+        tu = libclang_parse(source_path, ['-x', args[1] + '-header'] + args[2:])
+        tu.save(pch_path)
+        libclang_pchs[source_path] = (pch_path, [os.path.abspath(source_path)] + libclang_includes(tu))
+    return libclang_pchs[source_path]
+
+def libclang_field(cursor):
+    outp = { 'kind': 'FieldDecl', 'type': { 'qualType': cursor.type.spelling } }
+    if cursor.spelling:
+        outp['name'] = cursor.spelling
+    return outp
+
+def libclang_indirect_fields(record):
+    # the fields of an anonymous struct/union member, which clang adds to the
+    # enclosing record as IndirectFieldDecls
+    outp = []
+    for cursor in record.get_children():
+        if cursor.kind.name == 'FIELD_DECL':
+            outp.append({ 'kind': 'IndirectFieldDecl', 'name': cursor.spelling })
+        elif cursor.kind.name in ('STRUCT_DECL', 'UNION_DECL') and cursor.is_anonymous():
+            outp += libclang_indirect_fields(cursor)
+    return outp
+
+def libclang_record_inner(cursor):
+    children = [child for child in cursor.get_children() if not child.kind.is_reference()]
+    # records which aren't the type of a field are anonymous members
+    field_records = set()
+    for child in children:
+        if child.kind.name == 'FIELD_DECL':
+            field_type = child.type
+            while field_type.get_array_element_type().kind.name != 'INVALID':
+                field_type = field_type.get_array_element_type()
+            field_records.add(field_type.get_declaration().hash)
+    inner = []
+    for child in children:
+        kind = libclang_kind(child)
+        if kind == 'FieldDecl':
+            inner.append(libclang_field(child))
+        elif kind == 'RecordDecl':
+            inner.append({ 'kind': kind })
+            if child.is_anonymous() and child.hash not in field_records:
+                # the implicit unnamed field clang declares for anonymous members
+                keyword = 'union' if child.kind.name == 'UNION_DECL' else 'struct'
+                loc = child.location
+                inner.append({ 'kind': 'FieldDecl', 'type': { 'qualType': f'{keyword} (anonymous {keyword} at {loc.file.name}:{loc.line}:{loc.column})' } })
+                inner += libclang_indirect_fields(child)
+        else:
+            inner.append({ 'kind': kind })
+    return inner
+
+def libclang_enum_inner(cursor):
+    inner = []
+    for child in cursor.get_children():
+        kind = libclang_kind(child)
+        if kind != 'EnumConstantDecl':
+            inner.append({ 'kind': kind })
+            continue
+        item = { 'kind': kind, 'name': child.spelling }
+        exprs = [expr for expr in child.get_children() if not expr.kind.is_reference()]
+        if exprs:
+            expr = { 'kind': libclang_kind(exprs[0]) }
+            if expr['kind'] == 'IntegerLiteral':
+                expr['value'] = str(child.enum_value)
+            item['inner'] = [{ 'kind': 'ConstantExpr', 'valueCategory': 'prvalue', 'inner': [expr] }]
+        inner.append(item)
+    return inner
+
+def libclang_func_inner(cursor):
+    inner = []
+    for child in cursor.get_children():
+        if child.kind.is_reference():
+            continue
+        kind = libclang_kind(child)
+        if kind == 'ParmVarDecl':
+            param = { 'kind': kind, 'type': { 'qualType': child.type.spelling } }
+            if child.spelling:
+                param['name'] = child.spelling
+            inner.append(param)
+        else:
+            inner.append({ 'kind': kind })
+    return inner
+
+def libclang_decl(cursor, kind, name, with_comments):
+    decl = { 'kind': kind }
+    if name:
+        decl['name'] = name
+    inner = None
+    if kind == 'RecordDecl':
+        if cursor.is_definition():
+            inner = libclang_record_inner(cursor)
+    elif kind == 'EnumDecl':
+        inner = libclang_enum_inner(cursor)
+    elif kind == 'FunctionDecl':
+        decl['type'] = { 'qualType': cursor.type.spelling }
+        inner = libclang_func_inner(cursor)
+    if with_comments and cursor.raw_comment:
+        inner = [{ 'kind': 'FullComment', 'text': cursor.raw_comment }] + (inner or [])
+    if inner:
+        decl['inner'] = inner
+    return decl
+
+def iter_libclang_items(tu, main_prefix, with_comments):
+    # only the declarations iter_api_decls() may use are converted
+    for cursor in tu.cursor.get_children():
+        kind = libclang_kind(cursor)
+        name = libclang_name(cursor, kind)
+        if (name and name.startswith(main_prefix)) or (not name and kind in ('RecordDecl', 'EnumDecl')):
+            with gen_profile.stage('libclang'):
+                decl = libclang_decl(cursor, kind, name, with_comments)
+        else:
+            decl = { 'kind': kind, 'name': name }
+        yield kind, name, None, decl
+
+def libclang_gen(source_path, pch_source_path, header_path, module, main_prefix, dep_prefixes, with_comments):
+    # returns the IR and the files the translation unit depends on
+    args = libclang_args(source_path, with_comments)
+    deps = [os.path.abspath(source_path)]
+    tu = None
+    if pch_source_path is not None and libclang_args(pch_source_path, with_comments) == args:
+        pch_path, pch_deps = libclang_pch(pch_source_path, args)
+        tu = libclang_parse(source_path, args + ['-include-pch', pch_path], check=False)
+        if tu is None:
+            # e.g. the dependency's header has no include guard
+            print(f"  >> warning: can't use the precompiled {pch_source_path} for {source_path}, parsing it in full")
+        else:
+            deps += pch_deps
+    if tu is None:
+        tu = libclang_parse(source_path, args)
+    deps += libclang_includes(tu)
+    outp = gen_from_items(iter_libclang_items(tu, main_prefix, with_comments), header_path, module, main_prefix, dep_prefixes)
+    return outp, sorted(set(deps))
+
+def gen(header_path, source_path, module, main_prefix, dep_prefixes, with_comments=False, pch_source_path=None):
+    # pch_source_path: source of a dependency, which the libclang front-end
+    # precompiles once and shares between all modules depending on it
+    if frontend == 'libclang':
+        return gen_libclang(header_path, source_path, module, main_prefix, dep_prefixes, with_comments, pch_source_path)
+    with gen_profile.span('gen_ir.gen', module=module):
+        cache_key = None
+        if gen_cache.enabled:
+            cache_key = gen_cache.make_key(clang_cmd(source_path, with_comments), [
+                os.getcwd(), os.path.abspath(header_path), module, main_prefix, ','.join(dep_prefixes),
+                gen_cache.hash_file(__file__), ast_filter])
+            with gen_profile.span('cache lookup', module=module):
+                entry = gen_cache.lookup_entry(cache_key)
+            if entry is not None:
+                module_deps[module] = sorted({ os.path.abspath(path) for path in entry['deps'] })
+                write_ir(module, entry['ir'])
+                return entry['ir']
+        fd, dep_file = tempfile.mkstemp(suffix='.d')
+        os.close(fd)
+        try:
+            if ast_filter:
+                with gen_profile.span('clang', module=module):
+                    asts = clang_filtered(source_path, ast_filters(header_path, main_prefix), with_comments=with_comments, dep_file=dep_file)
+                outp = gen_from_filtered_asts(asts, header_path, module, main_prefix, dep_prefixes)
+            else:
+                with clang_stream(source_path, with_comments=with_comments, dep_file=dep_file) as stream:
+                    outp = gen_from_ast_stream(stream, header_path, module, main_prefix, dep_prefixes)
+            deps = gen_cache.parse_dep_file(dep_file)
+            module_deps[module] = sorted({ os.path.abspath(path) for path in deps + [header_path] })
+            if cache_key is not None and deps:
+                gen_cache.store(cache_key, deps + [os.path.abspath(header_path)], outp)
+        finally:
+            os.remove(dep_file)
+        gen_profile.flush_stages(module=module)
+        write_ir(module, outp)
+        return outp
+
+def gen_libclang(header_path, source_path, module, main_prefix, dep_prefixes, with_comments, pch_source_path):
+    if cindex is None:
+        sys.exit("ERROR: the libclang front-end needs the libclang Python bindings (pip install libclang)")
+    with gen_profile.span('gen_ir.gen', module=module):
+        cache_key = None
+        if gen_cache.enabled:
+            cache_key = gen_cache.make_key(['libclang'] + libclang_args(source_path, with_comments), [
+                os.getcwd(), os.path.abspath(header_path), module, main_prefix, ','.join(dep_prefixes),
+                gen_cache.hash_file(__file__), libclang_identity(), pch_source_path])
+            with gen_profile.span('cache lookup', module=module):
+                entry = gen_cache.lookup_entry(cache_key)
+            if entry is not None:
+                module_deps[module] = sorted({ os.path.abspath(path) for path in entry['deps'] })
+                write_ir(module, entry['ir'])
+                return entry['ir']
+        with gen_profile.span('libclang', module=module):
+            outp, deps = libclang_gen(source_path, pch_source_path, header_path, module, main_prefix, dep_prefixes, with_comments)
+        module_deps[module] = sorted({ os.path.abspath(path) for path in deps + [header_path] })
+        if cache_key is not None:
+            gen_cache.store(cache_key, deps + [os.path.abspath(header_path)], outp)
+        gen_profile.flush_stages(module=module)
+        write_ir(module, outp)
+        return outp
+
+def write_ir(module, outp):
+    with gen_profile.span('write ir', module=module):
+        gen_irfile.write(os.path.join(ir_dir, f'{module}.ir'), outp)
+        if json_export:
+            gen_outputs.write_if_changed(os.path.join(ir_dir, f'{module}.json'), json.dumps(outp, indent=2))
+
+def gen_from_ast(ast, header_path, module, main_prefix, dep_prefixes):
+    return gen_from_ast_stream(io.BytesIO(ast), header_path, module, main_prefix, dep_prefixes)
+
+def gen_from_ast_stream(stream, header_path, module, main_prefix, dep_prefixes):
+    return gen_from_items(iter_ast_items(stream), header_path, module, main_prefix, dep_prefixes)
+
+def gen_from_filtered_asts(asts, header_path, module, main_prefix, dep_prefixes):
+    return gen_from_items(merge_filtered_items(asts), header_path, module, main_prefix, dep_prefixes)
+
+def gen_from_items(items, header_path, module, main_prefix, dep_prefixes):
     outp = {}
     outp['module'] = module
     outp['prefix'] = main_prefix
@@ -182,8 +712,6 @@ def gen(header_path, source_path, module, main_prefix, dep_prefixes, with_commen
     # for comments are off)
     # NOTE: that same problem might exist for non-ASCII characters,
     # so don't use those in header files!
-    with open(header_path, mode='r', newline='') as f:
-        source = f.read()
     with open(header_path, mode='r', newline='') as f:
         source = f.read()
         match = re.search(r"/\*(.*?)\*/", source, re.S)
@@ -191,42 +719,14 @@ def gen(header_path, source_path, module, main_prefix, dep_prefixes, with_commen
             first_comment = match.group(1)
             if first_comment and "Project URL" in first_comment:
                 outp['comment'] = first_comment
-        # Pre-process to find anonymous RecordDecls that should be associated with TypedefDecls
-        decls_to_process = []
-        i = 0
-        while i < len(inp['inner']):
-            decl = inp['inner'][i]
-            
-            # Check if this is an anonymous RecordDecl followed by a TypedefDecl
-            if (decl.get('kind') == 'RecordDecl' and 
-                not decl.get('name') and  # anonymous
-                'inner' in decl and len(decl['inner']) > 0 and  # has fields
-                i + 1 < len(inp['inner'])):
-                
-                next_decl = inp['inner'][i + 1]
-                if (next_decl.get('kind') == 'TypedefDecl' and 
-                    next_decl.get('name') and
-                    next_decl.get('name').startswith(main_prefix)):
-                    
-                    # This is a typedef struct pattern, merge them
-                    merged_decl = decl.copy()
-                    merged_decl['name'] = next_decl['name']  # Use the typedef name
-                    decls_to_process.append(merged_decl)
-                    i += 2  # Skip both the RecordDecl and TypedefDecl
-                    continue
-            
-            decls_to_process.append(decl)
-            i += 1
-        
-        # Now process the merged declarations
-        for decl in decls_to_process:
-            is_dep = is_dep_decl(decl, dep_prefixes)
-            if is_api_decl(decl, main_prefix) or is_dep:
+    # only the module's own declarations, the dependencies' declarations are
+    # resolved from gen_registry when generating the bindings
+    for decl in iter_api_decls(items, main_prefix):
+        if is_api_decl(decl, main_prefix) and not is_dep_decl(decl, dep_prefixes):
+            with gen_profile.stage('parse_decl'):
                 outp_decl = parse_decl(decl, source)
-                if outp_decl is not None:
-                    outp_decl['is_dep'] = is_dep
-                    outp_decl['dep_prefix'] = dep_prefix(decl, dep_prefixes)
-                    outp['decls'].append(outp_decl)
-    with open(f'{module}.json', 'w') as f:
-        f.write(json.dumps(outp, indent=2));
+            if outp_decl is not None:
+                outp_decl['is_dep'] = False
+                outp_decl['dep_prefix'] = None
+                outp['decls'].append(outp_decl)
     return outp
@@ -0,0 +1,296 @@
+#-------------------------------------------------------------------------------
+#   Compact binary IR files, the persistent form of the IR produced by gen_ir.py.
+#
+#   python3 gen_irfile.py FILE.ir [--decl NAME ...] [--json]
+#
+#   Prints a summary of the IR, --decl the given declarations and --json the
+#   whole IR as JSON (the same as gen.py --ir-json writes). The format
+#   (little-endian, string references are string table indices, 0xffffffff
+#   for none):
+#
+#       header      'SKIR', u16 version, u16 0, u32 number of strings, u32
+#                   string table offset, u32 number of declarations, u32
+#                   index offset
+#       module      module, prefix, comment, u32 number of dependencies,
+#                   dependency prefixes (string references)
+#       index       per declaration: u32 record offset, u8 kind, u8 flags
+#                   (1: is_dep), u16 0, u32 name
+#       record      u32 type (func), u32 comment, u32 dep_prefix, u32 number
+#                   of items, per item two string references (struct: field
+#                   name and type, enum/consts: item name and value, func:
+#                   parameter name and type)
+#       strings     u32 offset per string plus the end offset (relative to
+#                   the first string), UTF-8 data
+#
+#   load() maps the file and only decodes the declarations which are
+#   accessed, the index alone is enough to list or find declarations.
+#-------------------------------------------------------------------------------
+import argparse, json, mmap, os, struct, sys
+from collections.abc import Mapping, Sequence
+import gen_cache
+
+MAGIC = b'SKIR'
+VERSION = 1
+NONE = 0xffffffff
+
+HEADER = struct.Struct('<4sHHIIII')
+INDEX_ENTRY = struct.Struct('<IBBHI')
+RECORD = struct.Struct('<IIII')
+
+kinds = ['struct', 'enum', 'consts', 'func']
+# the dict keys of the two strings of each item, by declaration kind
+item_keys = {
+    'struct': ('fields', 'name', 'type'),
+    'enum': ('items', 'name', 'value'),
+    'consts': ('items', 'name', 'value'),
+    'func': ('params', 'name', 'type'),
+}
+FLAG_DEP = 1
+
+class IRFormatError(Exception):
+    pass
+
+class _StringTable:
+    def __init__(self):
+        self.strings = []
+        self.indices = {}
+
+    def ref(self, s):
+        if s is None:
+            return NONE
+        index = self.indices.get(s)
+        if index is None:
+            index = self.indices[s] = len(self.strings)
+            self.strings.append(s)
+        return index
+
+    def pack(self):
+        data = [s.encode('utf-8') for s in self.strings]
+        offsets = [0]
+        for chunk in data:
+            offsets.append(offsets[-1] + len(chunk))
+        return struct.pack(f'<{len(offsets)}I', *offsets) + b''.join(data)
+
+def dumps(ir):
+    strings = _StringTable()
+    module = struct.pack('<III', strings.ref(ir['module']), strings.ref(ir['prefix']), strings.ref(ir.get('comment')))
+    module += struct.pack(f"<I{len(ir['dep_prefixes'])}I", len(ir['dep_prefixes']), *[strings.ref(p) for p in ir['dep_prefixes']])
+    index_offset = HEADER.size + len(module)
+    records_offset = index_offset + INDEX_ENTRY.size * len(ir['decls'])
+    index = []
+    records = []
+    offset = records_offset
+    for decl in ir['decls']:
+        kind = decl['kind']
+        list_key, first_key, second_key = item_keys[kind]
+        items = decl[list_key]
+        refs = []
+        for item in items:
+            refs += [strings.ref(item.get(first_key)), strings.ref(item.get(second_key))]
+        record = RECORD.pack(strings.ref(decl.get('type')), strings.ref(decl.get('comment')), strings.ref(decl['dep_prefix']), len(items))
+        record += struct.pack(f'<{len(refs)}I', *refs)
+        index.append(INDEX_ENTRY.pack(offset, kinds.index(kind), FLAG_DEP if decl['is_dep'] else 0, 0, strings.ref(decl.get('name'))))
+        records.append(record)
+        offset += len(record)
+    header = HEADER.pack(MAGIC, VERSION, 0, len(strings.strings), offset, len(ir['decls']), index_offset)
+    return header + module + b''.join(index) + b''.join(records) + strings.pack()
+
+def write(path, ir):
+    # only written if changed, returns True if it was; replaced atomically,
+    # so that a reader which has the old file mapped isn't affected
+    data = dumps(ir)
+    try:
+        with open(path, 'rb') as f:
+            if f.read() == data:
+                return False
+    except OSError:
+        pass
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    gen_cache.write_atomic(path, data)
+    return True
+
+class Decls(Sequence):
+    # the declarations of an IRFile, decoded when accessed
+    def __init__(self, irfile):
+        self.irfile = irfile
+
+    def __len__(self):
+        return self.irfile.num_decls
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.irfile.decl(j) for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self.irfile.decl(i)
+
+    def __add__(self, other):
+        return list(self) + list(other)
+
+    def __radd__(self, other):
+        return list(other) + list(self)
+
+class IRFile(Mapping):
+    """
+    A memory-mapped .ir file, which can be used like the IR dict gen_ir
+    returns (ir['module'], ir['decls'], ...).
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            try:
+                self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                self.data = b''     # an empty file can't be mapped
+        if len(self.data) < HEADER.size:
+            raise IRFormatError(f'{path}: not an IR file')
+        magic, version, _, self.num_strings, strings_offset, self.num_decls, self.index_offset = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC:
+            raise IRFormatError(f'{path}: not an IR file')
+        if version != VERSION:
+            raise IRFormatError(f'{path}: unsupported IR version {version}')
+        self.strings = None
+        self.decl_cache = {}
+        self.names = None
+        try:
+            self.string_offsets = struct.unpack_from(f'<{self.num_strings + 1}I', self.data, strings_offset)
+            self.string_data = strings_offset + 4 * (self.num_strings + 1)
+            self.module_fields = self.read_module()
+        except (struct.error, IndexError):
+            raise IRFormatError(f'{path}: truncated IR file')
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def string_table(self):
+        # all strings by reference, decoded in one go on first use (they are
+        # shared by all declarations, so a single lookup needs most of them)
+        if self.strings is None:
+            offsets = self.string_offsets
+            blob = self.data[self.string_data:self.string_data + offsets[-1]]
+            if blob.isascii():
+                # byte offsets are character offsets
+                text = blob.decode('ascii')
+                self.strings = [text[start:end] for start, end in zip(offsets, offsets[1:])]
+            else:
+                self.strings = [blob[start:end].decode('utf-8') for start, end in zip(offsets, offsets[1:])]
+        return self.strings
+
+    def string(self, ref):
+        return None if ref == NONE else self.string_table()[ref]
+
+    def read_module(self):
+        module, prefix, comment, num_deps = struct.unpack_from('<IIII', self.data, HEADER.size)
+        deps = struct.unpack_from(f'<{num_deps}I', self.data, HEADER.size + 16)
+        fields = { 'module': self.string(module), 'prefix': self.string(prefix), 'dep_prefixes': [self.string(dep) for dep in deps] }
+        if comment != NONE:
+            fields['comment'] = self.string(comment)
+        fields['decls'] = Decls(self)
+        return fields
+
+    def __getitem__(self, key):
+        return self.module_fields[key]
+
+    def __iter__(self):
+        return iter(self.module_fields)
+
+    def __len__(self):
+        return len(self.module_fields)
+
+    def index_entry(self, i):
+        # (record offset, kind, is_dep, name) without decoding the record
+        offset, kind, flags, _, name = INDEX_ENTRY.unpack_from(self.data, self.index_offset + i * INDEX_ENTRY.size)
+        return offset, kinds[kind], bool(flags & FLAG_DEP), self.string(name)
+
+    def index_entries(self):
+        end = self.index_offset + self.num_decls * INDEX_ENTRY.size
+        for offset, kind, flags, _, name in INDEX_ENTRY.iter_unpack(self.data[self.index_offset:end]):
+            yield offset, kinds[kind], bool(flags & FLAG_DEP), self.string(name)
+
+    def decl(self, i):
+        decl = self.decl_cache.get(i)
+        if decl is None:
+            offset, kind, is_dep, name = self.index_entry(i)
+            type_ref, comment, dep_prefix, num_items = RECORD.unpack_from(self.data, offset)
+            refs = struct.unpack_from(f'<{2 * num_items}I', self.data, offset + RECORD.size)
+            list_key, first_key, second_key = item_keys[kind]
+            strings = self.string_table()
+            items = []
+            for first, second in zip(refs[0::2], refs[1::2]):
+                if first != NONE and second != NONE:
+                    items.append({ first_key: strings[first], second_key: strings[second] })
+                    continue
+                item = {}
+                if first != NONE:
+                    item[first_key] = strings[first]
+                if second != NONE:
+                    item[second_key] = strings[second]
+                items.append(item)
+            # same key order as gen_ir
+            decl = { 'kind': kind }
+            if name is not None:
+                decl['name'] = name
+            if type_ref != NONE:
+                decl['type'] = self.string(type_ref)
+            decl[list_key] = items
+            if comment != NONE:
+                decl['comment'] = self.string(comment)
+            decl['is_dep'] = is_dep
+            decl['dep_prefix'] = self.string(dep_prefix)
+            self.decl_cache[i] = decl
+        return decl
+
+    def find(self, name):
+        # the declaration with the given name, or None
+        if self.names is None:
+            self.names = {}
+            for i, entry in enumerate(self.index_entries()):
+                self.names.setdefault(entry[3], i)
+        i = self.names.get(name)
+        return None if i is None else self.decl(i)
+
+    def to_dict(self):
+        outp = dict(self.module_fields)
+        outp['decls'] = list(self.module_fields['decls'])
+        return outp
+
+def load(path):
+    return IRFile(path)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Inspect a binary IR file written by gen.py.')
+    parser.add_argument('ir', help='the .ir file')
+    parser.add_argument('--decl', nargs='+', default=[], metavar='NAME', help='print these declarations')
+    parser.add_argument('--json', action='store_true', help='print the whole IR as JSON')
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    try:
+        irfile = load(args.ir)
+    except (OSError, IRFormatError) as e:
+        sys.exit(f'error: {e}')
+    with irfile:
+        if args.json:
+            print(json.dumps(irfile.to_dict(), indent=2))
+            sys.exit(0)
+        for name in args.decl:
+            decl = irfile.find(name)
+            if decl is None:
+                sys.exit(f'error: {name}: no such declaration')
+            print(json.dumps(decl, indent=2))
+        if not args.decl:
+            counts = {}
+            for _, kind, _, _ in irfile.index_entries():
+                counts[kind] = counts.get(kind, 0) + 1
+            print(f"{irfile['module']} ({irfile['prefix']}), dependencies: {', '.join(irfile['dep_prefixes']) or 'none'}")
+            print(f'{irfile.num_decls} declarations ({", ".join(f"{counts[kind]} {kind}" for kind in kinds if kind in counts)}), {irfile.num_strings} strings, {len(irfile.data)} bytes')
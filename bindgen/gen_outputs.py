@@ -0,0 +1,137 @@
+#-------------------------------------------------------------------------------
+#   Incremental output layer for the bindings generator.
+#
+#   Outputs are only written when their content actually changed, so that
+#   unchanged files keep their mtime and don't trigger dotnet or native
+#   rebuilds downstream. Each run records a manifest of
+#   C header => IR => output dependencies (as content hashes) next to the
+#   IR cache, and the outputs that changed since the last run are reported,
+#   grouped by the build target (C# project or native library) they affect.
+#-------------------------------------------------------------------------------
+import hashlib, json, os
+import gen_profile
+
+MANIFEST_VERSION = 1
+
+manifest_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'manifest.json')
+
+def hash_text(text):
+    return hashlib.sha256(text.encode()).hexdigest()
+
+def hash_file(path):
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+def hash_ir(ir):
+    return hash_text(json.dumps(ir, sort_keys=True))
+
+def write_if_changed(path, text):
+    # returns True if the file was (re-)written
+    try:
+        with open(path, 'r', newline='') as f:
+            if f.read() == text:
+                return False
+    except OSError:
+        pass
+    with gen_profile.span('write', path=path):
+        with open(path, 'w', newline='\n') as f:
+            f.write(text)
+    return True
+
+def load_manifest(path=None):
+    try:
+        with open(path or manifest_path, 'r') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get('version') != MANIFEST_VERSION:
+        return {}
+    return manifest
+
+class OutputTracker:
+    # collects what was generated in this run, compares it with the previous
+    # run's manifest and writes the new manifest
+    def __init__(self, path=None):
+        self.path = path or manifest_path
+        self.prev = load_manifest(self.path)
+        self.headers = {}
+        self.irs = {}
+        self.outputs = {}
+        self.removed = {}
+
+    def add_ir(self, module, header_path, ir, native_target):
+        # 'native_target' is the native library the C header is compiled into
+        self.headers[header_path] = hash_file(header_path)
+        self.irs[module] = { 'header': header_path, 'hash': hash_ir(ir), 'native': native_target }
+
+    def write(self, path, text, target, modules):
+        # write a generated file, 'target' is the build target that needs to
+        # be rebuilt if the file changes, 'modules' the IRs it was built from
+        written = write_if_changed(path, text)
+        self.outputs[path] = {
+            'hash': hash_text(text),
+            'target': target,
+            'modules': list(modules),
+            'written': written,
+        }
+        return written
+
+    def remove(self, path, target):
+        # an output which is no longer generated
+        if os.path.exists(path):
+            with gen_profile.span('write', path=path):
+                os.remove(path)
+            self.removed[path] = target
+
+    def changed_outputs(self):
+        # written files, plus outputs whose recorded hash differs from the
+        # last run (e.g. if the file was restored between runs)
+        prev_outputs = self.prev.get('outputs', {})
+        changed = []
+        for path, output in self.outputs.items():
+            prev = prev_outputs.get(path)
+            if output['written'] or prev is None or prev['hash'] != output['hash']:
+                changed.append(path)
+        return changed + list(self.removed)
+
+    def changed_headers(self):
+        prev_headers = self.prev.get('headers', {})
+        return [path for path, h in self.headers.items() if prev_headers.get(path) != h]
+
+    def changed_irs(self):
+        prev_irs = self.prev.get('irs', {})
+        return [module for module, ir in self.irs.items() if prev_irs.get(module, {}).get('hash') != ir['hash']]
+
+    def affected_targets(self):
+        targets = set(self.outputs[path]['target'] for path in self.outputs if path in self.changed_outputs())
+        targets.update(self.removed.values())
+        # a changed C header means the native library it is compiled into
+        # must be rebuilt even if the generated bindings are unchanged
+        changed_headers = set(self.changed_headers())
+        for ir in self.irs.values():
+            if ir['header'] in changed_headers:
+                targets.add(ir['native'])
+        return sorted(targets)
+
+    def report(self):
+        return {
+            'changed_headers': self.changed_headers(),
+            'changed_irs': self.changed_irs(),
+            'changed_outputs': self.changed_outputs(),
+            'unchanged_outputs': [path for path in self.outputs if path not in self.changed_outputs()],
+            'affected_targets': self.affected_targets(),
+        }
+
+    def save(self):
+        manifest = {
+            'version': MANIFEST_VERSION,
+            'headers': self.headers,
+            'irs': self.irs,
+            'outputs': { path: { k: v for k, v in output.items() if k != 'written' } for path, output in self.outputs.items() },
+        }
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'w') as f:
+            f.write(json.dumps(manifest, indent=2, sort_keys=True))
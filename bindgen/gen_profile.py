@@ -0,0 +1,113 @@
+#-------------------------------------------------------------------------------
+#   Stage-level profiling for the bindings generator (gen.py --profile).
+#
+#   span() records one timed interval (a Chrome trace 'complete' event).
+#   stage() accumulates the time of many short, interleaved calls (e.g. JSON
+#   decoding while clang is still streaming its output), which flush_stages()
+#   then emits as one event per stage on a separate track. Workers hand their
+#   events back with take_events(), the main process writes everything as a
+#   Chrome trace (chrome://tracing, ui.perfetto.dev) and prints a summary.
+#-------------------------------------------------------------------------------
+import contextlib, json, os, sys, time
+
+try:
+    import resource
+except ImportError:
+    resource = None     # not available on Windows, peak RSS isn't recorded
+
+SPAN_TID = 1
+STAGE_TID = 2
+
+enabled = False
+events = []
+stage_totals = {}
+
+def now_us():
+    # perf_counter is a system-wide monotonic clock, so timestamps from
+    # worker processes line up with the main process
+    return time.perf_counter_ns() / 1000
+
+@contextlib.contextmanager
+def span(name, **args):
+    if not enabled:
+        yield
+        return
+    start = now_us()
+    try:
+        yield
+    finally:
+        events.append({ 'name': name, 'ph': 'X', 'ts': start, 'dur': now_us() - start,
+                        'pid': os.getpid(), 'tid': SPAN_TID, 'args': args })
+
+class Stage:
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+
+    def __exit__(self, *exc):
+        total = stage_totals.get(self.name)
+        if total is None:
+            total = stage_totals[self.name] = [self.start, 0, 0]
+        total[1] += time.perf_counter_ns() - self.start
+        total[2] += 1
+
+no_stage = contextlib.nullcontext()
+
+def stage(name):
+    return Stage(name) if enabled else no_stage
+
+def flush_stages(**args):
+    # emit the accumulated stages as one event each, starting at the first call
+    for name, (start, total, calls) in stage_totals.items():
+        events.append({ 'name': name, 'ph': 'X', 'ts': start / 1000, 'dur': total / 1000,
+                        'pid': os.getpid(), 'tid': STAGE_TID, 'args': dict(args, calls=calls) })
+    stage_totals.clear()
+
+def peak_rss_mb(who='self'):
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF if who == 'self' else resource.RUSAGE_CHILDREN)
+    # ru_maxrss is in kilobytes on Linux, but in bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return usage.ru_maxrss * scale / (1024 * 1024)
+
+def record_rss():
+    # peak RSS of this process, and of its largest child (clang) so far
+    if not enabled or resource is None:
+        return
+    events.append({ 'name': 'peak rss (MB)', 'ph': 'C', 'ts': now_us(), 'pid': os.getpid(),
+                    'args': { 'self': round(peak_rss_mb('self'), 1), 'children': round(peak_rss_mb('children'), 1) } })
+
+def take_events():
+    global events
+    taken, events = events, []
+    return taken
+
+def write_trace(path, trace_events):
+    main_pid = os.getpid()
+    meta = []
+    for pid in sorted(set(event['pid'] for event in trace_events)):
+        meta.append({ 'name': 'process_name', 'ph': 'M', 'pid': pid, 'args': { 'name': 'gen.py' if pid == main_pid else f'worker {pid}' } })
+        meta.append({ 'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': SPAN_TID, 'args': { 'name': 'spans' } })
+        meta.append({ 'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': STAGE_TID, 'args': { 'name': 'stages (accumulated)' } })
+    with open(path, 'w') as f:
+        json.dump({ 'traceEvents': meta + trace_events, 'displayTimeUnit': 'ms' }, f)
+
+def summary(trace_events):
+    # per event name: count, total, mean and max duration, sorted by total
+    rows = {}
+    for event in trace_events:
+        if event['ph'] == 'X':
+            row = rows.setdefault(event['name'], [0, 0.0, 0.0])
+            row[0] += event['args'].get('calls', 1)
+            row[1] += event['dur']
+            row[2] = max(row[2], event['dur'])
+    lines = [f"{'stage':<24} {'count':>8} {'total ms':>10} {'mean ms':>10} {'max ms':>10}"]
+    for name, (count, total, longest) in sorted(rows.items(), key=lambda item: -item[1][1]):
+        lines.append(f'{name:<24} {count:>8} {total / 1000:>10.1f} {total / 1000 / count:>10.3f} {longest / 1000:>10.1f}')
+    rss = [event['args'] for event in trace_events if event['ph'] == 'C']
+    if rss:
+        lines.append(f"peak rss: {max(r['self'] for r in rss):.1f} MB (generator), {max(r['children'] for r in rss):.1f} MB (clang)")
+    return '\n'.join(lines)
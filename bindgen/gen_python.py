@@ -0,0 +1,429 @@
+#-------------------------------------------------------------------------------
+#   Generate Python ctypes bindings from the IR (see gen_ir.py).
+#
+#   python3 gen_python.py [-t PREFIX ...] [-o DIR]
+#
+#   Writes one module per prefix in module_names from the .ir files of the
+#   last gen.py run (gen.py --python writes them along with the C# sources),
+#   plus the _runtime.py they share, into the sokol_native package in
+#   output_dir. The modules keep the C names: enums are IntEnum classes whose
+#   items are also module globals, structs are ctypes.Structure classes
+#   (including the dependencies' structs they use) and functions are the
+#   ctypes functions of the native library, with argtypes and restype set.
+#
+#   Pointer parameters to primitive types (and void) accept any C-contiguous
+#   buffer (bytes, bytearray, memoryview, array.array, numpy arrays) without
+#   copying, besides ctypes pointers, arrays and byref(), see _runtime.Buffer.
+#   ctypes releases the GIL during the calls, so the native decoders run in
+#   parallel when called from a thread pool, as long as they don't share
+#   process-global state (see module_notes). Functions the native library
+#   doesn't export are left undefined, hasattr(module, name) tells.
+#-------------------------------------------------------------------------------
+import argparse, os, sys
+import gen_apidiff, gen_csharp, gen_ir, gen_outputs, gen_registry
+import gen_util as util
+
+# Python module names of the modules with a Python backend
+module_names = {
+    'stbi_':    'stb_image',
+    'EXR':      'tinyexr',
+    'sbasisu_': 'sokol_basisu',
+    'cgltf_':   'cgltf',
+    'fons':     'fontstash',
+}
+
+# comment lines for the header of a generated module
+module_notes = {
+    'stbi_': [
+        'Not thread-safe: the vertical flip flag of stb_image is process-global,',
+        'stbi_load_flipped_csharp() and stbi_loadf_flipped_csharp() set it and',
+        'leave it set (later unflipped loads are flipped too), and',
+        'stbi_failure_reason_csharp() returns the reason of the last failure in',
+        'any thread. The bundled stb_image has no _thread variants, decode in',
+        'parallel only without the flipped loads, and only rely on the failure',
+        'reason while no other thread decodes.',
+    ],
+}
+
+output_dir = '../tools/python/sokol_native'
+
+# build target of the generated Python modules in gen_outputs reports
+python_target = 'python:tools/python/sokol_native'
+
+prim_types = {
+    'bool':                 'ctypes.c_bool',
+    'char':                 'ctypes.c_char',
+    'signed char':          'ctypes.c_byte',
+    'unsigned char':        'ctypes.c_ubyte',
+    'int8_t':               'ctypes.c_int8',
+    'uint8_t':              'ctypes.c_uint8',
+    'short':                'ctypes.c_short',
+    'unsigned short':       'ctypes.c_ushort',
+    'int16_t':              'ctypes.c_int16',
+    'uint16_t':             'ctypes.c_uint16',
+    'int':                  'ctypes.c_int',
+    'unsigned int':         'ctypes.c_uint',
+    'int32_t':              'ctypes.c_int32',
+    'uint32_t':             'ctypes.c_uint32',
+    'long':                 'ctypes.c_long',
+    'unsigned long':        'ctypes.c_ulong',
+    'long long':            'ctypes.c_longlong',
+    'unsigned long long':   'ctypes.c_ulonglong',
+    'int64_t':              'ctypes.c_int64',
+    'uint64_t':             'ctypes.c_uint64',
+    'float':                'ctypes.c_float',
+    'double':               'ctypes.c_double',
+    'size_t':               'ctypes.c_size_t',
+    'uintptr_t':            'ctypes.c_size_t',
+    'intptr_t':             'ctypes.c_ssize_t',
+    'cgltf_size':           'ctypes.c_size_t',
+    'cgltf_ssize':          'ctypes.c_longlong',
+    'cgltf_int':            'ctypes.c_int',
+    'cgltf_uint':           'ctypes.c_uint',
+    'cgltf_bool':           'ctypes.c_int',
+    'cgltf_float':          'ctypes.c_float',
+}
+
+runtime_source = '''# machine generated, do not edit
+#
+# Support code of the generated ctypes modules: native library loading,
+# buffer arguments and copying returned memory into arrays.
+import ctypes, ctypes.util, os, platform, sys
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# directories searched for the native libraries before the system paths,
+# SOKOL_NATIVE_LIBRARY_PATH (os.pathsep separated) comes first
+library_dirs = [path for path in os.environ.get('SOKOL_NATIVE_LIBRARY_PATH', '').split(os.pathsep) if path]
+_libs_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'libs')
+if sys.platform.startswith('win'):
+    library_dirs.append(os.path.join(_libs_dir, 'windows', 'x64', 'release'))
+elif sys.platform == 'darwin':
+    library_dirs.append(os.path.join(_libs_dir, 'macos', 'arm64' if platform.machine() == 'arm64' else 'X64', 'release'))
+else:
+    library_dirs.append(os.path.join(_libs_dir, 'linux', 'X64', 'release'))
+
+_libraries = {}
+
+def library_file_name(name):
+    if sys.platform.startswith('win'):
+        return f'{name}.dll'
+    if sys.platform == 'darwin':
+        return f'lib{name}.dylib'
+    return f'lib{name}.so'
+
+def load_library(name):
+    # the native library, loaded once and shared by all modules
+    lib = _libraries.get(name)
+    if lib is None:
+        paths = [os.path.join(directory, library_file_name(name)) for directory in library_dirs]
+        path = next((path for path in paths if os.path.exists(path)), None) or ctypes.util.find_library(name)
+        if path is None:
+            raise OSError(f"native library '{name}' not found in: {', '.join(paths)} (set SOKOL_NATIVE_LIBRARY_PATH)")
+        lib = _libraries[name] = ctypes.CDLL(path)
+    return lib
+
+def function(lib, name, restype, argtypes, errcheck=None):
+    # the ctypes function 'name' of lib, AttributeError if the library
+    # doesn't export it (the modules leave such functions undefined)
+    func = getattr(lib, name)
+    func.restype = restype
+    func.argtypes = argtypes
+    if errcheck is not None:
+        func.errcheck = errcheck
+    return func
+
+def decode_string(result, func, args):
+    # errcheck of functions returning const char *
+    return None if result is None else result.decode('utf-8', 'replace')
+
+_ctypes_pointers = (ctypes._Pointer, ctypes.Array, ctypes.c_void_p, ctypes.c_char_p, type(ctypes.byref(ctypes.c_int())))
+
+class Buffer:
+    """
+    argtypes entry of a pointer to ctype elements (None: void). Accepts None
+    (NULL), integer addresses, ctypes pointers, arrays and byref(), and
+    objects supporting the buffer protocol, which are passed without
+    copying. Pointers to non-const need a writable buffer, and buffers must
+    be C-contiguous. The element type of a buffer isn't checked.
+    """
+    def __init__(self, ctype, const=False):
+        self.ctype = ctype
+        self.const = const
+
+    def from_param(self, obj):
+        if obj is None or isinstance(obj, _ctypes_pointers):
+            return obj
+        if isinstance(obj, int):
+            return ctypes.c_void_p(obj)
+        if isinstance(obj, bytes):
+            if not self.const:
+                raise TypeError('bytes are read-only, pass a bytearray or a writable array')
+            return obj
+        view = memoryview(obj)
+        if not view.c_contiguous:
+            raise ValueError('the buffer is not C-contiguous')
+        if view.nbytes == 0:
+            return None
+        view = view.cast('B')
+        if not view.readonly:
+            return (ctypes.c_char * view.nbytes).from_buffer(view)
+        if not self.const:
+            raise TypeError('read-only buffer for a pointer to non-const')
+        interface = getattr(obj, '__array_interface__', None)
+        if interface is not None:
+            # read-only numpy arrays
+            return ctypes.c_void_p(interface['data'][0])
+        # other read-only buffers can't be referenced from ctypes
+        return (ctypes.c_char * view.nbytes).from_buffer_copy(view)
+
+class String:
+    """
+    argtypes entry of const char *, accepts str (passed as UTF-8), bytes
+    and None.
+    """
+    @staticmethod
+    def from_param(obj):
+        if isinstance(obj, str):
+            return obj.encode('utf-8')
+        return ctypes.c_char_p.from_param(obj)
+
+def array(pointer, shape, free=None):
+    """
+    A copy of the native array of the given shape at a returned typed
+    pointer (None if it is NULL), as a numpy array, or without numpy as a
+    ctypes array. The pointer is passed to free afterwards, if given.
+    """
+    if not pointer:
+        return None
+    shape = (shape,) if isinstance(shape, int) else tuple(shape)
+    array_type = pointer._type_
+    for size in reversed(shape):
+        array_type = array_type * size
+    native = ctypes.cast(pointer, ctypes.POINTER(array_type)).contents
+    if numpy is not None:
+        result = numpy.ctypeslib.as_array(native).copy()
+    else:
+        result = array_type.from_buffer_copy(native)
+    if free is not None:
+        free(pointer)
+    return result
+'''
+
+class ModuleGenerator:
+    def __init__(self, ir, dep_decls):
+        self.ir = ir
+        self.lines = []
+        # the module's own declarations and the dependency types they use
+        self.decls = self.used_dep_decls(dep_decls) + [decl for decl in ir['decls'] if not decl['is_dep']]
+        self.structs = { decl['name']: decl for decl in self.decls if decl['kind'] == 'struct' }
+        self.enums = { decl['name'] for decl in self.decls if decl['kind'] == 'enum' }
+        # the structs which are only usable through pointers, because
+        # the IR doesn't describe a field (e.g. an unnamed union)
+        self.opaque = {}
+        for decl in self.decls:
+            if decl['kind'] == 'struct':
+                for field in decl['fields']:
+                    if self.ctypes_type(field['type']) is None:
+                        self.opaque[decl['name']] = field.get('name') or field['type']
+                        break
+
+    def l(self, s=''):
+        self.lines.append(s)
+
+    def used_dep_decls(self, dep_decls):
+        # the dependency structs and enums the module's declarations use,
+        # transitively, in declaration order
+        by_name = { decl['name']: decl for decl in dep_decls if decl['kind'] in ('struct', 'enum') }
+        used = set()
+        pending = [decl for decl in self.ir['decls'] if not decl['is_dep']]
+        while pending:
+            decl = pending.pop()
+            types = [field['type'] for field in decl['fields']] if decl['kind'] == 'struct' else [decl['type']] if decl['kind'] == 'func' else []
+            for c_type in types:
+                for name in gen_csharp.type_name_re.findall(c_type):
+                    if name in by_name and name not in used:
+                        used.add(name)
+                        pending.append(by_name[name])
+        return [decl for decl in dep_decls if decl.get('name') in used]
+
+    def ctypes_type(self, c_type, role='field'):
+        # the ctypes type expression of a C type as a struct field, function
+        # 'param' or 'result', None if it can't be expressed
+        c_type = c_type.strip()
+        t = util.parse_c_type(c_type)
+        if t.func_ptr is not None:
+            result = 'None' if t.func_ptr.result == 'void' else self.ctypes_type(t.func_ptr.result)
+            args = [self.ctypes_type(arg) for arg in t.func_ptr.args if arg not in ('', 'void')]
+            if result is None or None in args:
+                return None
+            return f"ctypes.CFUNCTYPE({', '.join([result] + args)})"
+        if t.array_dims:
+            outp = self.ctypes_type(util.extract_array_type(c_type))
+            if outp is None or not all(isinstance(n, int) for n in t.array_dims):
+                return None
+            for n in reversed(t.array_dims):
+                outp = f'({outp} * {n})'
+            return outp
+        if t.ptr_depth == 0:
+            if t.base == 'void':
+                return 'None' if role == 'result' else None
+            if t.base in prim_types:
+                return prim_types[t.base]
+            if t.base in self.enums:
+                return 'ctypes.c_int'
+            if t.base in self.structs and t.base not in self.opaque:
+                return t.base
+            return None
+        if t.ptr_depth == 1:
+            if role == 'param' and t.base == 'char' and t.is_const:
+                return '_runtime.String'
+            if role == 'param' and (t.base == 'void' or t.base in prim_types):
+                elem_type = 'None' if t.base == 'void' else prim_types[t.base]
+                return f'_runtime.Buffer({elem_type}, const=True)' if t.is_const else f'_runtime.Buffer({elem_type})'
+            if t.base == 'char':
+                return 'ctypes.c_char_p'
+            if t.base == 'void':
+                return 'ctypes.c_void_p'
+            if t.base in prim_types:
+                return f'ctypes.POINTER({prim_types[t.base]})'
+            if t.base in self.enums:
+                return 'ctypes.POINTER(ctypes.c_int)'
+            if t.base in self.structs:
+                return f'ctypes.POINTER({t.base})'
+            # pointers to types the IR doesn't have (opaque handles)
+            return 'ctypes.c_void_p'
+        pointee = self.ctypes_type(c_type[:c_type.rindex('*')])
+        return None if pointee is None else f'ctypes.POINTER({pointee})'
+
+    def gen_enum(self, decl):
+        self.l(f"class {decl['name']}(enum.IntEnum):")
+        value = -1
+        for item in decl['items']:
+            value = int(item['value'], 0) if 'value' in item else value + 1
+            self.l(f"    {item['name']} = {value}")
+        self.l(f"globals().update({decl['name']}.__members__)")
+        self.l()
+
+    def gen_consts(self, decl):
+        value = -1
+        for item in decl['items']:
+            value = int(item['value'], 0) if 'value' in item else value + 1
+            self.l(f"{item['name']} = {value}")
+        self.l()
+
+    def gen_struct_fields(self, decl):
+        self.l(f"{decl['name']}._fields_ = [")
+        for field in decl['fields']:
+            self.l(f"    ('{field['name']}', {self.ctypes_type(field['type'])}),")
+        self.l(']')
+        self.l()
+
+    def gen_func(self, decl):
+        self.l(f'# {gen_apidiff.signature(decl)}')
+        result_type = decl['type'][:decl['type'].index('(')].strip()
+        restype = self.ctypes_type(result_type, 'result')
+        argtypes = [self.ctypes_type(param['type'], 'param') for param in decl['params']]
+        if restype is None or None in argtypes:
+            self.l(f"# skipped, a parameter or the result type can't be expressed with ctypes")
+            self.l()
+            return
+        errcheck = ', _runtime.decode_string' if util.is_string_ptr(result_type) else ''
+        self.l(f"if hasattr(_lib, '{decl['name']}'):")
+        self.l(f"    {decl['name']} = _runtime.function(_lib, '{decl['name']}', {restype}, [{', '.join(argtypes)}]{errcheck})")
+        self.l()
+
+    def gen_module(self, c_header_path, library_name):
+        self.l('# machine generated, do not edit')
+        self.l('#')
+        self.l(f"# ctypes bindings of {os.path.basename(c_header_path)} ('{self.ir['prefix']}' declarations), see bindgen/gen_python.py")
+        if self.ir['prefix'] in module_notes:
+            self.l('#')
+            for line in module_notes[self.ir['prefix']]:
+                self.l(f'# {line}')
+        self.l('import ctypes, enum' if any(decl['kind'] == 'enum' for decl in self.decls) else 'import ctypes')
+        self.l('from . import _runtime')
+        self.l()
+        self.l(f"_lib = _runtime.load_library('{library_name}')")
+        self.l()
+        for decl in self.decls:
+            if decl['kind'] == 'enum':
+                self.gen_enum(decl)
+            elif decl['kind'] == 'consts':
+                self.gen_consts(decl)
+        # all struct classes first, the fields may point to any of them
+        for decl in self.decls:
+            if decl['kind'] == 'struct':
+                if decl['name'] in self.opaque:
+                    self.l(f"# only usable through pointers, the IR doesn't describe the type of '{self.opaque[decl['name']]}'")
+                self.l(f"class {decl['name']}(ctypes.Structure):")
+                self.l('    pass')
+                self.l()
+        for decl in self.decls:
+            if decl['kind'] == 'struct' and decl['name'] not in self.opaque:
+                self.gen_struct_fields(decl)
+        for decl in self.decls:
+            if decl['kind'] == 'func':
+                self.gen_func(decl)
+        return '\n'.join(self.lines).rstrip('\n') + '\n'
+
+def gen_source(ir, c_header_path, c_prefix, dep_c_prefixes):
+    # the Python module of an IR, the dependencies' declarations are read
+    # from gen_registry
+    generator = ModuleGenerator(ir, gen_registry.dep_decls(dep_c_prefixes))
+    return generator.gen_module(c_header_path, gen_csharp.library_names.get(c_prefix, 'sokol'))
+
+def gen_package_init():
+    lines = ['# machine generated, do not edit', '#', '# ctypes bindings of the native sokol libraries, see bindgen/gen_python.py:', '#']
+    lines += [f'#   {module}' for module in module_names.values()]
+    return '\n'.join(lines) + '\n'
+
+def gen(tasks, irs, outputs=None):
+    # writes the Python modules of the tasks with a Python backend and
+    # returns their paths, 'irs' are the tasks' IRs, which must be
+    # registered in gen_registry
+    os.makedirs(output_dir, exist_ok=True)
+    sources = []
+    for [c_header_path, c_prefix, dep_c_prefixes], ir in zip(tasks, irs):
+        if c_prefix in module_names:
+            sources.append((f'{output_dir}/{module_names[c_prefix]}.py', gen_source(ir, c_header_path, c_prefix, dep_c_prefixes), [ir['module']]))
+    modules = [ir_modules[0] for _, _, ir_modules in sources]
+    sources.append((f'{output_dir}/_runtime.py', runtime_source, modules))
+    sources.append((f'{output_dir}/__init__.py', gen_package_init(), modules))
+    for path, source, source_modules in sources:
+        if outputs is None:
+            gen_outputs.write_if_changed(path, source)
+        else:
+            outputs.write(path, source, python_target, source_modules)
+    return [path for path, _, _ in sources]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Generate Python ctypes bindings from the IR files of the last gen.py run.')
+    parser.add_argument('-t', '--task', nargs='+', default=list(module_names), metavar='PREFIX',
+                        help=f"the module prefixes (default: {', '.join(module_names)})")
+    parser.add_argument('-o', '--output-dir', default=output_dir,
+                        help=f'the sokol_native package directory (default: {output_dir})')
+    parser.add_argument('--ir-dir', default=gen_ir.ir_dir,
+                        help=f'the directory with the .ir files (default: {gen_ir.ir_dir})')
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    from gen import tasks as all_tasks
+    args = parse_args()
+    output_dir = args.output_dir
+    for prefix in args.task:
+        if prefix not in module_names:
+            sys.exit(f"error: {prefix}: no Python backend, one of: {', '.join(module_names)}")
+    tasks = [task for task in all_tasks if task[1] in args.task]
+    # the IRs of the tasks and their dependencies
+    prefixes = set(args.task) | { dep for task in tasks for dep in task[2] }
+    irs = gen_apidiff.load_irs(args.ir_dir, [gen_csharp.module_names[prefix] for prefix in prefixes])
+    for prefix in prefixes:
+        if gen_csharp.module_names[prefix] not in irs:
+            sys.exit(f"error: {os.path.join(args.ir_dir, gen_csharp.module_names[prefix])}.ir: not found, run gen.py first")
+        gen_registry.register(irs[gen_csharp.module_names[prefix]])
+    for path in gen(tasks, [irs[gen_csharp.module_names[task[1]]] for task in tasks]):
+        print(f'  {path}')
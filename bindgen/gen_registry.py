@@ -0,0 +1,61 @@
+#-------------------------------------------------------------------------------
+#   Cross-module declaration registry.
+#
+#   Most modules depend on sokol_gfx (and some on sokol_app), and every
+#   dependent translation unit sees all of its declarations again. Instead of
+#   extracting them into each dependent module's IR, gen_ir.py only extracts
+#   a module's own declarations, those are registered here once per prefix,
+#   and the C# generator resolves the dependency types of a module against
+#   the registry (see ModuleGenerator.pre_parse()).
+#
+#   Worker processes don't share the registry, the main process hands each
+#   task the part of it the task's dependencies need (see select()).
+#-------------------------------------------------------------------------------
+import sys
+
+# declarations by prefix, as seen from the modules depending on the prefix
+decls = {}
+# the prefix which registered a declaration, by decl_name()
+owners = {}
+
+def decl_name(decl):
+    # anonymous enums by their first item
+    return decl['name'] if 'name' in decl else decl['items'][0]['name']
+
+def register(ir):
+    # the module's own declarations, marked as dependency declarations of
+    # the module's prefix. Registering a prefix again (a regenerated module)
+    # replaces its declarations, a declaration which another prefix already
+    # registered (one prefix starting with another) is an error, the
+    # generator would see two different declarations of the same name
+    prefix = ir['prefix']
+    own = [dict(decl, is_dep=True, dep_prefix=prefix) for decl in ir['decls'] if not decl['is_dep']]
+    names = [decl_name(decl) for decl in own]
+    conflicts = sorted({ name for name in names if owners.get(name, prefix) != prefix })
+    if conflicts:
+        sys.exit(f"ERROR: {', '.join(conflicts)} of {prefix} already registered by {owners[conflicts[0]]}, the module prefixes overlap")
+    for decl in decls.get(prefix, ()):
+        owners.pop(decl_name(decl), None)
+    owners.update((name, prefix) for name in names)
+    decls[prefix] = own
+
+def reset():
+    decls.clear()
+    owners.clear()
+
+def select(dep_prefixes):
+    # the registry entries of the given dependencies, to hand to a worker process
+    missing = [prefix for prefix in dep_prefixes if prefix not in decls]
+    if missing:
+        sys.exit(f"ERROR: dependency {', '.join(missing)} not registered, its module must be generated first")
+    return { prefix: decls[prefix] for prefix in dep_prefixes }
+
+def load(selection):
+    # counterpart of select() in the worker process
+    decls.update(selection)
+
+def dep_decls(dep_prefixes):
+    outp = []
+    for prefix in select(dep_prefixes):
+        outp += decls[prefix]
+    return outp
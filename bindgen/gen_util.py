@@ -1,12 +1,14 @@
 # common utility functions for all bindings generators
-import re
+import re, functools, collections
 
 re_1d_array = re.compile(r"^(?:const )?\w*\s*\*?\[\d*\]$")
 re_2d_array = re.compile(r"^(?:const )?\w*\s*\*?\[\d*\]\[\d*\]$")
 
+@functools.lru_cache(maxsize=None)
 def is_1d_array_type(s):
     return re_1d_array.match(s) is not None
 
+@functools.lru_cache(maxsize=None)
 def is_2d_array_type(s):
     return re_2d_array.match(s) is not None
 
@@ -19,6 +21,27 @@ def extract_array_type(s):
 def extract_array_sizes(s):
     return s[s.index('['):].replace('[', ' ').replace(']', ' ').split()
 
+# A parsed C type as spelled by clang, e.g. 'const sg_range *' =>
+# CType(base='sg_range', is_const=True, is_struct=False, ptr_depth=1, array_dims=(), func_ptr=None)
+# Function pointers only fill in func_ptr, arrays keep the element type
+# in base, e.g. 'float[4][4]' => base='float', array_dims=(4, 4).
+CType = collections.namedtuple('CType', ['base', 'is_const', 'is_struct', 'ptr_depth', 'array_dims', 'func_ptr'])
+FuncPtr = collections.namedtuple('FuncPtr', ['result', 'args'])
+
+@functools.lru_cache(maxsize=None)
+def parse_c_type(s):
+    if '(*)' in s:
+        i = s.index('(*)')
+        args = tuple(arg.strip() for arg in s[i+4:-1].split(','))
+        return CType(s, False, False, 1, (), FuncPtr(s[:i].strip(), args))
+    array_dims = ()
+    if '[' in s:
+        array_dims = tuple(int(n) if n.isdigit() else n for n in extract_array_sizes(s))
+        s = extract_array_type(s)
+    tokens = s.replace('*', ' * ').split()
+    base = ' '.join(t for t in tokens if t not in ('const', 'struct', '*'))
+    return CType(base, tokens[:1] == ['const'], 'struct' in tokens, tokens.count('*'), array_dims, None)
+
 def is_string_ptr(s):
     return s == "const char *"
 
@@ -29,7 +52,7 @@ def is_void_ptr(s):
     return s == "void *"
 
 def is_func_ptr(s):
-    return '(*)' in s
+    return parse_c_type(s).func_ptr is not None
 
 def extract_ptr_type(s):
     tokens = s.split()
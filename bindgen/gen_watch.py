@@ -0,0 +1,134 @@
+#-------------------------------------------------------------------------------
+#   File watchers for gen.py --watch.
+#
+#   watcher(paths) returns an object whose wait() blocks until some of the
+#   watched files were written and returns their (absolute) paths. On Linux
+#   the directories of the files are watched with inotify, called through
+#   libc with ctypes, elsewhere (or if inotify isn't available) the files'
+#   mtimes and sizes are polled.
+#
+#   Editors save files in a burst of writes, renames and creates, the changes
+#   are collected until no more arrive for 'debounce' seconds.
+#-------------------------------------------------------------------------------
+import ctypes, os, select, struct, sys, time
+
+debounce = 0.05
+poll_interval = 0.2
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+EVENT_HEADER = struct.Struct('iIII')
+
+class InotifyWatcher:
+    kind = 'inotify'
+
+    def __init__(self, paths):
+        self.libc = ctypes.CDLL(None, use_errno=True)
+        self.libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = self.libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f'inotify_init1: {os.strerror(errno)}')
+        # the watched directories by watch descriptor
+        self.dirs = {}
+        self.paths = set()
+        self.update(paths)
+
+    def update(self, paths):
+        self.paths = { os.path.abspath(path) for path in paths }
+        dirs = { os.path.dirname(path) for path in self.paths }
+        for wd, directory in list(self.dirs.items()):
+            if directory not in dirs:
+                self.libc.inotify_rm_watch(self.fd, wd)
+                del self.dirs[wd]
+        for directory in dirs - set(self.dirs.values()):
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), IN_CLOSE_WRITE | IN_MOVED_TO)
+            if wd >= 0:
+                self.dirs[wd] = directory
+
+    def read_events(self, timeout):
+        # the watched files in the events which arrive within timeout (None:
+        # wait for events), all watched files if the event queue overflowed
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return set()
+        data = os.read(self.fd, 65536)
+        changed = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, name_len = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + name_len].rstrip(b'\0')
+            offset += name_len
+            if mask & IN_Q_OVERFLOW:
+                return set(self.paths)
+            if wd in self.dirs:
+                path = os.path.join(self.dirs[wd], os.fsdecode(name))
+                if path in self.paths:
+                    changed.add(path)
+        return changed
+
+    def wait(self):
+        changed = set()
+        while not changed:
+            changed = self.read_events(None)
+        while True:
+            more = self.read_events(debounce)
+            if not more:
+                return changed
+            changed |= more
+
+    def close(self):
+        os.close(self.fd)
+
+class PollingWatcher:
+    kind = 'polling'
+
+    def __init__(self, paths):
+        self.stats = {}
+        self.update(paths)
+
+    def stat(self, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def update(self, paths):
+        self.paths = { os.path.abspath(path) for path in paths }
+        # files which are already watched keep their last seen stat, so
+        # that a change while regenerating isn't missed
+        self.stats = { path: self.stats[path] if path in self.stats else self.stat(path) for path in self.paths }
+
+    def changes(self):
+        changed = set()
+        for path, prev in self.stats.items():
+            stat = self.stat(path)
+            if stat != prev:
+                self.stats[path] = stat
+                changed.add(path)
+        return changed
+
+    def wait(self):
+        changed = set()
+        while not changed:
+            time.sleep(poll_interval)
+            changed = self.changes()
+        while True:
+            time.sleep(debounce)
+            more = self.changes()
+            if not more:
+                return changed
+            changed |= more
+
+    def close(self):
+        pass
+
+def watcher(paths, polling=False):
+    if not polling and sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(paths)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(paths)
@@ -0,0 +1,200 @@
+#-------------------------------------------------------------------------------
+#   Marshalling cost report and lint pass over the bindings IR.
+#
+#   python3 lint.py [-t PREFIX ...] [--mode MODE[=PREFIX,...]] [--large-struct BYTES]
+#                   [--json PATH] [--fail-on CATEGORY ...] [--threshold N] [--baseline PATH]
+#                   [--from-ir]
+#
+#   Classifies every function and struct of the IR (as produced by gen_ir,
+#   using the IR cache, or with --from-ir the .ir files of the last gen.py
+#   run) the way gen_csharp emits it, prints a table sorted by cost and
+#   optionally writes it as JSON. Categories:
+#
+#       blittable               passed without any marshalling
+#       string_marshalling      string parameters (UTF-8 conversion per call)
+#       bool_marshalling        bool parameters or result
+#       non_blittable_struct    struct parameter, result or field which is
+#                               marshalled (bool or string fields)
+#       struct_return_wrapper   struct result returned through an _internal
+#                               wrapper on WEB (sret on wasm32, see gen_abi)
+#       large_by_value_param    struct parameter passed by value, larger
+#                               than --large-struct bytes
+#       large_by_value_return   struct result larger than --large-struct bytes
+#
+#   Struct sizes are the wasm32 layout sizes from gen_abi. For CI, the exit
+#   code is 1 if more than --threshold entries are in one of the --fail-on
+#   categories, only counting entries which aren't in the --baseline report
+#   (e.g. the report of the previous sokol version).
+#-------------------------------------------------------------------------------
+import argparse, contextlib, json, os, sys
+import gen, gen_abi, gen_csharp, gen_cache, gen_ir, gen_irfile, gen_registry
+
+categories = [
+    'blittable',
+    'string_marshalling',
+    'bool_marshalling',
+    'non_blittable_struct',
+    'struct_return_wrapper',
+    'large_by_value_param',
+    'large_by_value_return',
+]
+
+def struct_size(generator, struct_type):
+    layout = gen_abi.struct_layout(struct_type, generator.struct_decls, generator.enum_types)
+    return None if layout is None else layout.size
+
+def lint_func(generator, decl, large_struct):
+    func_name = decl['name']
+    decl_type = decl['type']
+    result_type = gen_csharp.check_type_override(func_name, 'RESULT', decl_type[:decl_type.index('(')].strip())
+    found = []
+    size = 0
+    if result_type == 'bool':
+        found.append(('bool_marshalling', 'result'))
+    elif generator.is_struct_type(result_type):
+        result_size = struct_size(generator, result_type)
+        size = max(size, result_size or 0)
+        if func_name in generator.struct_return_functions:
+            found.append(('struct_return_wrapper', f'{result_type} ({result_size} bytes)'))
+        if not generator.is_blittable_struct(result_type):
+            found.append(('non_blittable_struct', f'result {result_type}'))
+        if result_size is not None and result_size > large_struct:
+            found.append(('large_by_value_return', f'{result_type} ({result_size} bytes)'))
+    for param_decl in decl['params']:
+        param_name = gen_csharp.check_name_override(param_decl['name'])
+        param_type = gen_csharp.check_type_override(func_name, param_name, param_decl['type'])
+        if gen_csharp.is_string_ptr(param_type):
+            found.append(('string_marshalling', param_name))
+        elif param_type == 'bool':
+            found.append(('bool_marshalling', param_name))
+        elif generator.is_struct_type(param_type):
+            param_size = struct_size(generator, param_type)
+            size = max(size, param_size or 0)
+            if not generator.is_blittable_struct(param_type):
+                found.append(('non_blittable_struct', f'{param_name}: {param_type}'))
+            if param_size is not None and param_size > large_struct:
+                found.append(('large_by_value_param', f'{param_name}: {param_type} ({param_size} bytes)'))
+        elif generator.is_const_struct_ptr(param_type):
+            # passed as 'in T', only copied if the struct is marshalled
+            struct_type = gen_csharp.extract_ptr_type(param_type)
+            if not generator.is_blittable_struct(struct_type):
+                found.append(('non_blittable_struct', f'{param_name}: {struct_type}'))
+                size = max(size, struct_size(generator, struct_type) or 0)
+    return found, size
+
+def lint_struct(generator, decl):
+    struct_name = decl['name']
+    found = []
+    if not generator.is_blittable_struct(struct_name):
+        for field in decl['fields']:
+            field_type = field['type']
+            if field_type == 'bool' or gen_csharp.is_string_ptr(field_type) or (field_type in generator.struct_decls and not generator.is_blittable_struct(field_type)):
+                found.append(('non_blittable_struct', f"{field['name']}: {field_type}"))
+    return found, struct_size(generator, struct_name) or 0
+
+def lint_module(ir, large_struct):
+    prefix = ir['prefix']
+    generator = gen_csharp.ModuleGenerator(gen_csharp.library_names.get(prefix, 'sokol'), gen_csharp.module_modes.get(prefix, ()))
+    generator.module_name = ir['module']
+    generator.pre_parse(ir)
+    entries = []
+    for decl in ir['decls']:
+        if decl['is_dep'] or decl['kind'] not in ('func', 'struct') or gen_csharp.check_name_ignore(decl['name']):
+            continue
+        if decl['kind'] == 'func':
+            found, size = lint_func(generator, decl, large_struct)
+        else:
+            found, size = lint_struct(generator, decl)
+        entry_categories = sorted(set(category for category, _ in found), key=categories.index) or ['blittable']
+        entries.append({
+            'module': ir['module'],
+            'kind': decl['kind'],
+            'name': decl['name'],
+            'categories': entry_categories,
+            'size': size,
+            'details': [f'{category}: {detail}' for category, detail in found],
+        })
+    return entries
+
+def cost_key(entry):
+    # most categories first, then the largest copies
+    return (-len([c for c in entry['categories'] if c != 'blittable']), -entry['size'], entry['module'], entry['name'])
+
+def print_table(entries):
+    print(f"{'module':<12} {'kind':<6} {'name':<44} {'bytes':>6}  categories")
+    for entry in entries:
+        print(f"{entry['module']:<12} {entry['kind']:<6} {entry['name']:<44} {entry['size']:>6}  {', '.join(entry['categories'])}")
+    print()
+    print(f"{'category':<24} {'funcs':>6} {'structs':>8}")
+    for category in categories:
+        funcs = sum(1 for entry in entries if entry['kind'] == 'func' and category in entry['categories'])
+        structs = sum(1 for entry in entries if entry['kind'] == 'struct' and category in entry['categories'])
+        print(f'{category:<24} {funcs:>6} {structs:>8}')
+
+def check_threshold(entries, fail_on, threshold, baseline_path):
+    known = set()
+    if baseline_path:
+        with open(baseline_path, 'r') as f:
+            for entry in json.load(f)['entries']:
+                for category in entry['categories']:
+                    known.add((entry['module'], entry['name'], category))
+    failing = [(entry, category) for entry in entries for category in entry['categories']
+               if category in fail_on and (entry['module'], entry['name'], category) not in known]
+    for entry, category in failing:
+        print(f"  {category}: {entry['module']}.{entry['name']} {'; '.join(entry['details'])}")
+    if len(failing) > threshold:
+        print(f'FAIL: {len(failing)} entries in {", ".join(fail_on)} (threshold {threshold})')
+        return 1
+    print(f'ok: {len(failing)} entries in {", ".join(fail_on)} (threshold {threshold})')
+    return 0
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Marshalling cost report and lint pass over the bindings IR.')
+    parser.add_argument('-t', '--tasks', nargs='*', metavar='PREFIX', help='only check the modules with these prefixes')
+    parser.add_argument('--mode', action='append', default=[], metavar='MODE[=PREFIX,...]',
+                        help='classify with a C# emission mode enabled, like gen.py --mode')
+    parser.add_argument('--large-struct', type=int, default=64, metavar='BYTES',
+                        help='structs passed or returned by value above this size are reported (default: 64)')
+    parser.add_argument('--json', default=None, metavar='PATH', help='write the report as JSON')
+    parser.add_argument('--fail-on', nargs='+', default=[], choices=categories, metavar='CATEGORY',
+                        help=f"fail if too many entries are in these categories ({', '.join(categories)})")
+    parser.add_argument('--threshold', type=int, default=0,
+                        help='number of --fail-on entries which are still ok (default: 0)')
+    parser.add_argument('--baseline', default=None, metavar='PATH',
+                        help='JSON report of a previous run, only new entries count for --fail-on')
+    parser.add_argument('--no-cache', action='store_true', help='always run clang, bypassing the on-disk IR cache')
+    parser.add_argument('--from-ir', action='store_true',
+                        help=f'read the IRs gen.py wrote to {gen_ir.ir_dir}/ instead of running the front-end')
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    gen_cache.configure(not args.no_cache, None, None)
+    gen.apply_modes(args.mode)
+    entries = []
+    selected = [task for task in gen.tasks if not args.tasks or task[1] in args.tasks]
+    needed = set(task[1] for task in selected) | set(prefix for task in selected for prefix in task[2])
+    for [c_header_path, main_prefix, dep_prefixes] in gen.tasks:
+        if main_prefix not in needed:
+            continue
+        # the dependencies come first in gen.tasks and are only registered
+        if args.from_ir:
+            path = os.path.join(gen_ir.ir_dir, f'{gen_csharp.module_names[main_prefix]}.ir')
+            try:
+                ir = gen_irfile.load(path)
+            except (OSError, gen_irfile.IRFormatError) as e:
+                sys.exit(f'error: {e} (run gen.py first)')
+        else:
+            ir = gen_csharp.make_ir(c_header_path, main_prefix, dep_prefixes)
+        # the .ir file stays mapped until the module is linted
+        with ir if args.from_ir else contextlib.nullcontext():
+            gen_registry.register(ir)
+            if not args.tasks or main_prefix in args.tasks:
+                entries += lint_module(ir, args.large_struct)
+    entries.sort(key=cost_key)
+    print_table(entries)
+    if args.json:
+        with open(args.json, 'w') as f:
+            f.write(json.dumps({ 'large_struct': args.large_struct, 'entries': entries }, indent=2))
+    if args.fail_on:
+        sys.exit(check_threshold(entries, args.fail_on, args.threshold, args.baseline))
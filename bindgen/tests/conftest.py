@@ -0,0 +1,4 @@
+# the bindgen modules aren't a package, they import each other by name
+import os, sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1 @@
+#include "fx.h"
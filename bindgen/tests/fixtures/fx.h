@@ -0,0 +1,48 @@
+#pragma once
+/*
+    fx.h -- front-end test fixture
+
+    Project URL: none
+*/
+#include <stdbool.h>
+#include <stddef.h>
+#include <stdint.h>
+#include "fxd.h"
+
+enum {
+    FX_MAX_ITEMS = 8,
+};
+
+typedef enum fx_mode {
+    FX_MODE_DEFAULT,
+    FX_MODE_FAST = 4,
+    FX_MODE_NUM,
+} fx_mode;
+
+typedef struct fx_range {
+    const void* ptr;
+    size_t size;
+} fx_range;
+
+typedef struct {
+    float x, y;
+} fx_vec2;
+
+typedef struct fx_desc {
+    const char* label;
+    bool enabled;
+    fx_mode mode;
+    fxd_handle handle;
+    fxd_kind kind;
+    fx_vec2 points[FX_MAX_ITEMS];
+    int grid[2][3];
+    fx_range data;
+    void (*callback)(int, void*);
+    void* user_data;
+} fx_desc;
+
+void fx_setup(const fx_desc* desc);
+fx_vec2 fx_center(fx_range range, fxd_handle handle);
+const char* fx_name(fx_mode mode);
+bool fx_valid(void);
+void fx_shutdown(void);
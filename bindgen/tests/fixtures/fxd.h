@@ -0,0 +1,9 @@
+#pragma once
+#include <stdint.h>
+
+typedef struct fxd_handle { uint32_t id; } fxd_handle;
+
+typedef enum fxd_kind {
+    FXD_KIND_A,
+    FXD_KIND_B,
+} fxd_kind;
@@ -0,0 +1,56 @@
+import pytest
+import gen_abi
+
+def struct(*field_types):
+    return { 'fields': [{ 'name': f'f{i}', 'type': field_type } for i, field_type in enumerate(field_types)] }
+
+structs = {
+    'empty':        struct(),
+    'one_int':      struct('int'),
+    'one_double':   struct('double'),
+    'one_ptr':      struct('const void *'),
+    'one_enum':     struct('mode'),
+    'float_pair':   struct('float', 'float'),
+    'nested_one':   struct('one_int'),
+    'array_one':    struct('float[1]'),
+    'array_two':    struct('float[2]'),
+    'padded':       struct('char', 'empty'),
+    'with_empty':   struct('empty', 'double'),
+    'large':        struct('double', 'double', 'int64_t'),
+    'big_array':    struct('uint8_t[17]'),
+    'unknown':      struct('some_opaque_t'),
+}
+enums = { 'mode': {} }
+
+# (struct, size, alignment, returned through a hidden sret pointer)
+cases = [
+    ('empty',       0, 1, False),
+    ('one_int',     4, 4, False),
+    ('one_double',  8, 8, False),
+    ('one_ptr',     4, 4, False),
+    ('one_enum',    4, 4, False),
+    ('float_pair',  8, 4, True),
+    ('nested_one',  4, 4, False),
+    ('array_one',   4, 4, False),
+    ('array_two',   8, 4, True),
+    ('padded',      1, 1, False),
+    ('with_empty',  8, 8, False),
+    ('large',       24, 8, True),
+    ('big_array',   17, 1, True),
+]
+
+@pytest.mark.parametrize('name, size, align, indirect', cases)
+def test_struct_classification(name, size, align, indirect):
+    layout = gen_abi.struct_layout(name, structs, enums)
+    assert (layout.size, layout.align) == (size, align)
+    assert gen_abi.returns_indirect(name, structs, enums) == indirect
+
+def test_unknown_layout_is_indirect():
+    assert gen_abi.struct_layout('unknown', structs, enums) is None
+    assert gen_abi.returns_indirect('unknown', structs, enums)
+
+def test_layouts_memoized():
+    layouts = {}
+    gen_abi.returns_indirect('nested_one', structs, enums, layouts)
+    assert set(layouts) == { 'nested_one', 'one_int' }
+    assert gen_abi.layout_from_json(gen_abi.layout_to_json(layouts['nested_one'])) == layouts['nested_one']
@@ -0,0 +1,74 @@
+import gen_apidiff, gen_irfile
+
+def func(name, result_type, *params, comment=None):
+    decl = { 'kind': 'func', 'name': name, 'type': f"{result_type} ({', '.join(type for type, _ in params) or 'void'})", 'params': [{ 'name': name, 'type': type } for type, name in params] }
+    if comment is not None:
+        decl['comment'] = comment
+    return dict(decl, is_dep=False, dep_prefix=None)
+
+def struct(name, *fields):
+    return { 'kind': 'struct', 'name': name, 'fields': [{ 'name': name, 'type': type } for type, name in fields], 'is_dep': False, 'dep_prefix': None }
+
+def enum(name, *items):
+    return { 'kind': 'enum', 'name': name, 'items': [{ 'name': item } for item in items], 'is_dep': False, 'dep_prefix': None }
+
+def module(*decls):
+    return { 'module': 'Syn', 'prefix': 'syn_', 'dep_prefixes': [], 'decls': list(decls) }
+
+old_ir = module(
+    struct('syn_desc', ('int', 'width'), ('int', 'height')),
+    enum('syn_mode', 'SYN_MODE_A', 'SYN_MODE_B'),
+    func('syn_setup', 'void', ('const syn_desc *', 'desc')),
+    func('syn_query', 'int', ('int', 'index')),
+    func('syn_legacy', 'void'),
+)
+
+def test_no_changes():
+    changes = gen_apidiff.diff(old_ir, old_ir)
+    assert changes == { 'added': [], 'removed': [], 'changed': [] }
+    assert gen_apidiff.summary({ 'Syn': changes }) == 'API changes: 0 added, 0 removed, 0 changed'
+
+def test_added_and_removed():
+    new_ir = module(*old_ir['decls'][:4], func('syn_frame', 'void', ('float', 'dt')))
+    changes = gen_apidiff.diff(old_ir, new_ir)
+    assert changes['added'] == [{ 'kind': 'func', 'name': 'syn_frame', 'signature': 'void syn_frame(float dt)' }]
+    assert changes['removed'] == [{ 'kind': 'func', 'name': 'syn_legacy', 'signature': 'void syn_legacy()' }]
+    assert changes['changed'] == []
+    assert gen_apidiff.summary({ 'Syn': changes }).splitlines() == [
+        'API changes: 1 added, 1 removed, 0 changed',
+        '  Syn:',
+        '    + func syn_frame: void syn_frame(float dt)',
+        '    - func syn_legacy',
+    ]
+
+def test_changed_signatures():
+    new_ir = module(
+        struct('syn_desc', ('int', 'width'), ('float', 'height'), ('int', 'depth')),
+        enum('syn_mode', 'SYN_MODE_A'),
+        func('syn_setup', 'void', ('const syn_desc *', 'desc'), comment='only the comment changed'),
+        func('syn_query', 'float', ('int', 'index'), ('int', 'flags')),
+        func('syn_legacy', 'void'),
+    )
+    changes = gen_apidiff.diff(old_ir, new_ir)
+    assert changes['added'] == [] and changes['removed'] == []
+    assert changes['changed'] == [
+        { 'kind': 'struct', 'name': 'syn_desc', 'old': 'struct syn_desc { int width; int height }', 'new': 'struct syn_desc { int width; float height; int depth }', 'items': ['~ int height => float height', '+ int depth'] },
+        { 'kind': 'enum', 'name': 'syn_mode', 'old': 'enum syn_mode { SYN_MODE_A, SYN_MODE_B }', 'new': 'enum syn_mode { SYN_MODE_A }', 'items': ['- SYN_MODE_B'] },
+        { 'kind': 'func', 'name': 'syn_query', 'old': 'int syn_query(int index)', 'new': 'float syn_query(int index, int flags)' },
+    ]
+    assert gen_apidiff.summary({ 'Syn': changes, 'Other': gen_apidiff.diff(old_ir, old_ir) }).splitlines() == [
+        'API changes: 0 added, 0 removed, 3 changed',
+        '  Syn:',
+        '    ~ struct syn_desc: ~ int height => float height, + int depth',
+        '    ~ enum syn_mode: - SYN_MODE_B',
+        '    ~ func syn_query: int syn_query(int index) => float syn_query(int index, int flags)',
+    ]
+
+def test_reordered_fields():
+    new_ir = module(struct('syn_desc', ('int', 'height'), ('int', 'width')), *old_ir['decls'][1:])
+    assert gen_apidiff.diff(old_ir, new_ir)['changed'][0]['items'] == ['reordered']
+
+def test_load_irs(tmp_path):
+    gen_irfile.write(str(tmp_path / 'Syn.ir'), old_ir)
+    (tmp_path / 'Broken.ir').write_bytes(b'not an IR file')
+    assert gen_apidiff.load_irs(str(tmp_path), ['Syn', 'Broken', 'Missing']) == { 'Syn': old_ir }
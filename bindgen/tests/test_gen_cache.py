@@ -0,0 +1,37 @@
+import os
+import gen_cache
+
+def parse(tmp_path, text):
+    path = tmp_path / 'out.d'
+    path.write_bytes(text.encode())
+    return gen_cache.parse_dep_file(str(path))
+
+def test_parse_dep_file(tmp_path):
+    text = 'out.o: c/sokol_gfx.c ../ext/sokol/sokol_gfx.h \\\n  /usr/include/stdint.h dir\\ with\\ space/x.h\n'
+    assert parse(tmp_path, text) == [os.path.abspath(path) for path in ['c/sokol_gfx.c', '../ext/sokol/sokol_gfx.h', '/usr/include/stdint.h', 'dir with space/x.h']]
+
+def test_parse_dep_file_windows_paths(tmp_path):
+    text = 'C:\\sokol\\out.o: C:\\sokol\\bindgen\\c\\sokol_gfx.c \\\r\n  C:\\sokol\\ext\\sokol\\sokol_gfx.h\r\n'
+    assert parse(tmp_path, text) == [os.path.abspath(path) for path in ['C:\\sokol\\bindgen\\c\\sokol_gfx.c', 'C:\\sokol\\ext\\sokol\\sokol_gfx.h']]
+
+def test_parse_dep_file_without_deps(tmp_path):
+    assert parse(tmp_path, '') == []
+    assert parse(tmp_path, 'out.o:\n') == []
+
+def test_lookup_entry_evicted_after_read(tmp_path, monkeypatch):
+    monkeypatch.setattr(gen_cache, 'enabled', True)
+    monkeypatch.setattr(gen_cache, 'cache_dir', str(tmp_path / 'cache'))
+    dep_path = tmp_path / 'syn.h'
+    dep_path.write_text('int syn_setup(void);\n')
+    ir = { 'module': 'Syn', 'decls': [] }
+    gen_cache.store('ab' * 32, [str(dep_path)], ir)
+    assert gen_cache.lookup('ab' * 32) == ir
+    # another worker evicts the entry between reading it and bumping its mtime
+    hash_file = gen_cache.hash_file
+    def hash_file_and_evict(path):
+        if os.path.exists(gen_cache.entry_path('ab' * 32)):
+            os.remove(gen_cache.entry_path('ab' * 32))
+        return hash_file(path)
+    monkeypatch.setattr(gen_cache, 'hash_file', hash_file_and_evict)
+    assert gen_cache.lookup('ab' * 32) == ir
+    assert gen_cache.lookup('ab' * 32) is None
@@ -0,0 +1,102 @@
+import gen_csharp, gen_fragments, gen_registry
+
+def param(name, type):
+    return { 'name': name, 'type': type }
+
+def func(name, type, params):
+    return { 'kind': 'func', 'name': name, 'type': type, 'params': params, 'is_dep': False, 'dep_prefix': None }
+
+fons_ir = {
+    'module': 'Fontstash',
+    'prefix': 'fons',
+    'dep_prefixes': [],
+    'decls': [
+        func('fonsDrawText', 'float (FONScontext *, float, float, const char *, const char *)', [
+            param('s', 'FONScontext *'),
+            param('x', 'float'),
+            param('y', 'float'),
+            param('string', 'const char *'),
+            param('end', 'const char *'),
+        ]),
+        func('fonsGetFontByName', 'int (FONScontext *, const char *)', [
+            param('s', 'FONScontext *'),
+            param('name', 'const char *'),
+        ]),
+    ],
+}
+
+def gen_fons(monkeypatch, modes):
+    return gen_fons_with_shared(monkeypatch, modes)[0]
+
+def gen_fons_with_shared(monkeypatch, modes):
+    monkeypatch.setattr(gen_csharp, 'module_modes', { 'fons': modes })
+    monkeypatch.setattr(gen_fragments, 'enabled', False)
+    monkeypatch.setattr(gen_registry, 'decls', {})
+    source, _, _, shared_decls, _ = gen_csharp.gen_source(fons_ir, 'fons', [])
+    return source, shared_decls
+
+def test_utf8_span_overload_string_range(monkeypatch):
+    source = gen_fons(monkeypatch, ['utf8_overloads'])
+    assert 'public static extern float fonsDrawText(IntPtr s, float x, float y, byte* _string, byte* end);' in source
+    # the end pointer of the (str, end) range follows from the span
+    assert 'public static float fonsDrawText(IntPtr s, float x, float y, ReadOnlySpan<byte> _string)\n' in source
+    assert 'return fonsDrawText(s, x, y, ___string, ___string + _string.Length);' in source
+    assert 'ReadOnlySpan<byte> end' not in source
+    # the range is pinned as it is, it's never copied to add a terminator
+    assert 'fixed (byte* ___string = NullTerminatedUtf8.NonEmpty(_string))' in source
+    assert '__string_utf8' not in source
+
+def test_utf8_span_overload_long_string(monkeypatch):
+    source, shared_decls = gen_fons_with_shared(monkeypatch, ['utf8_overloads'])
+    assert 'using var __name_utf8 = new NullTerminatedUtf8(name, stackalloc byte[NullTerminatedUtf8.StackBufferSize]);' in source
+    assert 'fixed (byte* __name = __name_utf8.Span)' in source
+    # strings which don't fit the stack buffer are copied to a pooled array
+    # returned by Dispose(), not to a new one per call
+    shared = shared_decls['NullTerminatedUtf8'][0]
+    assert 'if (str.Length >= buffer.Length)' in shared
+    assert 'ArrayPool<byte>.Shared.Rent(str.Length + 1)' in shared
+    assert 'ArrayPool<byte>.Shared.Return(rented)' in shared
+    assert 'new byte[' not in shared
+
+def test_string_marshalling_without_utf8_overloads(monkeypatch):
+    source = gen_fons(monkeypatch, [])
+    assert 'public static extern float fonsDrawText(IntPtr s, float x, float y, [M(U.LPUTF8Str)] string _string, [M(U.LPUTF8Str)] string end);' in source
+    assert 'ReadOnlySpan<byte>' not in source
+
+syn_ir = {
+    'module': 'Syn',
+    'prefix': 'syn_',
+    'dep_prefixes': [],
+    'decls': [
+        { 'kind': 'struct', 'name': 'syn_desc', 'fields': [param('label', 'const char *')], 'is_dep': False, 'dep_prefix': None },
+    ],
+}
+
+def test_blittable_string_setter_frees_previous_copy(monkeypatch):
+    monkeypatch.setattr(gen_csharp, 'module_modes', { 'syn_': ['blittable_structs'] })
+    monkeypatch.setattr(gen_fragments, 'enabled', False)
+    monkeypatch.setattr(gen_registry, 'decls', {})
+    source, _, _, shared_decls, _ = gen_csharp.gen_source(syn_ir, 'syn_', [])
+    assert 'set { OwnedUtf8.Free(_label); _label = OwnedUtf8.Alloc(value); }' in source
+    assert 'set { if (value != _label) { OwnedUtf8.Free(_label); } _label = value; }' in source
+    assert 'Marshal.FreeCoTaskMem' in shared_decls['OwnedUtf8'][0]
+
+def test_marshalled_size():
+    assert gen_csharp.marshalled_size('int', 'x') == 'Unsafe.SizeOf<int>()'
+    assert gen_csharp.marshalled_size('bool', 'on') == '4'
+    assert gen_csharp.marshalled_size('syn_desc', 'desc', 'in') == 'IntPtr.Size'
+    assert gen_csharp.marshalled_size('int', 'w', 'ref') == 'IntPtr.Size'
+    assert gen_csharp.marshalled_size('float', 'f', 'out') == 'IntPtr.Size'
+    assert gen_csharp.marshalled_size('byte*', 'data') == 'IntPtr.Size'
+    assert gen_csharp.marshalled_size('string', 'label') == '(label == null ? 0 : Encoding.UTF8.GetByteCount(label) + 1)'
+
+def test_profile_shim_sizes(monkeypatch):
+    ir = dict(syn_ir, decls=[
+        func('syn_get_size', 'void (int *, int *)', [param('w', 'int *'), param('h', 'int *')]),
+        func('syn_flag', 'bool (bool, int)', [param('on', 'bool'), param('x', 'int')]),
+    ])
+    monkeypatch.setattr(gen_csharp, 'module_modes', { 'syn_': ['profile_shims'] })
+    monkeypatch.setattr(gen_registry, 'decls', {})
+    source = gen_csharp.gen_source(ir, 'syn_', [])[0]
+    assert '__profile.Record(0, __start, IntPtr.Size + IntPtr.Size);' in source
+    assert '__profile.Record(1, __start, 4 + Unsafe.SizeOf<int>() + 4);' in source
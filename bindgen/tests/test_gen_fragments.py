@@ -0,0 +1,76 @@
+import os
+import pytest
+import gen_cache, gen_fragments
+
+def struct(name, *fields):
+    return { 'kind': 'struct', 'name': name, 'fields': [{ 'name': field, 'type': 'int' } for field in fields], 'is_dep': False, 'dep_prefix': None }
+
+def func(name, type):
+    return { 'kind': 'func', 'name': name, 'type': type, 'params': [], 'is_dep': False, 'dep_prefix': None }
+
+def type_names(decl):
+    return [decl['name']] if decl['kind'] == 'struct' else [decl['type'].split()[0]]
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(gen_cache, 'enabled', True)
+    monkeypatch.setattr(gen_cache, 'cache_dir', str(tmp_path))
+    return tmp_path
+
+def run(decls, results=None):
+    # one emission of 'decls', the text of a declaration is its name plus
+    # the number of fields of the struct it returns, returns the texts,
+    # the cache statistics and the type results seen
+    cache = gen_fragments.FragmentCache('Test', ['ctx'])
+    types = { decl['name']: decl for decl in decls if decl['kind'] == 'struct' }
+    cache.changed_types(types, type_names)
+    seen = { name: dict(cache.type_results(name)) for name in types }
+    for name, value in (results or {}).items():
+        cache.type_results(name)['size'] = value
+    texts = []
+    for decl in decls:
+        fragment = cache.lookup(decl)
+        if fragment is None:
+            size = len(types[type_names(decl)[0]]['fields'])
+            fragment = cache.store(decl, type_names(decl), f"{decl['name']} {size}\n", {})
+        texts.append(fragment[0])
+    cache.save()
+    return texts, cache.stats(), seen
+
+def test_reuse_and_change(cache_dir):
+    decls = [struct('s', 'a'), func('f', 's (void)'), struct('t', 'b'), func('g', 't (void)')]
+    assert run(decls)[1] == { 'reused': 0, 'emitted': 4 }
+    assert run(decls)[:2] == (['s 1\n', 'f 1\n', 't 1\n', 'g 1\n'], { 'reused': 4, 'emitted': 0 })
+    decls[0] = struct('s', 'a', 'b')
+    assert run(decls)[:2] == (['s 2\n', 'f 2\n', 't 1\n', 'g 1\n'], { 'reused': 2, 'emitted': 2 })
+    # the change was appended to the index
+    with open(gen_fragments.fragment_path('Test'), 'rb') as f:
+        assert len(f.read().splitlines()) == 3
+    assert run(decls)[:2] == (['s 2\n', 'f 2\n', 't 1\n', 'g 1\n'], { 'reused': 4, 'emitted': 0 })
+
+def test_type_results(cache_dir):
+    decls = [struct('s', 'a'), struct('t', 'b')]
+    run(decls, { 's': 4, 't': 4 })
+    assert run(decls)[2] == { 's': { 'size': 4 }, 't': { 'size': 4 } }
+    # a changed type loses its results
+    decls[1] = struct('t', 'b', 'c')
+    assert run(decls)[2] == { 's': { 'size': 4 }, 't': {} }
+
+def test_damaged_index(cache_dir):
+    decls = [struct('s', 'a'), func('f', 's (void)')]
+    run(decls)
+    decls[0] = struct('s', 'a', 'b')
+    run(decls)
+    path = gen_fragments.fragment_path('Test')
+    with open(path, 'rb') as f:
+        data = f.read()
+    # the last run's line is cut off, the previous run's fragments are
+    # still used and the index is rewritten
+    with open(path, 'wb') as f:
+        f.write(data[:-10])
+    decls[0] = struct('s', 'a')
+    assert run(decls)[:2] == (['s 1\n', 'f 1\n'], { 'reused': 2, 'emitted': 0 })
+    with open(path, 'rb') as f:
+        assert len(f.read().splitlines()) == 2
+    assert run(decls)[:2] == (['s 1\n', 'f 1\n'], { 'reused': 2, 'emitted': 0 })
+    assert sorted(os.listdir(os.path.dirname(path))) == ['Test.2.frag', 'Test.json']
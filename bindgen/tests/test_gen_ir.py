@@ -0,0 +1,53 @@
+import io, json, os, shutil
+import pytest
+import bench, gen_ir
+
+fixtures = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+def test_frontends_agree():
+    if gen_ir.cindex is None:
+        pytest.skip('the libclang Python bindings are not installed')
+    if shutil.which('clang') is None:
+        pytest.skip('clang is not installed')
+    header_path = os.path.join(fixtures, 'fx.h')
+    source_path = os.path.join(fixtures, 'fx.c')
+    ast = gen_ir.clang(source_path)
+    ir_json = gen_ir.gen_from_ast(ast, header_path, 'Fx', 'fx_', ['fxd_'])
+    ir_libclang, deps = gen_ir.libclang_gen(source_path, None, header_path, 'Fx', 'fx_', ['fxd_'], False)
+    assert [decl['name'] for decl in ir_json['decls'] if decl['kind'] != 'consts'] == ['fx_mode', 'fx_range', 'fx_vec2', 'fx_desc', 'fx_setup', 'fx_center', 'fx_name', 'fx_valid', 'fx_shutdown']
+    assert bench.compare_irs(ir_json, ir_libclang) is None
+    assert os.path.join(fixtures, 'fxd.h') in deps
+
+def ast_dump(decls):
+    # formatted like clang's JSON AST dump
+    return json.dumps({ 'id': '0x1', 'kind': 'TranslationUnitDecl', 'inner': decls }, indent=2, ensure_ascii=False).encode()
+
+class CountingStream(io.BytesIO):
+    def __init__(self, data):
+        super().__init__(data)
+        self.reads = 0
+
+    def read(self, size=-1):
+        self.reads += 1
+        return super().read(size)
+
+def test_iter_ast_items():
+    decls = [
+        { 'id': '0x2', 'kind': 'FunctionDecl', 'name': 'sg_setup', 'type': { 'qualType': 'void (const sg_desc *)' } },
+        { 'id': '0x3', 'kind': 'RecordDecl', 'name': 'sg_desc_ä', 'inner': [{ 'kind': 'FieldDecl', 'name': f'field{i}' } for i in range(20)] },
+        { 'id': '0x4', 'kind': 'TypedefDecl', 'name': 'sg_desc' },
+    ]
+    data = ast_dump(decls)
+    for chunk_size in (1, 7, 64, 1 << 20):
+        items = list(gen_ir.iter_ast_items(io.BytesIO(data), chunk_size))
+        assert [(kind, name) for kind, name, _, _ in items] == [(decl['kind'], decl['name']) for decl in decls]
+        assert [json.loads(text) for _, _, text, _ in items] == decls
+
+def test_iter_ast_items_large_item():
+    # an item spanning many chunks doesn't need one read per chunk (each
+    # refill copies the part of the item read so far)
+    decls = [{ 'id': '0x2', 'kind': 'RecordDecl', 'name': 'big', 'inner': [{ 'kind': 'FieldDecl', 'name': f'field{i}' } for i in range(20000)] }]
+    stream = CountingStream(ast_dump(decls))
+    items = list(gen_ir.iter_ast_items(stream, 64))
+    assert json.loads(items[0][2]) == decls[0]
+    assert stream.reads < 40
@@ -0,0 +1,46 @@
+import json, mmap
+import pytest
+import gen_irfile
+
+ir = {
+    'module': 'Syn',
+    'prefix': 'syn_',
+    'dep_prefixes': ['sg_'],
+    'comment': ' syn.h -- test module\n    Project URL: none\n',
+    'decls': [
+        { 'kind': 'consts', 'items': [{ 'name': 'SYN_MAX', 'value': '8' }], 'is_dep': False, 'dep_prefix': None },
+        { 'kind': 'enum', 'name': 'syn_mode', 'items': [{ 'name': 'SYN_MODE_A' }, { 'name': 'SYN_MODE_B', 'value': '4' }], 'is_dep': False, 'dep_prefix': None },
+        { 'kind': 'struct', 'name': 'syn_desc', 'fields': [{ 'name': 'label', 'type': 'const char *' }, { 'name': 'grid', 'type': 'int[2][3]' }], 'comment': 'a description, äöü', 'is_dep': False, 'dep_prefix': None },
+        { 'kind': 'func', 'name': 'syn_setup', 'type': 'void (const syn_desc *)', 'params': [{ 'name': 'desc', 'type': 'const syn_desc *' }], 'is_dep': False, 'dep_prefix': None },
+        { 'kind': 'func', 'name': 'syn_shutdown', 'type': 'void (void)', 'params': [], 'is_dep': False, 'dep_prefix': None },
+        { 'kind': 'struct', 'name': 'sg_range', 'fields': [{ 'name': 'ptr', 'type': 'const void *' }], 'is_dep': True, 'dep_prefix': 'sg_' },
+    ],
+}
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / 'Syn.ir')
+    assert gen_irfile.write(path, ir)
+    assert not gen_irfile.write(path, ir)
+    with gen_irfile.load(path) as irfile:
+        assert isinstance(irfile.data, mmap.mmap)
+        # nothing is decoded until it is accessed
+        assert irfile['module'] == 'Syn'
+        assert len(irfile['decls']) == len(ir['decls'])
+        assert irfile.decl_cache == {}
+        assert irfile.find('syn_setup') == ir['decls'][3]
+        assert list(irfile.decl_cache) == [3]
+        assert irfile.find('syn_missing') is None
+        assert irfile['decls'][-1] == ir['decls'][-1]
+        # the same dict as the JSON IR, including the key order
+        assert json.dumps(irfile.to_dict()) == json.dumps(ir)
+    assert irfile.data.closed
+
+def test_format_errors(tmp_path):
+    path = tmp_path / 'Syn.ir'
+    path.write_bytes(b'')
+    with pytest.raises(gen_irfile.IRFormatError):
+        gen_irfile.load(str(path))
+    data = gen_irfile.dumps(ir)
+    path.write_bytes(data[:gen_irfile.HEADER.size + 4])
+    with pytest.raises(gen_irfile.IRFormatError):
+        gen_irfile.load(str(path))
@@ -0,0 +1,62 @@
+import ctypes, importlib, struct, sys, zlib
+import pytest
+import gen_python, gen_registry
+
+def func(name, result_type, *params):
+    return { 'kind': 'func', 'name': name, 'type': f"{result_type} ({', '.join(type for type, _ in params)})", 'params': [{ 'name': name, 'type': type } for type, name in params], 'is_dep': False, 'dep_prefix': None }
+
+load_params = [('const unsigned char *', 'buffer'), ('int', 'len'), ('int *', 'x'), ('int *', 'y'), ('int *', 'channels_in_file'), ('int', 'desired_channels')]
+stbi_ir = {
+    'module': 'StbImage',
+    'prefix': 'stbi_',
+    'dep_prefixes': [],
+    'decls': [
+        func('stbi_load_csharp', 'unsigned char *', *load_params),
+        func('stbi_image_free_csharp', 'void', ('void *', 'retval_from_stbi_load')),
+        func('stbi_failure_reason_csharp', 'const char *'),
+        # not in any native library
+        func('stbi_not_exported_csharp', 'int'),
+    ],
+}
+
+def png(width, height, pixels):
+    # an 8-bit RGBA PNG, 'pixels' are the rows' bytes
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+    rows = b''.join(b'\0' + pixels[y * width * 4:(y + 1) * width * 4] for y in range(height))
+    return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)) + chunk(b'IDAT', zlib.compress(rows)) + chunk(b'IEND', b'')
+
+@pytest.fixture
+def package_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(gen_python, 'output_dir', str(tmp_path / 'sokol_native'))
+    monkeypatch.setattr(gen_registry, 'decls', {})
+    gen_python.gen([['../ext/stb/stb_image.h', 'stbi_', []]], [stbi_ir])
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield tmp_path / 'sokol_native'
+    for name in [name for name in sys.modules if name == 'sokol_native' or name.startswith('sokol_native.')]:
+        del sys.modules[name]
+
+def test_generated_module(package_dir):
+    source = (package_dir / 'stb_image.py').read_text()
+    assert "if hasattr(_lib, 'stbi_load_csharp'):\n    stbi_load_csharp = _runtime.function(_lib, 'stbi_load_csharp', ctypes.POINTER(ctypes.c_ubyte), [_runtime.Buffer(ctypes.c_ubyte, const=True), ctypes.c_int, _runtime.Buffer(ctypes.c_int), _runtime.Buffer(ctypes.c_int), _runtime.Buffer(ctypes.c_int), ctypes.c_int])" in source
+    assert '# Not thread-safe' in source
+
+def test_decode_png(package_dir):
+    try:
+        stbi = importlib.import_module('sokol_native.stb_image')
+    except OSError as e:
+        pytest.skip(f'native library not available: {e}')
+    # functions the library doesn't export are undefined
+    assert not hasattr(stbi, 'stbi_not_exported_csharp')
+    pixels = bytes(range(2 * 3 * 4))
+    data = png(2, 3, pixels)
+    x, y, channels = ctypes.c_int(), ctypes.c_int(), ctypes.c_int()
+    result = stbi.stbi_load_csharp(data, len(data), ctypes.byref(x), ctypes.byref(y), ctypes.byref(channels), 4)
+    assert result
+    try:
+        assert (x.value, y.value, channels.value) == (2, 3, 4)
+        assert ctypes.string_at(result, len(pixels)) == pixels
+    finally:
+        stbi.stbi_image_free_csharp(result)
+    assert not stbi.stbi_load_csharp(b'not an image', 12, ctypes.byref(x), ctypes.byref(y), ctypes.byref(channels), 4)
+    assert isinstance(stbi.stbi_failure_reason_csharp(), str)
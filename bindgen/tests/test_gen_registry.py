@@ -0,0 +1,54 @@
+import pytest
+import gen_registry
+
+def struct(name):
+    return { 'kind': 'struct', 'name': name, 'fields': [], 'is_dep': False, 'dep_prefix': None }
+
+def consts(first_item):
+    return { 'kind': 'consts', 'items': [{ 'name': first_item, 'value': '1' }], 'is_dep': False, 'dep_prefix': None }
+
+def module(prefix, *decls):
+    return { 'module': prefix.title(), 'prefix': prefix, 'dep_prefixes': [], 'decls': list(decls) }
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch):
+    monkeypatch.setattr(gen_registry, 'decls', {})
+    monkeypatch.setattr(gen_registry, 'owners', {})
+
+def test_lookup():
+    gen_registry.register(module('sg_', struct('sg_desc'), consts('SG_MAX')))
+    gen_registry.register(module('sapp_', struct('sapp_desc')))
+    decls = gen_registry.dep_decls(['sg_', 'sapp_'])
+    assert [(decl.get('name'), decl['is_dep'], decl['dep_prefix']) for decl in decls] == [('sg_desc', True, 'sg_'), (None, True, 'sg_'), ('sapp_desc', True, 'sapp_')]
+    assert gen_registry.dep_decls([]) == []
+    # the module's IR isn't changed
+    assert gen_registry.select(['sapp_'])['sapp_'][0] is not module('sapp_', struct('sapp_desc'))['decls'][0]
+
+def test_missing_dependency():
+    gen_registry.register(module('sg_', struct('sg_desc')))
+    with pytest.raises(SystemExit, match='sapp_ not registered'):
+        gen_registry.select(['sg_', 'sapp_'])
+
+def test_select_and_load():
+    gen_registry.register(module('sg_', struct('sg_desc')))
+    gen_registry.register(module('sapp_', struct('sapp_desc')))
+    selection = gen_registry.select(['sg_'])
+    gen_registry.reset()
+    gen_registry.load(selection)
+    assert [decl['name'] for decl in gen_registry.dep_decls(['sg_'])] == ['sg_desc']
+    with pytest.raises(SystemExit):
+        gen_registry.dep_decls(['sapp_'])
+
+def test_register_again_replaces():
+    gen_registry.register(module('sg_', struct('sg_desc'), struct('sg_old')))
+    gen_registry.register(module('sg_', struct('sg_desc'), struct('sg_new')))
+    assert [decl['name'] for decl in gen_registry.dep_decls(['sg_'])] == ['sg_desc', 'sg_new']
+    assert gen_registry.owners == { 'sg_desc': 'sg_', 'sg_new': 'sg_' }
+
+def test_conflict():
+    gen_registry.register(module('sg_', struct('sg_desc'), consts('SG_MAX')))
+    with pytest.raises(SystemExit, match='sg_desc of s already registered by sg_'):
+        gen_registry.register(module('s', struct('sg_desc'), struct('s_other')))
+    # the conflicting module isn't registered
+    assert 's' not in gen_registry.decls
+    assert gen_registry.owners == { 'sg_desc': 'sg_', 'SG_MAX': 'sg_' }
@@ -0,0 +1,170 @@
+#-------------------------------------------------------------------------------
+#   Reader for the binary trace captures recorded by TraceCapture.Begin()
+#   (generated sokol_csharp_trace.h, see gen_c_trace_header() in gen_csharp.py).
+#
+#   python3 trace_capture.py CAPTURE [--frame N ...] [--dump]
+#
+#   Prints the number of calls and bytes per hook for each frame, --dump also
+#   prints every call with its decoded arguments. The format (little-endian):
+#
+#       header      'SCTR', u32 version, u32 number of hooks, then per hook
+#                   its name and C argument types (u16 length + UTF-8 each)
+#       record      u32 hook index, u32 body size, body
+#       body        one blob per hook argument, a descriptor argument is
+#                   followed by blobs with the data it points to (ranges and
+#                   strings, in field order)
+#       blob        u8 tag (0 argument, 1 nested data, +2 for null pointers),
+#                   u32 size, bytes
+#
+#   Frames end with the 'commit' record.
+#-------------------------------------------------------------------------------
+import argparse, struct, sys
+from collections import namedtuple
+
+MAGIC = b'SCTR'
+VERSION = 1
+TAG_ARG = 0
+TAG_DATA = 1
+TAG_NULL = 2    # flag
+
+Hook = namedtuple('Hook', ['name', 'args'])
+# args: one Arg per hook argument
+Record = namedtuple('Record', ['frame', 'hook', 'args', 'size'])
+# value: the argument's bytes (None for null pointers), data: the nested blobs
+Arg = namedtuple('Arg', ['type', 'value', 'data'])
+
+value_formats = {
+    'int': '<i',
+    'uint32_t': '<I',
+    'int32_t': '<i',
+    'uint16_t': '<H',
+    'uint8_t': '<B',
+    'size_t': '<Q',
+    'float': '<f',
+    'double': '<d',
+}
+
+class CaptureError(Exception):
+    pass
+
+class _Reader:
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def take(self, size):
+        if self.pos + size > len(self.data):
+            raise CaptureError(f'truncated capture at offset {self.pos}')
+        chunk = self.data[self.pos:self.pos + size]
+        self.pos += size
+        return chunk
+
+    def u16(self):
+        return struct.unpack('<H', self.take(2))[0]
+
+    def u32(self):
+        return struct.unpack('<I', self.take(4))[0]
+
+    def string(self):
+        return self.take(self.u16()).decode('utf-8')
+
+def _read_blobs(body):
+    reader = _Reader(body)
+    blobs = []
+    while reader.pos < len(body):
+        tag = reader.take(1)[0]
+        data = reader.take(reader.u32())
+        blobs.append((tag & ~TAG_NULL, None if tag & TAG_NULL else data))
+    return blobs
+
+def read_capture(path):
+    """Returns (hooks, records) of a capture file."""
+    with open(path, 'rb') as f:
+        reader = _Reader(f.read())
+    if reader.take(4) != MAGIC:
+        raise CaptureError(f'{path}: not a trace capture')
+    version = reader.u32()
+    if version != VERSION:
+        raise CaptureError(f'{path}: unsupported capture version {version}')
+    hooks = []
+    for _ in range(reader.u32()):
+        name = reader.string()
+        args = reader.string()
+        hooks.append(Hook(name, args.split(', ') if args else []))
+    records = []
+    frame = 0
+    while reader.pos < len(reader.data):
+        hook_index = reader.u32()
+        body = reader.take(reader.u32())
+        if hook_index >= len(hooks):
+            raise CaptureError(f'{path}: unknown hook {hook_index}')
+        hook = hooks[hook_index]
+        args = []
+        for tag, data in _read_blobs(body):
+            if tag == TAG_DATA and args:
+                args[-1].data.append(data)
+            elif len(args) < len(hook.args):
+                args.append(Arg(hook.args[len(args)], data, []))
+            else:
+                raise CaptureError(f'{path}: too many arguments for {hook.name}')
+        records.append(Record(frame, hook.name, args, len(body) + 8))
+        if hook.name == 'commit':
+            frame += 1
+    return hooks, records
+
+def format_arg(arg):
+    if arg.value is None:
+        return 'NULL'
+    if arg.type == 'const char *':
+        return repr(arg.value[:-1].decode('utf-8', 'replace'))
+    if arg.type == 'bool':
+        return 'true' if arg.value[0] else 'false'
+    fmt = value_formats.get(arg.type)
+    if fmt is not None and struct.calcsize(fmt) == len(arg.value):
+        return str(struct.unpack(fmt, arg.value)[0])
+    if arg.type.endswith('*'):
+        nested = sum(len(data) for data in arg.data if data is not None)
+        return f'<{arg.type.rstrip(" *")}: {len(arg.value)} bytes, {len(arg.data)} blobs, {nested} bytes data>'
+    if len(arg.value) == 4:
+        # handles and enums
+        return f'{arg.type}({struct.unpack("<I", arg.value)[0]})'
+    return f'<{arg.type}: {arg.value.hex()}>'
+
+def print_summary(records, frames):
+    by_frame = {}
+    for record in records:
+        if frames and record.frame not in frames:
+            continue
+        calls = by_frame.setdefault(record.frame, {})
+        count, size = calls.get(record.hook, (0, 0))
+        calls[record.hook] = (count + 1, size + record.size)
+    for frame, calls in sorted(by_frame.items()):
+        total_calls = sum(count for count, _ in calls.values())
+        total_size = sum(size for _, size in calls.values())
+        print(f'frame {frame}: {total_calls} calls, {total_size} bytes')
+        for hook, (count, size) in sorted(calls.items(), key=lambda item: -item[1][1]):
+            print(f'  {hook:<32} {count:>6} {size:>10}')
+
+def print_dump(records, frames):
+    for record in records:
+        if frames and record.frame not in frames:
+            continue
+        print(f"[{record.frame}] {record.hook}({', '.join(format_arg(arg) for arg in record.args)})")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Inspect a binary trace capture recorded by TraceCapture.Begin().')
+    parser.add_argument('capture', help='the capture file')
+    parser.add_argument('--frame', type=int, nargs='+', default=[], metavar='N', help='only show these frames')
+    parser.add_argument('--dump', action='store_true', help='print every call with its arguments')
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    try:
+        hooks, records = read_capture(args.capture)
+    except CaptureError as e:
+        sys.exit(f'error: {e}')
+    frames = set(args.frame)
+    if args.dump:
+        print_dump(records, frames)
+    print_summary(records, frames)
@@ -181,6 +181,23 @@ SOKOL_API_IMPL const char* stbi_failure_reason_csharp(void) {
 // Include auto-generated internal wrapper functions
 #include "sokol_csharp_internal_wrappers.h"
 
+// Include the auto-generated command buffer dispatcher (sokol_csharp_command_buffer_execute),
+// which executes the calls recorded by the C# CommandBuffer class, it only exists once
+// the bindings have been regenerated
+#if defined(__has_include)
+#if __has_include("sokol_csharp_command_buffer.h")
+#include "sokol_csharp_command_buffer.h"
+#endif
+#endif
+
+// Include the auto-generated trace hooks capture recorder and replayer (sokol_csharp_trace_begin/
+// end/replay) used by the C# TraceCapture class, it only exists once the bindings have been regenerated
+#if defined(__has_include)
+#if __has_include("sokol_csharp_trace.h")
+#include "sokol_csharp_trace.h"
+#endif
+#endif
+
 int sdtx_print_wrapper(const char* str)
 {
     return sdtx_printf("%s", str);
@@ -1,7 +1,6 @@
 
 #!/bin/bash
 cd bindgen
-python3 gen.py
-rm -rf *.json
+python3 gen.py "$@"
 rm -rf __pycache__
 cd ..